@@ -1,8 +1,30 @@
+import os
+
+from src.config import settings
 from src.agent_router.router_agent import RouterAgent
-from src.utils.models.llm_factory import create_chat_model
+from src.agent_router.answer_cache import AnswerCache
+from src.agent_router.pre_router import PreRouter
+from src.sql.templates import EntityIndex
+from src.utils.models.llm_factory import create_chat_model, create_embedding_model
 
 
 def load_router_agent():
     llm = create_chat_model()
-    agent_router = RouterAgent(llm=llm)
+    embeddings = create_embedding_model()
+    answer_cache = None
+    if settings.ANSWER_CACHE_SIZE > 0:
+        answer_cache = AnswerCache(
+            embeddings=embeddings,
+            max_size=settings.ANSWER_CACHE_SIZE,
+            ttl_seconds=settings.ANSWER_CACHE_TTL,
+            similarity_threshold=settings.ANSWER_CACHE_THRESHOLD,
+            # Индекс RAG и SQLite БД: при их изменении кэш сбрасывается
+            watched_paths=(settings.MANIFEST_PATH, settings.DB_PATH),
+            # Семантическое попадание - только при тех же сущностях БД и числах
+            entity_index=EntityIndex(settings.DB_PATH) if os.path.exists(settings.DB_PATH) else None,
+        )
+    pre_router = None
+    if settings.PRE_ROUTER_ENABLED:
+        pre_router = PreRouter(embeddings=embeddings, threshold=settings.PRE_ROUTER_THRESHOLD)
+    agent_router = RouterAgent(llm=llm, answer_cache=answer_cache, pre_router=pre_router)
     return agent_router
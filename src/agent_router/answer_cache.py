@@ -0,0 +1,142 @@
+import os
+import re
+import time
+from typing import Optional
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src.sql.templates import EntityIndex
+from src.utils.utils import unit_vector
+
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)?")
+
+
+class AnswerCache:
+    """Кэш ответов Router Agent: точное совпадение нормализованного вопроса,
+    затем поиск почти такого же вопроса по косинусной близости эмбеддингов.
+
+    Близкий по эмбеддингу вопрос отвечается из кэша, только если в нём те же
+    числа и сущности БД (entity_index): «email Иванова» и «email Петрова»
+    близки по вектору, но ответы у них разные.
+
+    Записи живут ttl_seconds, размер ограничен max_size (LRU). Кэш целиком
+    сбрасывается, если изменился любой из watched_paths (манифест индекса RAG,
+    SQLite БД и т.п.).
+    """
+
+    def __init__(
+        self,
+        embeddings: Optional[Embeddings],
+        max_size: int = 1000,
+        ttl_seconds: float = 3600,
+        similarity_threshold: float = 0.95,
+        watched_paths: tuple[str, ...] = (),
+        entity_index: Optional[EntityIndex] = None,
+    ):
+        self.embeddings = embeddings
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.watched_paths = [path for path in watched_paths if path]
+        self.entity_index = entity_index
+        # ключ -> (ответ, нормированный вектор вопроса или None, время записи, сущности и числа)
+        self._entries: OrderedDict[str, tuple[str, Optional[np.ndarray], float, frozenset]] = OrderedDict()
+        self._version = self._data_version()
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "invalidations": 0}
+
+    @staticmethod
+    def normalize(question: str) -> str:
+        question = re.sub(r"\s+", " ", question.strip().lower())
+        return question.rstrip("?!. ")
+
+    def _data_version(self) -> tuple:
+        version = []
+        for path in self.watched_paths:
+            try:
+                stat = os.stat(path)
+                version.append((path, stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                version.append((path, None, None))
+        return tuple(version)
+
+    def _check_version(self):
+        version = self._data_version()
+        if version != self._version:
+            self._version = version
+            self._entries.clear()
+            self.stats["invalidations"] += 1
+
+    def _evict_expired(self):
+        deadline = time.monotonic() - self.ttl_seconds
+        while self._entries:
+            key, (_, _, created, _) = next(iter(self._entries.items()))
+            if created >= deadline:
+                break
+            self._entries.popitem(last=False)
+
+    def _lookup_exact(self, key: str) -> Optional[str]:
+        self._check_version()
+        self._evict_expired()
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.stats["exact_hits"] += 1
+            return self._entries[key][0]
+        return None
+
+    def _signature(self, key: str) -> frozenset:
+        """Числа и сущности БД в вопросе: семантическое попадание только при их совпадении."""
+        signature = {("number", n.replace(",", ".")) for n in _NUMBER.findall(key)}
+        if self.entity_index is not None:
+            _, entities = self.entity_index.extract(key)
+            signature.update((slot, value.casefold()) for slot, value in entities)
+        return frozenset(signature)
+
+    def _lookup_semantic(self, vector: np.ndarray, signature: frozenset) -> Optional[str]:
+        keys = [
+            k for k, (_, v, _, s) in self._entries.items() if v is not None and s == signature
+        ]
+        if keys:
+            matrix = np.stack([self._entries[k][1] for k in keys])
+            scores = matrix @ vector
+            best = int(np.argmax(scores))
+            if scores[best] >= self.similarity_threshold:
+                self._entries.move_to_end(keys[best])
+                self.stats["semantic_hits"] += 1
+                return self._entries[keys[best]][0]
+        self.stats["misses"] += 1
+        return None
+
+    def _put(self, key: str, answer: str, vector: Optional[np.ndarray]):
+        self._entries[key] = (answer, vector, time.monotonic(), self._signature(key))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def get(self, question: str) -> tuple[Optional[str], Optional[np.ndarray]]:
+        """Возвращает (ответ или None, вектор вопроса для последующего put)."""
+        key = self.normalize(question)
+        answer = self._lookup_exact(key)
+        if answer is not None or self.embeddings is None:
+            if answer is None:
+                self.stats["misses"] += 1
+            return answer, None
+        vector = unit_vector(self.embeddings.embed_query(key))
+        return self._lookup_semantic(vector, self._signature(key)), vector
+
+    async def aget(self, question: str) -> tuple[Optional[str], Optional[np.ndarray]]:
+        key = self.normalize(question)
+        answer = self._lookup_exact(key)
+        if answer is not None or self.embeddings is None:
+            if answer is None:
+                self.stats["misses"] += 1
+            return answer, None
+        vector = unit_vector(await self.embeddings.aembed_query(key))
+        return self._lookup_semantic(vector, self._signature(key)), vector
+
+    def put(self, question: str, answer: str, vector: Optional[np.ndarray] = None):
+        self._put(self.normalize(question), answer, vector)
+
+    def metrics(self) -> dict:
+        return {**self.stats, "size": len(self._entries)}
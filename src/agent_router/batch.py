@@ -0,0 +1,193 @@
+"""Пакетная обработка вопросов Router Agent.
+
+Запуск: python -m src.agent_router.batch questions.jsonl -o answers.jsonl --concurrency 8
+Строка входного JSONL - {"id": ..., "question": ..., "conversation_id": ...} или просто строка.
+С --url вопросы отправляются на запущенный сервис (/agent/ask/batch).
+"""
+import sys
+import json
+import time
+import uuid
+import asyncio
+import argparse
+from typing import AsyncIterator, Iterable, Optional
+
+import httpx
+
+from src.config import settings
+from src.agent_router.answer_cache import AnswerCache
+from src.utils.models.resilience import get_status_code
+
+
+def parse_items(records: Iterable) -> list[dict]:
+    """Приводит записи пакета к виду {"id", "question", "conversation_id"}."""
+    items = []
+    for i, record in enumerate(records):
+        if isinstance(record, str):
+            record = {"question": record}
+        if not isinstance(record, dict) or not str(record.get("question") or "").strip():
+            raise ValueError(f"Элемент {i}: нужен непустой question")
+        items.append(
+            {
+                "id": record.get("id", i),
+                "question": record["question"],
+                "conversation_id": record.get("conversation_id"),
+            }
+        )
+    return items
+
+
+def parse_jsonl(text: str) -> list[dict]:
+    records = []
+    for line_number, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Строка {line_number}: некорректный JSON ({e.msg})")
+    return parse_items(records)
+
+
+class BatchRunner:
+    """Отвечает на пакет вопросов с ограничением параллельности.
+
+    Одинаковые (после нормализации) вопросы без conversation_id выполняются
+    один раз, ответ раздаётся всем дубликатам. Вопросы одного диалога
+    выполняются последовательно, в порядке пакета. Результаты отдаются по
+    мере готовности; ошибка одного вопроса (в т.ч. 429) не прерывает пакет.
+    Кэш ответов, эмбеддингов и реранкера Router Agent общие для всего пакета.
+    """
+
+    def __init__(self, router_agent, concurrency: int = 8):
+        self.router_agent = router_agent
+        self.concurrency = max(1, concurrency)
+
+    async def _answer(self, semaphore: asyncio.Semaphore, question: str, conversation_id: str) -> dict:
+        queued = time.perf_counter()
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                answer = await self.router_agent.aask(question, conversation_id=conversation_id)
+                result = {"status": "ok", "answer": answer}
+            except httpx.HTTPStatusError as e:
+                print(f"[ERROR] {str(e)}")
+                result = {"status": "error", "status_code": e.response.status_code, "error": str(e)}
+            except Exception as e:
+                print(f"[ERROR] {str(e)}")
+                result = {"status": "error", "status_code": get_status_code(e) or 500, "error": str(e)}
+            result["wait_seconds"] = round(start - queued, 3)
+            result["seconds"] = round(time.perf_counter() - start, 3)
+        return result
+
+    def _forget(self, conversation_id: str):
+        checkpointer = getattr(self.router_agent, "checkpointer", None)
+        if checkpointer is not None:
+            checkpointer.delete_thread(conversation_id)
+
+    async def run(self, items: list[dict]) -> AsyncIterator[dict]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+
+        unique: dict[str, list[dict]] = {}
+        conversations: dict[str, list[dict]] = {}
+        for item in items:
+            if item["conversation_id"]:
+                conversations.setdefault(item["conversation_id"], []).append(item)
+            else:
+                unique.setdefault(AnswerCache.normalize(item["question"]), []).append(item)
+
+        async def run_unique(group: list[dict]):
+            try:
+                # Каждый уникальный вопрос - отдельный новый диалог; после ответа он
+                # удаляется, чтобы пакет не вытеснял из памяти диалоги пользователей
+                conversation_id = uuid.uuid4().hex
+                try:
+                    result = await self._answer(semaphore, group[0]["question"], conversation_id)
+                finally:
+                    self._forget(conversation_id)
+                for i, item in enumerate(group):
+                    await queue.put({"id": item["id"], "question": item["question"], **result, "duplicate": i > 0})
+            finally:
+                await queue.put(done)
+
+        async def run_conversation(conversation_id: str, group: list[dict]):
+            try:
+                for item in group:
+                    result = await self._answer(semaphore, item["question"], conversation_id)
+                    await queue.put(
+                        {"id": item["id"], "question": item["question"], "conversation_id": conversation_id, **result}
+                    )
+            finally:
+                await queue.put(done)
+
+        tasks = [asyncio.create_task(run_unique(group)) for group in unique.values()]
+        tasks += [asyncio.create_task(run_conversation(cid, group)) for cid, group in conversations.items()]
+        running = len(tasks)
+        try:
+            while running:
+                result = await queue.get()
+                if result is done:
+                    running -= 1
+                    continue
+                yield result
+        finally:
+            # Генератор закрыт раньше времени (клиент отключился) - отменяем оставшиеся вопросы
+            for task in tasks:
+                task.cancel()
+
+
+async def _run_local(items: list[dict], concurrency: int) -> AsyncIterator[dict]:
+    from src.agent_router import load_router_agent
+
+    runner = BatchRunner(load_router_agent(), concurrency=concurrency)
+    async for result in runner.run(items):
+        yield result
+
+
+async def _run_remote(items: list[dict], concurrency: int, url: str) -> AsyncIterator[dict]:
+    body = "".join(json.dumps(item, ensure_ascii=False) + "\n" for item in items)
+    async with httpx.AsyncClient(base_url=url, timeout=None) as client:
+        async with client.stream(
+            "POST",
+            "/agent/ask/batch",
+            params={"concurrency": concurrency},
+            content=body.encode("utf-8"),
+            headers={"Content-Type": "application/x-ndjson"},
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if line.strip():
+                    yield json.loads(line)
+
+
+async def main(input_path: str, output_path: Optional[str], concurrency: int, url: Optional[str]):
+    with open(input_path, "r", encoding="utf-8") as f:
+        items = parse_jsonl(f.read())
+    print(f"[INFO] Вопросов в пакете: {len(items)}, параллельность: {concurrency}", file=sys.stderr)
+
+    results = _run_remote(items, concurrency, url) if url else _run_local(items, concurrency)
+    output = open(output_path, "w", encoding="utf-8") if output_path else sys.stdout
+    start, errors, total = time.perf_counter(), 0, 0
+    try:
+        async for result in results:
+            total += 1
+            errors += result["status"] != "ok"
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    elapsed = time.perf_counter() - start
+    print(f"[INFO] Готово: {total} ответов, ошибок: {errors}, за {elapsed:.2f} c", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Пакетные вопросы к Router Agent (JSONL -> JSONL)")
+    parser.add_argument("input", help="JSONL с вопросами")
+    parser.add_argument("-o", "--output", help="Куда писать ответы (по умолчанию stdout)")
+    parser.add_argument("--concurrency", type=int, default=settings.BATCH_CONCURRENCY)
+    parser.add_argument("--url", help="Адрес сервиса, например http://localhost:8000")
+    args = parser.parse_args()
+    asyncio.run(main(args.input, args.output, args.concurrency, args.url))
@@ -0,0 +1,121 @@
+import time
+import threading
+from typing import Any
+from collections import OrderedDict
+
+from langchain.agents.middleware import before_model
+from langchain_core.messages import HumanMessage, RemoveMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
+
+
+class BoundedMemorySaver(InMemorySaver):
+    """InMemorySaver с ограничением числа диалогов (LRU) и временем жизни (TTL).
+
+    Для каждого диалога хранится только несколько последних чекпоинтов,
+    поэтому память не растёт с числом шагов агента.
+    """
+
+    def __init__(
+        self,
+        max_threads: int = 1000,
+        ttl_seconds: float = 3600,
+        checkpoints_per_thread: int = 2,
+    ):
+        super().__init__()
+        self.max_threads = max_threads
+        self.ttl_seconds = ttl_seconds
+        self.checkpoints_per_thread = checkpoints_per_thread
+        self._last_seen: OrderedDict[str, float] = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get_tuple(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            self._evict_expired()
+            if thread_id in self._last_seen:
+                self._touch(thread_id)
+            return super().get_tuple(config)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            saved = super().put(config, checkpoint, metadata, new_versions)
+            self._touch(thread_id)
+            self._prune_checkpoints(thread_id)
+            self._evict_expired()
+            while len(self._last_seen) > self.max_threads:
+                oldest, _ = self._last_seen.popitem(last=False)
+                super().delete_thread(oldest)
+            return saved
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._last_seen.pop(thread_id, None)
+            super().delete_thread(thread_id)
+
+    @property
+    def thread_count(self) -> int:
+        return len(self._last_seen)
+
+    def _touch(self, thread_id: str):
+        self._last_seen[thread_id] = time.monotonic()
+        self._last_seen.move_to_end(thread_id)
+
+    def _evict_expired(self):
+        """Удаляет диалоги, к которым не обращались дольше ttl_seconds."""
+        deadline = time.monotonic() - self.ttl_seconds
+        while self._last_seen:
+            thread_id, last_seen = next(iter(self._last_seen.items()))
+            if last_seen >= deadline:
+                break
+            self._last_seen.popitem(last=False)
+            super().delete_thread(thread_id)
+
+    def _prune_checkpoints(self, thread_id: str):
+        """Оставляет последние checkpoints_per_thread чекпоинтов и их блобы."""
+        for checkpoint_ns, checkpoints in self.storage[thread_id].items():
+            # id чекпоинтов монотонно возрастают (uuid6)
+            ids = sorted(checkpoints)
+            for checkpoint_id in ids[: -self.checkpoints_per_thread]:
+                del checkpoints[checkpoint_id]
+                self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+
+            used_versions = set()
+            for serialized, _, _ in checkpoints.values():
+                versions = self.serde.loads_typed(serialized)["channel_versions"]
+                used_versions.update(versions.items())
+
+            for key in list(self.blobs.keys()):
+                if key[:2] == (thread_id, checkpoint_ns) and key[2:] not in used_versions:
+                    del self.blobs[key]
+
+
+def create_history_trimmer(max_turns: int = 5, max_tokens: int = 4000):
+    """Middleware, обрезающее историю диалога перед вызовом модели.
+
+    Оставляет последние max_turns ходов (ход начинается с сообщения
+    пользователя) и укладывает их в max_tokens. Последний ход не режется,
+    чтобы не разрывать пары tool_call / tool.
+    """
+
+    @before_model
+    def trim_history(state, runtime) -> dict[str, Any] | None:
+        messages = state["messages"]
+        turn_starts = [i for i, m in enumerate(messages) if isinstance(m, HumanMessage)]
+        if not turn_starts:
+            return None
+
+        turn_starts = turn_starts[-max_turns:]
+        start = turn_starts[0]
+        for candidate in turn_starts:
+            start = candidate
+            if count_tokens_approximately(messages[candidate:]) <= max_tokens:
+                break
+
+        if start == 0:
+            return None
+        return {"messages": [RemoveMessage(id=REMOVE_ALL_MESSAGES), *messages[start:]]}
+
+    return trim_history
@@ -0,0 +1,166 @@
+import re
+import asyncio
+from typing import Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src.utils.utils import unit_vector
+
+
+# Размеченные примеры вопросов для каждого инструмента
+EXAMPLES: dict[str, list[str]] = {
+    "rag": [
+        "Из чего состоит архитектура MaxPatrol 10?",
+        "Как установить MaxPatrol 10?",
+        "Какие компоненты входят в MaxPatrol 10?",
+        "Как настроить сканирование в MaxPatrol?",
+        "Какие порты использует MP 10 Core?",
+        "Что означает ошибка при запуске агента MaxPatrol?",
+    ],
+    "sql": [
+        "Какая почта у сотрудника Джека Тэйлора?",
+        "Какая роль у сотрудника Jane Doe?",
+        "Сколько лет опыта у Alice Williams?",
+        "Кто из сотрудников занимается интеграцией с SIEM?",
+        "Какие области экспертизы есть у Bob Johnson?",
+        "Список сотрудников с опытом больше 5 лет",
+    ],
+    "web": [
+        "Какие последние новости о кибербезопасности?",
+        "Какой сегодня курс доллара?",
+        "Найди в интернете информацию о CVE-2024-3094",
+        "Какая погода в Москве?",
+        "Что нового в Python 3.13?",
+        "Кто выиграл чемпионат мира по футболу?",
+    ],
+}
+
+# Ключевые слова (регулярные выражения по основам) и их веса
+KEYWORDS: dict[str, dict[str, float]] = {
+    "rag": {
+        r"max\s*patrol|\bmp\s*10\b|мп\s*10": 2.0,
+        r"документаци": 1.5,
+        r"архитектур|компонент|установ|настро|конфигур|сканирован|развёрт|разверт": 1.0,
+    },
+    "sql": {
+        r"сотрудник|работник|коллег": 2.0,
+        r"почт|e-?mail|имейл": 1.5,
+        r"\bроль\b|\bроли\b|должност|опыт[а-я]* работы|лет опыта|стаж|экспертиз": 1.0,
+        r"база данных|в базе|\bбд\b": 1.0,
+    },
+    "web": {
+        r"в интернете|в сети|загугли|погугли": 2.0,
+        r"новост|курс (валют|доллар|евро)|погод": 1.5,
+        r"сегодня|последн[а-я]* верси|что нового": 1.0,
+    },
+}
+
+
+class PreRouter:
+    """Быстрая классификация вопроса в один инструмент без вызова LLM.
+
+    Комбинирует ключевые слова и (если передана эмбеддинг-модель) близость
+    к центроидам размеченных примеров. Если уверенность ниже threshold
+    или сигналы противоречат друг другу, возвращает None - тогда вопрос
+    уходит в LLM Router Agent.
+    """
+
+    def __init__(
+        self,
+        embeddings: Optional[Embeddings] = None,
+        threshold: float = 0.7,
+        examples: Optional[dict[str, list[str]]] = None,
+        keywords: Optional[dict[str, dict[str, float]]] = None,
+    ):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.examples = examples or EXAMPLES
+        self.keywords = {
+            tool: [(re.compile(pattern, re.IGNORECASE), weight) for pattern, weight in patterns.items()]
+            for tool, patterns in (keywords or KEYWORDS).items()
+        }
+        self._centroids: Optional[dict[str, np.ndarray]] = None
+        self._centroids_lock = asyncio.Lock()
+        self.stats = {"fast_path": {tool: 0 for tool in self.examples}, "fallback": 0}
+
+    def _build_centroids(self, vectors: list[list[float]]) -> dict[str, np.ndarray]:
+        centroids, start = {}, 0
+        for tool, examples in self.examples.items():
+            block = np.stack([unit_vector(v) for v in vectors[start : start + len(examples)]])
+            centroids[tool] = unit_vector(block.mean(axis=0))
+            start += len(examples)
+        return centroids
+
+    def _all_examples(self) -> list[str]:
+        return [text for examples in self.examples.values() for text in examples]
+
+    def _keyword_vote(self, query: str) -> tuple[Optional[str], float]:
+        scores = {
+            tool: sum(weight for pattern, weight in patterns if pattern.search(query))
+            for tool, patterns in self.keywords.items()
+        }
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        (best, top), (_, second) = ranked[0], ranked[1]
+        if top == 0:
+            return None, 0.0
+        # Уверенность растёт с весом совпадений и падает при конкуренции инструментов
+        return best, (top - second) / (top + 0.5)
+
+    def _embedding_vote(self, vector) -> tuple[Optional[str], float]:
+        query = unit_vector(vector)
+        sims = sorted(
+            ((tool, float(centroid @ query)) for tool, centroid in self._centroids.items()),
+            key=lambda item: item[1],
+            reverse=True,
+        )
+        (best, top), (_, second) = sims[0], sims[1]
+        # Отрыв 0.1 по косинусу считаем полной уверенностью
+        return best, min(1.0, max(0.0, (top - second) / 0.1))
+
+    def _decide(self, keyword_vote, embedding_vote) -> Optional[str]:
+        votes = [vote for vote in (keyword_vote, embedding_vote) if vote[0] is not None]
+        if not votes or len({tool for tool, _ in votes}) > 1:
+            self.stats["fallback"] += 1
+            return None
+        tool = votes[0][0]
+        if max(confidence for _, confidence in votes) < self.threshold:
+            self.stats["fallback"] += 1
+            return None
+        self.stats["fast_path"][tool] += 1
+        return tool
+
+    def classify(self, query: str, vector=None) -> Optional[str]:
+        """Возвращает ключ инструмента ("rag" / "sql" / "web") или None.
+
+        vector - уже посчитанный эмбеддинг вопроса (например, из кэша ответов).
+        """
+        embedding_vote = (None, 0.0)
+        if self.embeddings is not None:
+            if self._centroids is None:
+                self._centroids = self._build_centroids(
+                    self.embeddings.embed_documents(self._all_examples())
+                )
+            if vector is None:
+                vector = self.embeddings.embed_query(query)
+            embedding_vote = self._embedding_vote(vector)
+        return self._decide(self._keyword_vote(query), embedding_vote)
+
+    async def aclassify(self, query: str, vector=None) -> Optional[str]:
+        embedding_vote = (None, 0.0)
+        if self.embeddings is not None:
+            # Параллельные первые запросы не должны векторизовать примеры по несколько раз
+            async with self._centroids_lock:
+                if self._centroids is None:
+                    self._centroids = self._build_centroids(
+                        await self.embeddings.aembed_documents(self._all_examples())
+                    )
+            if vector is None:
+                vector = await self.embeddings.aembed_query(query)
+            embedding_vote = self._embedding_vote(vector)
+        return self._decide(self._keyword_vote(query), embedding_vote)
+
+    def metrics(self) -> dict:
+        fired = sum(self.stats["fast_path"].values())
+        total = fired + self.stats["fallback"]
+        return {**self.stats, "fast_path_rate": round(fired / total, 3) if total else 0.0}
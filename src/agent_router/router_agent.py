@@ -1,8 +1,15 @@
+import asyncio
+from typing import AsyncIterator, Optional
+
 from langchain.agents import create_agent
 from langchain_core.tools import Tool
-from langgraph.checkpoint.memory import InMemorySaver 
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
 from langchain_core.language_models import BaseChatModel
 
+from src.config import settings
+from src.agent_router.answer_cache import AnswerCache
+from src.agent_router.pre_router import PreRouter
+from src.agent_router.memory import BoundedMemorySaver, create_history_trimmer
 from src.agent_router.tools.rag_tool import RAGTool
 from src.agent_router.tools.sql_tool import SQLTool
 from src.agent_router.tools.web_tool import WebTool
@@ -11,9 +18,21 @@ from src.agent_router.tools.web_tool import WebTool
 class RouterAgent:
     """Агент-оркерстратор"""
 
-    def __init__(self, llm: BaseChatModel):
+    # Ключ инструмента -> имя инструмента, которое видит LLM
+    TOOL_NAMES = {"rag": "RAG", "sql": "SQL", "web": "Web"}
+
+    def __init__(
+        self,
+        llm: BaseChatModel,
+        tools: Optional[dict] = None,
+        answer_cache: Optional[AnswerCache] = None,
+        pre_router: Optional[PreRouter] = None,
+    ):
         self.llm = llm
-        self.tools = {
+        self.answer_cache = answer_cache
+        self.pre_router = pre_router
+        # tools можно передать явно (например, заглушки для нагрузочного теста)
+        self.tools = tools or {
             "rag": RAGTool(),
             "sql": SQLTool(),
             "web": WebTool(),
@@ -34,31 +53,242 @@ class RouterAgent:
                     - Не выдумывай ответы, опирайся только на достоверные данные.
                     """
 
+        self.stats = {"streams": 0, "streams_cancelled": 0}
         self.tools_list = [
             Tool(
                 name="RAG",
                 func=self.tools["rag"].run,
+                coroutine=self.tools["rag"].arun,
                 description="Для поиска информации во внутренней документации",
             ),
             Tool(
                 name="SQL",
                 func=self.tools["sql"].run,
+                coroutine=self.tools["sql"].arun,
                 description="Для получения информации из базы данных",
             ),
             Tool(
                 name="Web",
                 func=self.tools["web"].run,
+                coroutine=self.tools["web"].arun,
                 description="Для поиска информации в интернете",
             ),
         ]
 
-        self.agent = create_agent(self.llm, self.tools_list, system_prompt=self.prompt, checkpointer=InMemorySaver())
+        self.checkpointer = BoundedMemorySaver(
+            max_threads=settings.CONVERSATION_MAX_THREADS,
+            ttl_seconds=settings.CONVERSATION_TTL,
+        )
+        self.agent = create_agent(
+            self.llm,
+            self.tools_list,
+            system_prompt=self.prompt,
+            middleware=[
+                create_history_trimmer(
+                    max_turns=settings.HISTORY_MAX_TURNS,
+                    max_tokens=settings.HISTORY_MAX_TOKENS,
+                )
+            ],
+            checkpointer=self.checkpointer,
+        )
+
+    @staticmethod
+    def _config(conversation_id: str) -> dict:
+        return {"configurable": {"thread_id": conversation_id}}
+
+    def _is_new_conversation(self, config: dict) -> bool:
+        """Кэш и быстрый путь применяются только к первому вопросу диалога:
+        дальше ответ зависит от истории, которую видит только LLM Router."""
+        return self.checkpointer.get_tuple(config) is None
+
+    @staticmethod
+    def _turn(query: str, answer: str) -> dict:
+        # Ответ, полученный без Router LLM, записывается в историю, чтобы диалог можно было продолжить
+        return {"messages": [HumanMessage(content=query), AIMessage(content=answer)]}
+
+    def _synthesis_messages(self, query: str, context: str) -> list:
+        return [
+            SystemMessage(content=self.prompt),
+            HumanMessage(content=f"Вопрос: {query}\n\nДанные инструмента:\n{context}"),
+        ]
+
+    def _run_tool(self, key: str, query: str) -> str:
+        """Быстрый путь: вызов инструмента напрямую. Если инструмент вернул
+        контекст (фрагменты документации, результаты поиска), ответ формирует
+        один вызов LLM вместо полного цикла Router Agent."""
+        tool = self.tools[key]
+        result = tool.run(query)
+        if getattr(tool, "returns_answer", True):
+            return result
+        return self.llm.invoke(self._synthesis_messages(query, result)).content
 
+    async def _arun_tool(self, key: str, query: str) -> str:
+        tool = self.tools[key]
+        result = await tool.arun(query)
+        if getattr(tool, "returns_answer", True):
+            return result
+        response = await self.llm.ainvoke(self._synthesis_messages(query, result))
+        return response.content
 
-    def ask(self, query: str) -> str:
+    def ask(self, query: str, conversation_id: str = "default") -> str:
         """Отправляет запрос агенту с учётом контекста диалога."""
-        response = self.agent.invoke(
-            input={"messages": [{"role": "user", "content": query}]},
-            config={"configurable": {"thread_id": "1"}},
-        )
-        return response["messages"][-1].content
+        config = self._config(conversation_id)
+        new_conversation = self._is_new_conversation(config)
+        vector = None
+        if new_conversation and self.answer_cache:
+            answer, vector = self.answer_cache.get(query)
+            if answer is not None:
+                self.agent.update_state(config, self._turn(query, answer))
+                return answer
+
+        tool = None
+        if new_conversation and self.pre_router:
+            tool = self.pre_router.classify(query, vector)
+
+        if tool:
+            answer = self._run_tool(tool, query)
+            self.agent.update_state(config, self._turn(query, answer))
+        else:
+            response = self.agent.invoke(
+                input={"messages": [{"role": "user", "content": query}]},
+                config=config,
+            )
+            answer = response["messages"][-1].content
+
+        if new_conversation and self.answer_cache and answer:
+            self.answer_cache.put(query, answer, vector)
+        return answer
+
+    async def aask(self, query: str, conversation_id: str = "default") -> str:
+        """Асинхронная версия ask: LLM и инструменты вызываются через ainvoke."""
+        config = self._config(conversation_id)
+        new_conversation = self._is_new_conversation(config)
+        vector = None
+        if new_conversation and self.answer_cache:
+            answer, vector = await self.answer_cache.aget(query)
+            if answer is not None:
+                await self.agent.aupdate_state(config, self._turn(query, answer))
+                return answer
+
+        tool = None
+        if new_conversation and self.pre_router:
+            tool = await self.pre_router.aclassify(query, vector)
+
+        if tool:
+            answer = await self._arun_tool(tool, query)
+            await self.agent.aupdate_state(config, self._turn(query, answer))
+        else:
+            response = await self.agent.ainvoke(
+                input={"messages": [{"role": "user", "content": query}]},
+                config=config,
+            )
+            answer = response["messages"][-1].content
+
+        if new_conversation and self.answer_cache and answer:
+            self.answer_cache.put(query, answer, vector)
+        return answer
+
+    async def _astream_agent(self, query: str, config: dict) -> AsyncIterator[dict]:
+        """Полный цикл Router Agent: решения о маршруте и вызовы инструментов
+        берутся из обновлений узлов графа, токены - из потока сообщений LLM."""
+        async for mode, chunk in self.agent.astream(
+            {"messages": [{"role": "user", "content": query}]},
+            config=config,
+            stream_mode=["updates", "messages"],
+        ):
+            if mode == "messages":
+                message, metadata = chunk
+                # Токены вложенных агентов (RAG в режиме agent) имеют составной namespace - пропускаем
+                nested = "|" in metadata.get("langgraph_checkpoint_ns", "")
+                # Модели без потоковой генерации присылают сообщение целиком
+                if (
+                    isinstance(message, AIMessage)
+                    and metadata.get("langgraph_node") == "model"
+                    and not nested
+                    and not (message.tool_calls or getattr(message, "tool_call_chunks", None))
+                    and message.text
+                ):
+                    yield {"event": "token", "data": {"text": message.text}}
+                continue
+
+            # Middleware (обрезка истории) возвращает прежние сообщения диалога -
+            # события берутся только из узлов model и tools
+            for node, update in chunk.items():
+                for message in (update or {}).get("messages", []):
+                    if isinstance(message, AIMessage) and message.tool_calls and node == "model":
+                        names = [call["name"] for call in message.tool_calls]
+                        yield {"event": "route", "data": {"tools": names, "source": "llm"}}
+                        for call in message.tool_calls:
+                            yield {"event": "tool_start", "data": {"tool": call["name"], "input": call["args"]}}
+                    elif isinstance(message, ToolMessage) and node == "tools":
+                        yield {"event": "tool_end", "data": {"tool": message.name}}
+                    elif isinstance(message, AIMessage) and node == "model":
+                        yield {"event": "final", "data": {"answer": message.text}}
+
+    async def _astream_tool(self, key: str, query: str) -> AsyncIterator[dict]:
+        """Быстрый путь с потоковым синтезом ответа."""
+        name = self.TOOL_NAMES.get(key, key)
+        tool = self.tools[key]
+        yield {"event": "route", "data": {"tools": [name], "source": "pre_router"}}
+        yield {"event": "tool_start", "data": {"tool": name, "input": query}}
+        result = await tool.arun(query)
+        yield {"event": "tool_end", "data": {"tool": name}}
+        if getattr(tool, "returns_answer", True):
+            yield {"event": "token", "data": {"text": result}}
+            yield {"event": "final", "data": {"answer": result}}
+            return
+        parts = []
+        async for chunk in self.llm.astream(self._synthesis_messages(query, result)):
+            if chunk.text:
+                parts.append(chunk.text)
+                yield {"event": "token", "data": {"text": chunk.text}}
+        yield {"event": "final", "data": {"answer": "".join(parts)}}
+
+    async def astream(self, query: str, conversation_id: str = "default") -> AsyncIterator[dict]:
+        """Потоковая версия aask: события route / tool_start / tool_end / token,
+        последним - answer с полным ответом. Если генератор отменён (клиент
+        отключился), текущий вызов LLM или инструмента прерывается."""
+        self.stats["streams"] += 1
+        config = self._config(conversation_id)
+        try:
+            new_conversation = self._is_new_conversation(config)
+            vector = None
+            if new_conversation and self.answer_cache:
+                answer, vector = await self.answer_cache.aget(query)
+                if answer is not None:
+                    await self.agent.aupdate_state(config, self._turn(query, answer))
+                    yield {"event": "route", "data": {"tools": [], "source": "cache"}}
+                    yield {"event": "token", "data": {"text": answer}}
+                    yield {"event": "answer", "data": {"answer": answer, "conversation_id": conversation_id}}
+                    return
+
+            tool = None
+            if new_conversation and self.pre_router:
+                tool = await self.pre_router.aclassify(query, vector)
+
+            answer = ""
+            events = self._astream_tool(tool, query) if tool else self._astream_agent(query, config)
+            async for event in events:
+                if event["event"] == "final":
+                    answer = event["data"]["answer"]
+                    continue
+                yield event
+
+            if tool:
+                await self.agent.aupdate_state(config, self._turn(query, answer))
+            if new_conversation and self.answer_cache and answer:
+                self.answer_cache.put(query, answer, vector)
+            yield {"event": "answer", "data": {"answer": answer, "conversation_id": conversation_id}}
+        except asyncio.CancelledError:
+            self.stats["streams_cancelled"] += 1
+            raise
+
+    def metrics(self) -> dict:
+        """Метрики Router Agent для /agent/metrics."""
+        return {
+            "conversations": self.checkpointer.thread_count,
+            "streams": dict(self.stats),
+            "answer_cache": self.answer_cache.metrics() if self.answer_cache else None,
+            "pre_router": self.pre_router.metrics() if self.pre_router else None,
+            "sql": self.tools["sql"].metrics() if hasattr(self.tools["sql"], "metrics") else None,
+        }
@@ -1,9 +1,31 @@
-from src.rag import load_rag_agent
+from typing import Optional
+
+from src.config import settings
+from src.rag import RAGAgent, load_rag_agent
 
 
 class RAGTool:
-    def __init__(self):
-        self.rag_agent = load_rag_agent()
-    
+    """Инструмент RAG для Router Agent.
+
+    mode="retrieval" - Router получает найденные фрагменты документации напрямую
+    (без вложенного агента и лишних вызовов LLM), mode="agent" - ответ RAG агента.
+    """
+
+    def __init__(self, rag_agent: Optional[RAGAgent] = None, mode: Optional[str] = None):
+        self.rag_agent = rag_agent or load_rag_agent()
+        self.mode = mode or settings.RAG_TOOL_MODE
+
+    @property
+    def returns_answer(self) -> bool:
+        """True, если run возвращает готовый ответ, а не контекст для LLM."""
+        return self.mode == "agent"
+
     def run(self, query: str) -> str:
-        return self.rag_agent.ask(query)
\ No newline at end of file
+        if self.mode == "agent":
+            return self.rag_agent.ask(query)
+        return self.rag_agent.retrieve(query)
+
+    async def arun(self, query: str) -> str:
+        if self.mode == "agent":
+            return await self.rag_agent.aask(query)
+        return await self.rag_agent.aretrieve(query)
@@ -1,9 +1,34 @@
-from src.sql import load_sql_agent
+from typing import Optional
+
+from src.config import settings
+from src.sql import SQLAgent, load_sql_agent
 
 
 class SQLTool:
-    def __init__(self):
-        self.sql_agent = load_sql_agent()
-    
+    """Инструмент SQL для Router Agent.
+
+    mode="query" - один вызов LLM пишет SQL по схеме из промпта, Router получает
+    результат запроса (ответ формирует сам), mode="agent" - ответ SQL агента.
+    """
+
+    def __init__(self, sql_agent: Optional[SQLAgent] = None, mode: Optional[str] = None):
+        self.sql_agent = sql_agent or load_sql_agent()
+        self.mode = mode or settings.SQL_TOOL_MODE
+
+    @property
+    def returns_answer(self) -> bool:
+        """True, если run возвращает готовый ответ, а не контекст для LLM."""
+        return self.mode == "agent"
+
     def run(self, query: str) -> str:
-        return self.sql_agent.ask(query)
\ No newline at end of file
+        if self.mode == "agent":
+            return self.sql_agent.ask(query)
+        return self.sql_agent.retrieve(query)
+
+    async def arun(self, query: str) -> str:
+        if self.mode == "agent":
+            return await self.sql_agent.aask(query)
+        return await self.sql_agent.aretrieve(query)
+
+    def metrics(self) -> dict:
+        return self.sql_agent.metrics()
@@ -2,9 +2,17 @@ from langchain_community.tools import DuckDuckGoSearchRun
 
 
 class WebTool:
+    # Возвращает сырые результаты поиска, а не готовый ответ
+    returns_answer = False
+
     def __init__(self):
         self.search = DuckDuckGoSearchRun()
 
     def run(self, query: str) -> str:
         response = self.search.invoke(query)
         return response
+
+    async def arun(self, query: str) -> str:
+        # DuckDuckGoSearchRun синхронный - ainvoke выполняет его в пуле потоков
+        response = await self.search.ainvoke(query)
+        return response
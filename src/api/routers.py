@@ -1,10 +1,22 @@
+import json
+import uuid
 import httpx
+import asyncio
 
+from typing import AsyncIterator, Optional
 from contextlib import asynccontextmanager
 from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.datastructures import UploadFile
 
-from src.api.schemas import QueryRequest, QueryResponse
+from pydantic import ValidationError
+
+from src.config import settings
+from src.api.schemas import BatchRequest, QueryRequest, QueryResponse
 from src.agent_router import load_router_agent
+from src.agent_router.batch import BatchRunner, parse_items, parse_jsonl
+from src.utils.models.llm_factory import get_http_metrics, get_provider_metrics, get_routing_metrics
+from src.utils.models.resilience import CircuitOpenError
 
 
 @asynccontextmanager
@@ -22,6 +34,66 @@ async def lifespan(app: APIRouter):
 router = APIRouter(prefix="/agent", lifespan=lifespan)
 
 
+def _llm_error_detail(e: httpx.HTTPStatusError) -> str:
+    code = e.response.status_code
+    if code == 429:
+        return "Сервис перегружен (Mistral 429). Попробуйте позже."
+    if code == 400:
+        return "Ошибка в запросе к модели (400). Проверьте формат запроса."
+    if code >= 500:
+        return "Проблема на стороне модели (500). Попробуйте позже."
+    return f"Ошибка при обращении к LLM: {e.response.text}"
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _stream_events(
+    request: Request, events: AsyncIterator[dict], poll_interval: float = 0.5
+) -> AsyncIterator[str]:
+    """Переводит события Router Agent в SSE. Цепочка выполняется в отдельной
+    задаче: если клиент отключился, задача отменяется вместе с текущим
+    вызовом LLM или инструмента."""
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    async def produce():
+        try:
+            async for event in events:
+                await queue.put(event)
+        except httpx.HTTPStatusError as e:
+            print(f"[ERROR] {str(e)}")
+            error = {"status": e.response.status_code, "detail": _llm_error_detail(e)}
+            await queue.put({"event": "error", "data": error})
+        except CircuitOpenError as e:
+            print(f"[ERROR] {str(e)}")
+            await queue.put({"event": "error", "data": {"status": 503, "detail": f"{str(e)}. Попробуйте позже."}})
+        except Exception as e:
+            print(f"[ERROR] {str(e)}")
+            error = {"status": 500, "detail": f"Неизвестная ошибка при работе с агентом: {str(e)}"}
+            await queue.put({"event": "error", "data": error})
+        finally:
+            await queue.put(done)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=poll_interval)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    print("[INFO] Клиент отключился, цепочка агента отменена")
+                    break
+                continue
+            if event is done:
+                break
+            yield _sse(event["event"], event["data"])
+    finally:
+        if not producer.done():
+            producer.cancel()
+
+
 @router.post("/ask", response_model=QueryResponse)
 async def ask_agent(request: Request, query: QueryRequest):
     """Ответ от Агента-оркерстратора"""
@@ -29,21 +101,16 @@ async def ask_agent(request: Request, query: QueryRequest):
     if router_agent is None:
         raise HTTPException(status_code=500, detail="Router Agent не инициализирован")
     try:
-        answer = router_agent.ask(query.question)
-        return QueryResponse(answer=answer)
+        conversation_id = query.conversation_id or uuid.uuid4().hex
+        answer = await router_agent.aask(query.question, conversation_id=conversation_id)
+        return QueryResponse(answer=answer, conversation_id=conversation_id)
     except httpx.HTTPStatusError as e:
         # Ловим ошибки, которые возвращает API Mistral
-        code = e.response.status_code
-        if code == 429:
-            detail = "Сервис перегружен (Mistral 429). Попробуйте позже."
-        elif code == 400:
-            detail = "Ошибка в запросе к модели (400). Проверьте формат запроса."
-        elif code >= 500:
-            detail = "Проблема на стороне модели (500). Попробуйте позже."
-        else:
-            detail = f"Ошибка при обращении к LLM: {e.response.text}"
         print(f"[ERROR] {str(e)}")
-        raise HTTPException(status_code=code, detail=detail)
+        raise HTTPException(status_code=e.response.status_code, detail=_llm_error_detail(e))
+    except CircuitOpenError as e:
+        print(f"[ERROR] {str(e)}")
+        raise HTTPException(status_code=503, detail=f"{str(e)}. Попробуйте позже.")
 
     except Exception as e:
         # Все остальные ошибки
@@ -52,3 +119,77 @@ async def ask_agent(request: Request, query: QueryRequest):
             status_code=500,
             detail=f"Неизвестная ошибка при работе с агентом: {str(e)}",
         )
+
+
+@router.post("/ask/stream")
+async def ask_agent_stream(request: Request, query: QueryRequest):
+    """Потоковый ответ Агента-оркерстратора (Server-Sent Events)"""
+    router_agent = getattr(request.app.state, "router_agent", None)
+    if router_agent is None:
+        raise HTTPException(status_code=500, detail="Router Agent не инициализирован")
+    conversation_id = query.conversation_id or uuid.uuid4().hex
+    events = router_agent.astream(query.question, conversation_id=conversation_id)
+    return StreamingResponse(
+        _stream_events(request, events),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/ask/batch")
+async def ask_agent_batch(request: Request, concurrency: Optional[int] = None):
+    """Пакет вопросов: JSON (BatchRequest), JSONL в теле запроса или загруженный
+    JSONL файл (multipart/form-data, берётся первый файл формы).
+    Ответы возвращаются JSONL по мере готовности, со статусом и временем на каждый вопрос."""
+    router_agent = getattr(request.app.state, "router_agent", None)
+    if router_agent is None:
+        raise HTTPException(status_code=500, detail="Router Agent не инициализирован")
+
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        # curl -F file=@questions.jsonl
+        async with request.form() as form:
+            upload = next((value for value in form.values() if isinstance(value, UploadFile)), None)
+            if upload is None:
+                raise HTTPException(status_code=400, detail="Некорректный пакет: в форме нет файла с вопросами")
+            body = await upload.read()
+    else:
+        body = await request.body()
+    try:
+        if content_type.startswith("application/json"):
+            batch = BatchRequest.model_validate_json(body)
+            items = parse_items(
+                q if isinstance(q, str) else q.model_dump(exclude_none=True) for q in batch.questions
+            )
+            concurrency = concurrency or batch.concurrency
+        else:
+            items = parse_jsonl(body.decode("utf-8"))
+    except (ValidationError, ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Некорректный пакет: {str(e)}")
+    if len(items) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Не больше {settings.BATCH_MAX_ITEMS} вопросов в пакете")
+
+    runner = BatchRunner(
+        router_agent, concurrency=min(concurrency or settings.BATCH_CONCURRENCY, settings.BATCH_MAX_CONCURRENCY)
+    )
+
+    async def lines():
+        async for result in runner.run(items):
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.get("/metrics")
+async def agent_metrics(request: Request):
+    """Метрики Router Agent (кэш ответов, диалоги и т.д.)"""
+    router_agent = getattr(request.app.state, "router_agent", None)
+    if router_agent is None:
+        raise HTTPException(status_code=500, detail="Router Agent не инициализирован")
+    # Лимиты провайдеров LLM: глубина очереди, время ожидания, повторы, состояние автомата
+    return {
+        **router_agent.metrics(),
+        "providers": get_provider_metrics(),
+        "routing": get_routing_metrics(),
+        "http": get_http_metrics(),
+    }
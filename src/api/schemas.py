@@ -1,8 +1,24 @@
+from typing import Optional, Union
 from pydantic import BaseModel
 
 
 class QueryRequest(BaseModel):
     question: str
+    # Идентификатор диалога; если не передан, начинается новый диалог
+    conversation_id: Optional[str] = None
 
 class QueryResponse(BaseModel):
-    answer: str
\ No newline at end of file
+    answer: str
+    conversation_id: Optional[str] = None
+
+
+class BatchItem(BaseModel):
+    question: str
+    id: Optional[Union[str, int]] = None
+    # Вопросы одного диалога выполняются последовательно
+    conversation_id: Optional[str] = None
+
+class BatchRequest(BaseModel):
+    # Вопрос можно передать строкой или объектом
+    questions: list[Union[str, BatchItem]]
+    concurrency: Optional[int] = None
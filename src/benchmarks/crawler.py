@@ -0,0 +1,187 @@
+"""Бенчмарк извлечения страниц crawler: одна отрисовка (target_elements) против
+прежних двух (вся страница + css_selector="content-container").
+
+Фикстура - локальный сайт из --pages HTML-страниц в разметке справочного
+портала: заголовок, навигация, footer и <content-container>, который
+заполняется скриптом через --render-delay мс (как у SPA портала).
+Сайт раздаётся встроенным HTTP-сервером, сеть не нужна; нужен браузер
+Playwright (playwright install chromium) или --cdp-url запущенного Chrome.
+
+Запуск: python -m src.benchmarks.crawler --pages 40 --concurrency 5
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import threading
+import difflib
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from crawl4ai import AsyncWebCrawler, BrowserConfig
+
+from src.config import settings
+from src.crawler import BaseCrawler, CONTENT_SELECTOR
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="ru">
+<head><meta charset="utf-8"><title>Раздел {i} · MaxPatrol 10 · Справочный портал</title></head>
+<body>
+<nav>{nav}</nav>
+<content-container></content-container>
+<footer>© Positive Technologies · <a href="/cookie-policy.html">cookie</a></footer>
+<script>
+setTimeout(() => {{
+  document.querySelector('content-container').innerHTML = {content};
+}}, {delay});
+</script>
+</body>
+</html>
+"""
+
+
+def build_fixture(path: str, pages: int, render_delay: int = 300, links: int = 5, paragraphs: int = 8) -> list[str]:
+    """Создаёт страницы фикстуры и возвращает их пути."""
+    names = []
+    for i in range(pages):
+        nav = " ".join(
+            f'<a href="/page{(i + k) % pages}.html">Раздел {(i + k) % pages}</a>' for k in range(1, links + 1)
+        )
+        body = f"<h1>Раздел {i}</h1>" + "".join(
+            f"<p>Параграф {p} раздела {i}: настройка компонента MP{i}-{p}, порт {8000 + p}. "
+            f'Подробнее см. <a href="/page{(i + p) % pages}.html">раздел {(i + p) % pages}</a>.</p>'
+            for p in range(paragraphs)
+        )
+        names.append(f"page{i}.html")
+        with open(os.path.join(path, names[-1]), "w", encoding="utf-8") as fp:
+            fp.write(PAGE_TEMPLATE.format(i=i, nav=nav, content=json.dumps(body), delay=render_delay))
+    return names
+
+
+def serve(path: str) -> tuple[ThreadingHTTPServer, str]:
+    class QuietHandler(SimpleHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(QuietHandler, directory=path))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+async def fetch_two_renders(page_crawler: BaseCrawler, crawler, url: str) -> dict:
+    """Прежний путь: страница отрисовывается дважды."""
+    run_config1 = page_crawler._build_run_config()
+    run_config2 = page_crawler._build_run_config(css_selector=CONTENT_SELECTOR)
+    result1, result2 = await asyncio.gather(
+        crawler.arun(url=url, config=run_config1),
+        crawler.arun(url=url, config=run_config2),
+    )
+    return {
+        "url": result1.url,
+        "title": page_crawler._clean_title(result1.metadata.get("title", "Без заголовка")),
+        "content": page_crawler._clean_text(result2.markdown.raw_markdown),
+        "internal_links": result1.links["internal"],
+        "external_links": result1.links["external"],
+    }
+
+
+async def fetch_single_render(page_crawler: BaseCrawler, crawler, url: str) -> Optional[dict]:
+    return await page_crawler._fetch_page_data(crawler, url)
+
+
+async def run_mode(name: str, fetch, urls: list[str], concurrency: int, cdp_url: Optional[str]) -> tuple[dict, dict]:
+    page_crawler = BaseCrawler(urls[0])
+    semaphore = asyncio.Semaphore(concurrency)
+    renders = 0
+    pages: dict[str, dict] = {}
+
+    async with AsyncWebCrawler(config=BrowserConfig(verbose=False, cdp_url=cdp_url)) as crawler:
+        arun = crawler.arun
+
+        async def counted_arun(*args, **kwargs):
+            nonlocal renders
+            renders += 1
+            return await arun(*args, **kwargs)
+
+        crawler.arun = counted_arun
+
+        async def one(url: str):
+            async with semaphore:
+                started = time.perf_counter()
+                page = await fetch(page_crawler, crawler, url)
+                return url, page, time.perf_counter() - started
+
+        # Прогрев: запуск браузера и первая вкладка не входят в замер
+        await fetch(page_crawler, crawler, urls[0])
+        renders = 0
+        started = time.perf_counter()
+        results = await asyncio.gather(*(one(url) for url in urls))
+        elapsed = time.perf_counter() - started
+
+    latencies = sorted(seconds for _, _, seconds in results)
+    for url, page, _ in results:
+        if page is not None:
+            pages[url] = page
+    row = {
+        "mode": name,
+        "pages": len(urls),
+        "ok": len(pages),
+        "renders": renders,
+        "seconds": round(elapsed, 3),
+        "pages_per_second": round(len(urls) / elapsed, 2),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1),
+        "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 1),
+    }
+    return row, pages
+
+
+def compare(reference: dict[str, dict], candidate: dict[str, dict]) -> dict:
+    """Совпадение результатов: заголовки, ссылки и близость markdown."""
+    common = sorted(set(reference) & set(candidate))
+    if not common:
+        return {"pages": 0}
+
+    def hrefs(page: dict) -> set:
+        return {link["href"] for link in page["internal_links"] + page["external_links"]}
+
+    ratios = [
+        difflib.SequenceMatcher(None, reference[url]["content"], candidate[url]["content"]).ratio() for url in common
+    ]
+    return {
+        "pages": len(common),
+        "same_title": sum(reference[u]["title"] == candidate[u]["title"] for u in common),
+        "same_links": sum(hrefs(reference[u]) == hrefs(candidate[u]) for u in common),
+        "same_content": sum(reference[u]["content"] == candidate[u]["content"] for u in common),
+        "min_content_similarity": round(min(ratios), 3),
+    }
+
+
+async def main(pages: int, concurrency: int, render_delay: int, cdp_url: Optional[str]) -> list[dict]:
+    with tempfile.TemporaryDirectory() as path:
+        names = build_fixture(path, pages, render_delay)
+        server, base_url = serve(path)
+        try:
+            urls = [f"{base_url}/{name}" for name in names]
+            two, two_pages = await run_mode("two-renders", fetch_two_renders, urls, concurrency, cdp_url)
+            one, one_pages = await run_mode("single-render", fetch_single_render, urls, concurrency, cdp_url)
+        finally:
+            server.shutdown()
+
+    one["speedup"] = round(two["seconds"] / one["seconds"], 2) if one["seconds"] else None
+    results = [two, one, {"parity": compare(two_pages, one_pages)}]
+    for r in results:
+        print(json.dumps(r, ensure_ascii=False))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарк crawler: одна отрисовка страницы против двух")
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=settings.MAX_CONCURRENT)
+    parser.add_argument("--render-delay", type=int, default=300, help="мс до появления содержимого")
+    parser.add_argument("--cdp-url", help="Подключиться к запущенному Chrome (http://localhost:9222)")
+    args = parser.parse_args()
+    asyncio.run(main(args.pages, args.concurrency, args.render_delay, args.cdp_url))
@@ -0,0 +1,308 @@
+"""Сквозной офлайн-бенчмарк: индексация, поиск и /agent/ask без сети.
+
+Вместо LLM и эмбеддингов - провайдер "stub" (ScriptedChatModel и
+StubEmbeddings с задержкой), зарегистрированный через register_provider,
+поэтому модели проходят тот же путь, что и настоящие: create_chat_model(),
+лимитер провайдера, агенты Router / RAG / SQL. Qdrant - локальный режим во
+временном каталоге, корпус - data/data.json, БД - data/team_mock.db.
+
+Результат - JSON со всеми замерами (--output), чтобы сравнивать прогоны
+между коммитами; по каждому разделу печатается строка JSON.
+
+Запуск: python -m src.benchmarks.e2e --llm-latency 0.05 --embed-latency 0.01 --levels 1 4 16 --output e2e.json
+"""
+import os
+import time
+import json
+import random
+import sqlite3
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from typing import Optional
+
+import httpx
+
+from src.config import settings
+from src.benchmarks.stubs import ScriptedChatModel, StubEmbeddings
+from src.utils.models.base import BaseLLMProvider
+from src.utils.models.llm_factory import register_provider
+from src.utils.corpus import CorpusStore
+
+EMBEDDING_SIZE = 256
+
+
+@register_provider("stub")
+class StubProvider(BaseLLMProvider):
+    """Офлайн-провайдер: детерминированные модели с задержкой.
+    Созданные модели сохраняются в атрибутах класса для подсчёта вызовов."""
+
+    embedding_dimensions = {"stub-embed": EMBEDDING_SIZE}
+    chat_latency = 0.05
+    embedding_latency = 0.0
+    chat: Optional[ScriptedChatModel] = None
+    embeddings: Optional[StubEmbeddings] = None
+
+    def create_chat(self) -> ScriptedChatModel:
+        StubProvider.chat = ScriptedChatModel(latency=self.chat_latency, answer="Ответ по данным инструмента.")
+        return StubProvider.chat
+
+    def create_embedding(self) -> StubEmbeddings:
+        StubProvider.embeddings = StubEmbeddings(size=EMBEDDING_SIZE, latency=self.embedding_latency)
+        return StubProvider.embeddings
+
+
+def configure(workdir: str, data_path: str, db_path: str, llm_latency: float, embed_latency: float, rps: float, answer_cache: bool):
+    """Переключает настройки на офлайн-провайдер и временные пути."""
+    StubProvider.chat_latency = llm_latency
+    StubProvider.embedding_latency = embed_latency
+    settings.LLM_MODE = "stub"
+    settings.LLM_MODEL = "stub-chat"
+    settings.EMBEDDING_MODEL = "stub-embed"
+    settings.EMBEDDING_DIM = 0
+    settings.LLM_RPS = rps
+    settings.LLM_TPM = 0
+    # Без постоянного кэша эмбеддингов: индексация каждый раз векторизует корпус
+    settings.EMBEDDING_CACHE_DIR = ""
+    settings.QDRANT_URL = ""
+    settings.QDRANT_PATH = os.path.join(workdir, "qdrant")
+    settings.DATA_PATH = data_path
+    settings.CORPUS_PATH = os.path.join(workdir, "corpus.db")
+    settings.MANIFEST_PATH = os.path.join(workdir, "ingest_manifest.json")
+    settings.BM25_INDEX_PATH = os.path.join(workdir, "bm25_index.npz")
+    settings.EMBED_CHECKPOINT_PATH = os.path.join(workdir, "embedding_checkpoint.json")
+    settings.EMBEDDING_DIMS_PATH = os.path.join(workdir, "embedding_dims.json")
+    settings.DB_PATH = db_path
+    if not answer_cache:
+        settings.ANSWER_CACHE_SIZE = 0
+
+
+def percentiles(seconds: list[float]) -> dict:
+    """p50 / p95 / p99 и максимум в миллисекундах (nearest rank)."""
+    if not seconds:
+        return {}
+    values = sorted(seconds)
+
+    def rank(p: float) -> float:
+        return round(values[min(len(values) - 1, max(0, int(round(p * len(values))) - 1))] * 1000, 2)
+
+    return {"p50_ms": rank(0.5), "p95_ms": rank(0.95), "p99_ms": rank(0.99), "max_ms": round(values[-1] * 1000, 2)}
+
+
+def git_commit() -> Optional[str]:
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        return result.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_questions(n: int, seed: int = 42) -> list[dict]:
+    """Смесь вопросов по документации (заголовки страниц) и по БД (роль сотрудника)."""
+    rng = random.Random(seed)
+    titles = sorted({title for _, title, _ in CorpusStore(settings.CORPUS_PATH).iter_pages()})
+    with sqlite3.connect(f"file:{settings.DB_PATH}?mode=ro", uri=True) as connection:
+        names = connection.execute("SELECT first_name, last_name FROM employees ORDER BY id").fetchall()
+    questions = []
+    for i in range(n):
+        if i % 2 and names:
+            first_name, last_name = rng.choice(names)
+            questions.append({"kind": "sql", "question": f"Какая роль у сотрудника {first_name} {last_name}?"})
+        else:
+            questions.append({"kind": "rag", "question": f"Расскажи про раздел «{rng.choice(titles)}»"})
+    return questions
+
+
+def _close(rag_agent):
+    # Локальный Qdrant допускает один клиент на каталог
+    rag_agent.vector_store.client.close()
+
+
+def bench_ingestion() -> dict:
+    """Холодная индексация корпуса и тёплый старт с неизменённым корпусом."""
+    from src.rag import load_rag_agent
+
+    started = time.perf_counter()
+    rag_agent = load_rag_agent()
+    cold = time.perf_counter() - started
+    store = rag_agent.vector_store
+    chunks = store.client.count(store.collection_name).count
+    pages = CorpusStore(settings.CORPUS_PATH).count()
+    embedding_calls = StubProvider.embeddings.calls
+    _close(rag_agent)
+
+    started = time.perf_counter()
+    rag_agent = load_rag_agent()
+    warm = time.perf_counter() - started
+    _close(rag_agent)
+    return {
+        "pages": pages,
+        "chunks": chunks,
+        "seconds": round(cold, 3),
+        "pages_per_second": round(pages / cold, 2),
+        "chunks_per_second": round(chunks / cold, 2),
+        "embedding_calls": embedding_calls,
+        "warm_start_seconds": round(warm, 3),
+    }
+
+
+def bench_retrieval(questions: list[dict]) -> dict:
+    """Задержка поиска retriever RAG агента (без LLM)."""
+    from src.rag import load_rag_agent
+
+    rag_agent = load_rag_agent()
+    queries = [q["question"] for q in questions if q["kind"] == "rag"]
+    rag_agent.retriever.invoke(queries[0])  # прогрев
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        rag_agent.retriever.invoke(query)
+        latencies.append(time.perf_counter() - started)
+    _close(rag_agent)
+    return {"queries": len(queries), "retrieval_mode": settings.RETRIEVAL_MODE, **percentiles(latencies)}
+
+
+async def bench_llm_calls(client: httpx.AsyncClient, questions: list[dict]) -> dict:
+    """Вызовы LLM и эмбеддингов на запрос: запросы по одному, счётчики до и после."""
+    chat, embeddings = StubProvider.chat, StubProvider.embeddings
+    by_kind: dict[str, list[tuple[int, int]]] = {}
+    for q in questions:
+        calls, embeds = chat.stats["calls"], embeddings.calls
+        await client.post("/agent/ask", json={"question": q["question"]})
+        by_kind.setdefault(q["kind"], []).append((chat.stats["calls"] - calls, embeddings.calls - embeds))
+
+    result = {}
+    for kind, counts in sorted(by_kind.items()):
+        llm = [c for c, _ in counts]
+        result[kind] = {
+            "requests": len(counts),
+            "llm_calls_mean": round(sum(llm) / len(llm), 2),
+            "llm_calls_min": min(llm),
+            "llm_calls_max": max(llm),
+            "embedding_calls_mean": round(sum(e for _, e in counts) / len(counts), 2),
+        }
+    return result
+
+
+async def run_level(client: httpx.AsyncClient, questions: list[dict], concurrency: int, requests: int) -> dict:
+    """requests запросов /agent/ask, не больше concurrency одновременно."""
+    chat = StubProvider.chat
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    errors = 0
+
+    async def one(i: int):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post("/agent/ask", json={"question": questions[i % len(questions)]["question"]})
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors += 1
+
+    calls = chat.stats["calls"]
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "rps": round(requests / elapsed, 2),
+        "llm_calls_per_request": round((chat.stats["calls"] - calls) / requests, 2),
+        **percentiles(latencies),
+    }
+
+
+async def bench_api(questions: list[dict], levels: list[int], requests: int) -> tuple[dict, list[dict], dict]:
+    from src.main import app
+    from src.agent_router import load_router_agent
+
+    app.state.router_agent = load_router_agent()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        llm_calls = await bench_llm_calls(client, questions)
+        load = [await run_level(client, questions, c, max(requests, c)) for c in levels]
+    metrics = app.state.router_agent.metrics()
+    return llm_calls, load, metrics
+
+
+def main(
+    data_path: str,
+    db_path: str,
+    llm_latency: float,
+    embed_latency: float,
+    questions: int,
+    levels: list[int],
+    requests: int,
+    rps: float,
+    answer_cache: bool,
+    output: Optional[str],
+) -> dict:
+    with tempfile.TemporaryDirectory() as workdir:
+        configure(workdir, data_path, db_path, llm_latency, embed_latency, rps, answer_cache)
+        report = {
+            "commit": git_commit(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "params": {
+                "llm_latency": llm_latency,
+                "embed_latency": embed_latency,
+                "questions": questions,
+                "levels": levels,
+                "requests": requests,
+                "rps": rps,
+                "answer_cache": answer_cache,
+                "retrieval_mode": settings.RETRIEVAL_MODE,
+                "rag_tool_mode": settings.RAG_TOOL_MODE,
+                "sql_tool_mode": settings.SQL_TOOL_MODE,
+                "pre_router": settings.PRE_ROUTER_ENABLED,
+                "chunk_size": settings.CHUNK_SIZE,
+            },
+        }
+        report["ingestion"] = bench_ingestion()
+        question_set = build_questions(questions)
+        report["retrieval"] = bench_retrieval(question_set)
+        report["llm_calls"], report["load"], report["metrics"] = asyncio.run(
+            bench_api(question_set, levels, requests)
+        )
+        # Клиент Qdrant Router Agent держит каталог до удаления временных файлов
+        from src.main import app
+
+        _close(app.state.router_agent.tools["rag"].rag_agent)
+
+    for section in ("ingestion", "retrieval", "llm_calls", "load"):
+        print(json.dumps({section: report[section]}, ensure_ascii=False))
+    if output:
+        with open(output, "w", encoding="utf-8") as fp:
+            json.dump(report, fp, ensure_ascii=False, indent=2)
+        print(f"[INFO] Результаты сохранены в {output}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сквозной офлайн-бенчмарк на заглушках моделей")
+    parser.add_argument("--data", default="data/data.json", help="Корпус (data.json)")
+    parser.add_argument("--db", default="data/team_mock.db")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Задержка вызова LLM, c")
+    parser.add_argument("--embed-latency", type=float, default=0.01, help="Задержка запроса эмбеддингов, c")
+    parser.add_argument("--questions", type=int, default=40, help="Вопросов для поиска и подсчёта вызовов LLM")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=48, help="Запросов на уровень параллельности")
+    parser.add_argument("--rps", type=float, default=0, help="LLM_RPS лимитера (0 - без ограничения)")
+    parser.add_argument("--answer-cache", action="store_true", help="Не отключать кэш ответов Router Agent")
+    parser.add_argument("--output", help="Файл для JSON с результатами")
+    args = parser.parse_args()
+    main(
+        args.data,
+        args.db,
+        args.llm_latency,
+        args.embed_latency,
+        args.questions,
+        args.levels,
+        args.requests,
+        args.rps,
+        args.answer_cache,
+        args.output,
+    )
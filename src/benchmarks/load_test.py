@@ -0,0 +1,79 @@
+"""Нагрузочный тест /agent/ask на заглушках моделей.
+
+Запуск: python -m src.benchmarks.load_test --latency 0.2 --levels 1 4 16 64
+"""
+import time
+import asyncio
+import argparse
+
+import httpx
+
+from src.main import app
+from src.agent_router.router_agent import RouterAgent
+from src.benchmarks.stubs import StubChatModel, StubTool
+
+
+def build_stub_router(latency: float) -> RouterAgent:
+    """Router Agent с заглушкой LLM и инструментов: LLM -> RAG -> LLM."""
+    llm = StubChatModel(latency=latency, tool_name="RAG")
+    tools = {name: StubTool(latency=latency) for name in ("rag", "sql", "web")}
+    return RouterAgent(llm=llm, tools=tools)
+
+
+async def run_level(client: httpx.AsyncClient, concurrency: int, requests_per_worker: int) -> dict:
+    """Запускает concurrency клиентов, каждый шлёт requests_per_worker запросов."""
+    latencies: list[float] = []
+    errors = 0
+
+    async def worker(worker_id: int):
+        nonlocal errors
+        for i in range(requests_per_worker):
+            start = time.perf_counter()
+            response = await client.post(
+                "/agent/ask", json={"question": f"Вопрос {worker_id}-{i}"}
+            )
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(w) for w in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    total = concurrency * requests_per_worker
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(total / elapsed, 2),
+        "p50_s": round(latencies[len(latencies) // 2], 3),
+        "p95_s": round(latencies[int(len(latencies) * 0.95) - 1], 3),
+    }
+
+
+async def main(latency: float, levels: list[int], requests_per_worker: int):
+    app.state.router_agent = build_stub_router(latency)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=None) as client:
+        results = [await run_level(client, c, requests_per_worker) for c in levels]
+
+    # Один запрос = 2 вызова LLM + 1 вызов инструмента
+    ideal = 3 * latency
+    print(f"Идеальная задержка одного запроса: {ideal:.2f} c")
+    for r in results:
+        print(
+            f"concurrency={r['concurrency']:>4} requests={r['requests']:>5} errors={r['errors']} "
+            f"rps={r['rps']:>8} p50={r['p50_s']}s p95={r['p95_s']}s"
+        )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Нагрузочный тест /agent/ask на заглушках")
+    parser.add_argument("--latency", type=float, default=0.2, help="Задержка LLM/инструмента, c")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests-per-worker", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(main(args.latency, args.levels, args.requests_per_worker))
@@ -0,0 +1,87 @@
+"""Сравнение режимов RAG инструмента Router Agent: agent (вложенный RAG агент)
+и retrieval (прямой поиск). Считает задержку, число вызовов LLM и входные токены.
+
+Запуск: python -m src.benchmarks.rag_modes --latency 0.3
+"""
+import time
+import uuid
+import json
+import asyncio
+import argparse
+
+from langchain_qdrant import QdrantVectorStore
+
+from src.config import settings
+from src.rag import DocumentLoader, DocumentSplitter, RAGAgent
+from src.agent_router.router_agent import RouterAgent
+from src.agent_router.tools.rag_tool import RAGTool
+from src.benchmarks.stubs import StubChatModel, StubEmbeddings, StubTool
+
+
+QUESTIONS = [
+    "Из чего состоит архитектура MaxPatrol 10?",
+    "Как установить MaxPatrol 10?",
+    "Какие компоненты входят в MaxPatrol 10?",
+    "Как настроить сканирование?",
+    "Какие порты использует MP 10 Core?",
+]
+
+# Типичный развёрнутый ответ LLM (~1800 символов, как в review.md)
+LONG_ANSWER = "Компонент системы MaxPatrol 10 отвечает за обработку данных. " * 30
+
+
+def build_vector_store(embeddings) -> QdrantVectorStore:
+    docs = DocumentLoader(settings.CORPUS_PATH).load()
+    chunks = DocumentSplitter(chunk_size=settings.CHUNK_SIZE).split_docs(docs)
+    return QdrantVectorStore.from_documents(
+        chunks, embedding=embeddings, location=":memory:", collection_name="bench_rag"
+    )
+
+
+async def run_mode(mode: str, vector_store, latency: float) -> dict:
+    router_llm = StubChatModel(latency=latency, tool_name="RAG", answer=LONG_ANSWER)
+    rag_llm = StubChatModel(latency=latency, tool_name="RAG", tool_arg="query", answer=LONG_ANSWER)
+    rag_agent = RAGAgent(
+        vector_store,
+        llm=rag_llm,
+        number_of_retrieved_documents=settings.FETCH_K,
+        context_token_budget=settings.RAG_CONTEXT_TOKENS,
+    )
+    tools = {"rag": RAGTool(rag_agent=rag_agent, mode=mode), "sql": StubTool(), "web": StubTool()}
+    router = RouterAgent(llm=router_llm, tools=tools)
+
+    latencies = []
+    for question in QUESTIONS:
+        start = time.perf_counter()
+        await router.aask(question, conversation_id=uuid.uuid4().hex)
+        latencies.append(time.perf_counter() - start)
+
+    n = len(QUESTIONS)
+    calls = router_llm.stats["calls"] + rag_llm.stats["calls"]
+    tokens = router_llm.stats["input_tokens"] + rag_llm.stats["input_tokens"]
+    return {
+        "mode": mode,
+        "mean_latency_s": round(sum(latencies) / n, 3),
+        "llm_calls_per_question": round(calls / n, 2),
+        "input_tokens_per_question": round(tokens / n),
+    }
+
+
+async def main(latency: float):
+    vector_store = build_vector_store(StubEmbeddings())
+    results = [await run_mode(mode, vector_store, latency) for mode in ("agent", "retrieval")]
+    for r in results:
+        print(json.dumps(r, ensure_ascii=False))
+    agent, retrieval = results
+    print(
+        f"retrieval vs agent: задержка -{1 - retrieval['mean_latency_s'] / agent['mean_latency_s']:.0%}, "
+        f"токены -{1 - retrieval['input_tokens_per_question'] / agent['input_tokens_per_question']:.0%}"
+    )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сравнение режимов RAG инструмента")
+    parser.add_argument("--latency", type=float, default=0.3, help="Задержка одного вызова LLM, c")
+    args = parser.parse_args()
+    asyncio.run(main(args.latency))
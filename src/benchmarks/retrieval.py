@@ -0,0 +1,136 @@
+"""Офлайн-бенчмарк поиска: MMR vs BM25 vs гибрид (RRF) vs гибрид + реранкер. Считает recall@k, MRR и задержку.
+
+Запросы строятся из корпуса автоматически:
+- titles: заголовок страницы -> релевантны все чанки этой страницы;
+- identifiers: "что такое <идентификатор>" (порты, имена компонентов, коды) ->
+  релевантны чанки, содержащие идентификатор.
+
+Запуск: python -m src.benchmarks.retrieval --k 3 --queries 100 [--reranker cross-encoder]
+По умолчанию используются офлайн-эмбеддинги (StubEmbeddings); с --real-embeddings -
+модель из create_embedding_model() (нужен API ключ).
+"""
+import re
+import time
+import json
+import random
+import argparse
+
+from langchain_qdrant import QdrantVectorStore
+
+from src.config import settings
+from src.rag import DocumentLoader, DocumentSplitter
+from src.rag.bm25 import BM25Index
+from src.rag.retrieval import HybridRetriever
+from src.rag.reranker import RerankingRetriever, create_reranker
+from src.benchmarks.stubs import StubEmbeddings
+
+_IDENTIFIER_RE = re.compile(r"\b(?=[\w.\-]*[A-Za-z])(?=[\w.\-]*\d)[\w.\-]{3,}\b|\b[A-Z][A-Za-z]+(?:\s[A-Z][A-Za-z]+)+\b")
+
+
+def build_queries(chunks, n: int, seed: int = 42) -> list[dict]:
+    rng = random.Random(seed)
+    queries = []
+
+    by_title: dict[str, set] = {}
+    for chunk in chunks:
+        by_title.setdefault(chunk.metadata["title"], set()).add(chunk.metadata["url"])
+    titles = sorted(by_title)
+    for title in rng.sample(titles, min(n // 2, len(titles))):
+        queries.append({"set": "titles", "query": title, "urls": by_title[title]})
+
+    identifiers: dict[str, set] = {}
+    for chunk in chunks:
+        for identifier in set(_IDENTIFIER_RE.findall(chunk.page_content)):
+            identifiers.setdefault(identifier, set()).add((chunk.metadata["url"], chunk.metadata["chunk_id"]))
+    # Берём редкие идентификаторы: именно на них плотный поиск ошибается
+    rare = sorted(i for i, keys in identifiers.items() if len(keys) <= 3)
+    for identifier in rng.sample(rare, min(n - len(queries), len(rare))):
+        queries.append({"set": "identifiers", "query": f"Что такое {identifier}?", "chunks": identifiers[identifier]})
+    return queries
+
+
+def is_relevant(query: dict, doc) -> bool:
+    if "urls" in query:
+        return doc.metadata.get("url") in query["urls"]
+    return (doc.metadata.get("url"), doc.metadata.get("chunk_id")) in query["chunks"]
+
+
+def evaluate(name: str, search, queries: list[dict], k: int) -> list[dict]:
+    results = []
+    for query_set in sorted({q["set"] for q in queries}):
+        subset = [q for q in queries if q["set"] == query_set]
+        hits, reciprocal_ranks, latencies = 0, 0.0, []
+        for query in subset:
+            start = time.perf_counter()
+            docs = search(query["query"])[:k]
+            latencies.append((time.perf_counter() - start) * 1000)
+            ranks = [i for i, doc in enumerate(docs, start=1) if is_relevant(query, doc)]
+            hits += bool(ranks)
+            reciprocal_ranks += 1 / ranks[0] if ranks else 0.0
+        latencies.sort()
+        results.append(
+            {
+                "retriever": name,
+                "query_set": query_set,
+                "queries": len(subset),
+                f"recall@{k}": round(hits / len(subset), 3),
+                "mrr": round(reciprocal_ranks / len(subset), 3),
+                "p50_ms": round(latencies[len(latencies) // 2], 2),
+                "p95_ms": round(latencies[max(0, int(len(latencies) * 0.95) - 1)], 2),
+            }
+        )
+    return results
+
+
+def main(
+    k: int, n_queries: int, real_embeddings: bool, candidates: int, reranker: str, rerank_candidates: int
+) -> list[dict]:
+    docs = DocumentLoader(settings.CORPUS_PATH).load()
+    chunks = DocumentSplitter(chunk_size=settings.CHUNK_SIZE).split_docs(docs)
+    if real_embeddings:
+        from src.utils.models.llm_factory import create_embedding_model
+
+        embeddings = create_embedding_model()
+    else:
+        embeddings = StubEmbeddings()
+
+    vector_store = QdrantVectorStore.from_documents(
+        chunks, embedding=embeddings, location=":memory:", collection_name="bench_retrieval"
+    )
+    bm25 = BM25Index().build(chunks)
+    mmr = vector_store.as_retriever(search_type="mmr", search_kwargs={"k": k, "fetch_k": k * 4})
+    hybrid = HybridRetriever(vector_store=vector_store, bm25=bm25, k=k, candidates=candidates)
+
+    queries = build_queries(chunks, n_queries)
+    results = []
+    results += evaluate("mmr", mmr.invoke, queries, k)
+    results += evaluate("bm25", lambda q: [d for d, _ in bm25.search(q, k)], queries, k)
+    results += evaluate("hybrid", hybrid.invoke, queries, k)
+    reranking = RerankingRetriever(
+        base_retriever=HybridRetriever(
+            vector_store=vector_store,
+            bm25=bm25,
+            k=rerank_candidates,
+            candidates=max(candidates, rerank_candidates),
+        ),
+        reranker=create_reranker(reranker, settings.RERANKER_MODEL),
+        top_n=k,
+        batch_size=settings.RERANK_BATCH_SIZE,
+        budget_ms=settings.RERANK_BUDGET_MS,
+    )
+    results += evaluate(f"hybrid+{reranker}", reranking.invoke, queries, k)
+    for r in results:
+        print(json.dumps(r, ensure_ascii=False))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Офлайн-бенчмарк поиска по документации")
+    parser.add_argument("--k", type=int, default=settings.FETCH_K)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--candidates", type=int, default=settings.HYBRID_CANDIDATES)
+    parser.add_argument("--rerank-candidates", type=int, default=settings.RERANK_CANDIDATES)
+    parser.add_argument("--reranker", choices=["lexical", "cross-encoder"], default="lexical")
+    parser.add_argument("--real-embeddings", action="store_true")
+    args = parser.parse_args()
+    main(args.k, args.queries, args.real_embeddings, args.candidates, args.reranker, args.rerank_candidates)
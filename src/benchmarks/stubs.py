@@ -0,0 +1,188 @@
+import re
+import time
+import asyncio
+import uuid
+import hashlib
+from typing import Any, Optional
+
+import numpy as np
+from pydantic import Field
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+
+class StubChatModel(BaseChatModel):
+    """Детерминированная чат-модель с искусственной задержкой (без сети).
+
+    Если задан tool_name, на вопрос пользователя модель отвечает вызовом
+    инструмента, а после ответа инструмента - финальным текстом. Так
+    проверяется полный цикл агента: LLM -> инструмент -> LLM.
+    """
+
+    latency: float = 0.2
+    answer: str = "Заглушка ответа"
+    tool_name: Optional[str] = None
+    # Имя аргумента инструмента: "__arg1" для Tool, "query" для retriever tool
+    tool_arg: str = "__arg1"
+    # Счётчики вызовов и входных токенов (приблизительно)
+    stats: dict = Field(default_factory=lambda: {"calls": 0, "input_tokens": 0})
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub-chat"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _message(self, messages: list[BaseMessage], **kwargs: Any) -> AIMessage:
+        if self.tool_name and isinstance(messages[-1], HumanMessage):
+            return AIMessage(
+                content="",
+                tool_calls=[
+                    {
+                        "name": self.tool_name,
+                        "args": {self.tool_arg: messages[-1].content},
+                        "id": f"call_{id(messages)}",
+                    }
+                ],
+            )
+        return AIMessage(content=self.answer)
+
+    def _reply(self, messages: list[BaseMessage], **kwargs: Any) -> ChatResult:
+        self.stats["calls"] += 1
+        self.stats["input_tokens"] += count_tokens_approximately(messages)
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages, **kwargs))])
+
+    def _generate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        return self._reply(messages, **kwargs)
+
+    async def _agenerate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return self._reply(messages, **kwargs)
+
+    async def _astream(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any):
+        """Потоковая генерация: latency до первого токена, затем ответ по словам."""
+        await asyncio.sleep(self.latency)
+        message = self._reply(messages, **kwargs).generations[0].message
+        if message.tool_calls:
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_calls=message.tool_calls))
+            return
+        for word in re.findall(r"\S+\s*", message.content):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word))
+            if run_manager:
+                await run_manager.on_llm_new_token(word, chunk=chunk)
+            yield chunk
+
+
+class ScriptedChatModel(StubChatModel):
+    """Чат-модель для сквозного бенчмарка: отвечает по простым правилам на
+    месте любого агента приложения (Router, RAG, SQL).
+
+    Инструменты передаются через bind_tools, как у настоящих моделей, поэтому
+    модель работает и за лимитером провайдера (GuardedChatModel):
+    - вопрос пользователя и есть инструменты -> вызов SQL / sql_db_query для
+      вопросов о сотрудниках, иначе RAG;
+    - промпт генератора SQL (схема БД без инструментов) -> SQL-запрос;
+    - ответ инструмента -> финальный текст.
+    """
+
+    sql_pattern: str = r"сотрудник|роль|опыт|email|экспертиз"
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-chat"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    @staticmethod
+    def sql_for(question: str) -> str:
+        """SQL к team_mock.db: роль сотрудника по имени или число сотрудников."""
+        match = re.search(r"сотрудника\s+(\w+)\s+(\w+)", question)
+        if match:
+            first_name, last_name = match.groups()
+            return f"SELECT role FROM employees WHERE first_name = '{first_name}' AND last_name = '{last_name}'"
+        return "SELECT count(*) FROM employees"
+
+    def _message(self, messages: list[BaseMessage], tools: Optional[list] = None, **kwargs: Any) -> AIMessage:
+        last = messages[-1]
+        if isinstance(last, HumanMessage):
+            question = last.content
+            if tools:
+                specs = {tool["function"]["name"]: tool["function"] for tool in tools}
+                is_sql = re.search(self.sql_pattern, question, re.IGNORECASE)
+                if "sql_db_query" in specs:
+                    name, value = "sql_db_query", self.sql_for(question)
+                elif is_sql and "SQL" in specs:
+                    name, value = "SQL", question
+                else:
+                    name, value = ("RAG" if "RAG" in specs else next(iter(specs))), question
+                arg = next(iter(specs[name]["parameters"]["properties"]))
+                call = {"name": name, "args": {arg: value}, "id": f"call_{uuid.uuid4().hex[:12]}"}
+                return AIMessage(content="", tool_calls=[call])
+            if "Схема базы данных" in str(messages[0].content):
+                return AIMessage(content=f"```sql\n{self.sql_for(question)}\n```")
+        return AIMessage(content=self.answer)
+
+
+class StubEmbeddings(Embeddings):
+    """Детерминированные эмбеддинги без сети: хэшированный мешок слов.
+
+    Тексты с общими словами получают близкие векторы, поэтому поиск по
+    корпусу осмыслен. latency имитирует задержку API на один запрос.
+    """
+
+    def __init__(self, size: int = 256, latency: float = 0.0):
+        self.size = size
+        self.latency = latency
+        self.calls = 0
+
+    def _vector(self, text: str) -> list[float]:
+        vector = np.zeros(self.size, dtype=np.float32)
+        for token in re.findall(r"\w+", text.lower()):
+            digest = hashlib.md5(token.encode("utf-8")).digest()
+            index = int.from_bytes(digest[:4], "little") % self.size
+            vector[index] += 1.0 if digest[4] % 2 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        else:
+            vector[0] = 1.0
+        return vector.tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.calls += 1
+        time.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+class StubTool:
+    """Заглушка инструмента Router Agent (RAG / SQL / Web) с задержкой."""
+
+    def __init__(self, latency: float = 0.2, answer: str = "Заглушка инструмента"):
+        self.latency = latency
+        self.answer = answer
+
+    def run(self, query: str) -> str:
+        time.sleep(self.latency)
+        return self.answer
+
+    async def arun(self, query: str) -> str:
+        await asyncio.sleep(self.latency)
+        return self.answer
@@ -11,23 +11,113 @@ class Settings:
     # Qdrant
     QDRANT_PATH = os.getenv("QDRANT_PATH", "data/qdrant")
     QDRANT_COLLECTION = os.getenv("QDRANT_COLLECTION", "qdrant_rag")
+    # Пустой QDRANT_URL - локальный режим (данные в QDRANT_PATH, без сервера)
     QDRANT_URL = os.getenv("QDRANT_URL", "http://qdrant:6333")
 
     # LLM config
-    LLM_MODE = os.getenv("LLM_MODE", "mistral")  # ["mistral", "openai", "ollama", "vllm"]
+    LLM_MODE = os.getenv("LLM_MODE", "mistral")  # ["mistral", "openai", "ollama", "vllm", "router"]
+    # Бэкенды для LLM_MODE=router (JSON-список, см. RoutingProvider)
+    LLM_BACKENDS = os.getenv("LLM_BACKENDS", "[]")
+    LLM_BACKEND_COOLDOWN = float(os.getenv("LLM_BACKEND_COOLDOWN", "30"))  # секунды
     LLM_MODEL = os.getenv("LLM_MODEL", "mistral-small-latest")
     EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "mistral-embed")
+    # Размерность эмбеддингов: явно или из таблицы провайдера / сохранённого замера
+    EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "0"))
+    EMBEDDING_DIMS_PATH = os.getenv("EMBEDDING_DIMS_PATH", "data/embedding_dims.json")
+    # Кэш эмбеддингов на диске; пустое значение отключает кэш
+    EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "data/embedding_cache")
+
+    # Лимиты провайдера LLM (общие для чат- и эмбеддинг-моделей; 0 - без ограничения)
+    LLM_RPS = float(os.getenv("LLM_RPS", "5"))
+    LLM_TPM = float(os.getenv("LLM_TPM", "500000"))
+    LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+    LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))  # секунды
+    LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "20"))  # секунды
+    LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+    LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))  # секунды
+
+    # Общий пул HTTP-соединений к провайдерам LLM
+    HTTP2 = os.getenv("HTTP2", "true").lower() == "true"
+    HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+    HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+    HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))  # секунды
+    HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "120"))  # секунды
+
+    # Router Agent: история диалогов
+    HISTORY_MAX_TURNS = int(os.getenv("HISTORY_MAX_TURNS", "5"))
+    HISTORY_MAX_TOKENS = int(os.getenv("HISTORY_MAX_TOKENS", "4000"))
+    CONVERSATION_MAX_THREADS = int(os.getenv("CONVERSATION_MAX_THREADS", "1000"))
+    CONVERSATION_TTL = int(os.getenv("CONVERSATION_TTL", "3600"))  # секунды
+
+    # Router Agent: кэш ответов (ANSWER_CACHE_SIZE=0 - отключить)
+    ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+    ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", "3600"))  # секунды
+    ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+
+    # Router Agent: быстрый выбор инструмента без LLM
+    PRE_ROUTER_ENABLED = os.getenv("PRE_ROUTER_ENABLED", "true").lower() == "true"
+    PRE_ROUTER_THRESHOLD = float(os.getenv("PRE_ROUTER_THRESHOLD", "0.7"))
+
+    # Пакетные вопросы (/agent/ask/batch и CLI)
+    BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+    BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "32"))
+    BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "10000"))
 
     # RAG config
     CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
     FETCH_K = int(os.getenv("FETCH_K", "3"))
+    # retrieval - Router получает фрагменты напрямую, agent - ответ вложенного RAG агента
+    RAG_TOOL_MODE = os.getenv("RAG_TOOL_MODE", "retrieval")
+    RAG_CONTEXT_TOKENS = int(os.getenv("RAG_CONTEXT_TOKENS", "1500"))
+    # dense - только MMR по Qdrant, hybrid - Qdrant + BM25 с reciprocal rank fusion
+    RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "dense")
+    HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+    BM25_INDEX_PATH = os.getenv("BM25_INDEX_PATH", "data/bm25_index.npz")
+    # Реранкер: none | lexical | cross-encoder (нужен fastembed, иначе lexical)
+    RERANKER = os.getenv("RERANKER", "none")
+    RERANKER_MODEL = os.getenv("RERANKER_MODEL", "jinaai/jina-reranker-v2-base-multilingual")
+    RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+    RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+    RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "300"))
+    RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "10000"))
+    MANIFEST_PATH = os.getenv("MANIFEST_PATH", "data/ingest_manifest.json")
+
+    # Векторизация при индексации
+    EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+    EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+    EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "6"))
+    EMBED_CHECKPOINT_PATH = os.getenv("EMBED_CHECKPOINT_PATH", "data/embedding_checkpoint.json")
 
     # Crawler / DB
-    DATA_PATH = os.getenv("DATA_PATH")
+    DATA_PATH = os.getenv("DATA_PATH", "data/data.json")  # прежний формат, переносится в CORPUS_PATH
+    # Хранилище корпуса (SQLite) и размер пачки страниц при индексации
+    CORPUS_PATH = os.getenv("CORPUS_PATH", "data/corpus.db")
+    INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))  # страниц
     DOCS_URL = os.getenv("DOCS_URL")
     MAX_DEPTH = int(os.getenv("MAX_DEPTH", "1"))
     MAX_CONCURRENT = int(os.getenv("MAX_CONCURRENT", "5"))
-    DB_PATH = os.getenv("DB_PATH")
+    DB_PATH = os.getenv("DB_PATH", "data/team_mock.db")
+    # Очередь обхода: лимит запросов на хост (0 - MAX_CONCURRENT), пауза между запросами к хосту
+    CRAWL_PER_HOST = int(os.getenv("CRAWL_PER_HOST", "0"))
+    CRAWL_HOST_DELAY = float(os.getenv("CRAWL_HOST_DELAY", "0"))  # секунды
+    # Состояние очереди для продолжения прерванного обхода; пустое значение - не сохранять
+    CRAWL_FRONTIER_PATH = os.getenv("CRAWL_FRONTIER_PATH", "data/crawl_frontier.json")
+    CRAWL_CHECKPOINT_EVERY = int(os.getenv("CRAWL_CHECKPOINT_EVERY", "20"))  # страниц
+    CRAWL_REPORT_INTERVAL = float(os.getenv("CRAWL_REPORT_INTERVAL", "10"))  # секунды
+    # Инкрементальный обход: условные запросы по ETag / Last-Modified и набор изменений
+    CRAWL_INCREMENTAL = os.getenv("CRAWL_INCREMENTAL", "false").lower() == "true"
+    CRAWL_STATE_PATH = os.getenv("CRAWL_STATE_PATH", "data/crawl_state.json")
+    CRAWL_CHANGES_PATH = os.getenv("CRAWL_CHANGES_PATH", "data/crawl_changes.json")
+    # Не перепроверять страницы, загруженные меньше указанного времени назад (0 - всегда проверять)
+    CRAWL_RECRAWL_MIN_AGE = float(os.getenv("CRAWL_RECRAWL_MIN_AGE", "0"))  # секунды
+
+    # SQL агент: query - один вызов LLM пишет SQL, Router формирует ответ; agent - ответ SQL агента
+    SQL_TOOL_MODE = os.getenv("SQL_TOOL_MODE", "query")
+    SQL_SAMPLE_ROWS = int(os.getenv("SQL_SAMPLE_ROWS", "3"))  # примеры строк в описании схемы
+    SQL_CACHE_SIZE = int(os.getenv("SQL_CACHE_SIZE", "1000"))  # 0 - не кэшировать результаты
+    # Шаблоны Text-to-SQL (режим query): 0 - отключить
+    SQL_TEMPLATE_CACHE_SIZE = int(os.getenv("SQL_TEMPLATE_CACHE_SIZE", "500"))
+    SQL_TEMPLATE_THRESHOLD = float(os.getenv("SQL_TEMPLATE_THRESHOLD", "0.95"))
 
 
 settings = Settings()
\ No newline at end of file
@@ -6,9 +6,16 @@ from urllib.parse import urlparse
 from functools import wraps
 
 import asyncio
+import httpx
 from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig, CacheMode
 
 from src.config import settings
+from src.utils.corpus import CorpusStore, open_corpus
+from src.utils.frontier import CrawlProgress, Frontier, normalize_url
+from src.utils.recrawl import FetchState, build_change_set, is_not_modified
+
+# Элемент страницы справочного портала с текстом статьи
+CONTENT_SELECTOR = "content-container"
 
 
 class BaseCrawler:
@@ -17,6 +24,11 @@ class BaseCrawler:
         parsed_url = urlparse(url)
         self.base_url = f"{parsed_url.scheme}://{parsed_url.netloc}"
         self._base_domain = parsed_url.netloc
+        # Итоги последнего обхода для инкрементального режима:
+        # загруженные страницы (url -> метаданные), пропущенные без изменений и с ошибкой
+        self.fetched: dict[str, dict] = {}
+        self.unchanged: set[str] = set()
+        self.failed: set[str] = set()
 
     def _clean_text(self, text: str) -> str:
         # Удаляем soft hyphen, zero-width space, no-break space, etc.
@@ -69,112 +81,271 @@ class BaseCrawler:
         return decorator
 
     @retry_async(retries=1, delay=1.5)
-    async def _fetch_page_data(self, crawler, url: str, semaphore: asyncio.Semaphore):
-        """Асинхронное извлечение ссылок и содержимого с повторной попыткой и ограничением параллелизма"""
-        run_config1 = self._build_run_config()
-        run_config2 = self._build_run_config(
-            css_selector="content-container",
-        )
-
-        async with semaphore:  # ограничение числа одновременных запросов
-            result1, result2 = await asyncio.gather(
-                crawler.arun(url=url, config=run_config1),
-                crawler.arun(url=url, config=run_config2),
-            )
+    async def _fetch_page_data(self, crawler, url: str):
+        """Асинхронное извлечение ссылок и содержимого за одну отрисовку страницы.
+
+        target_elements ограничивает markdown содержимым content-container,
+        а заголовок и ссылки берутся со всей страницы - второй проход с
+        css_selector не нужен.
+        """
+        run_config = self._build_run_config(target_elements=[CONTENT_SELECTOR])
+        result = await crawler.arun(url=url, config=run_config)
+        if not result.success:
+            raise RuntimeError(result.error_message)
 
         return {
-            "url": result1.url,
-            "title": self._clean_title(result1.metadata.get("title", "Без заголовка")),
-            "content": self._clean_text(result2.markdown.raw_markdown),
-            "internal_links": result1.links["internal"],
-            "external_links": result1.links["external"],
+            "url": result.url,
+            "title": self._clean_title(result.metadata.get("title", "Без заголовка")),
+            "content": self._clean_text(result.markdown.raw_markdown),
+            "internal_links": result.links["internal"],
+            "external_links": result.links["external"],
+            "status_code": result.status_code,
+            "response_headers": result.response_headers,
         }
 
-    def _normalize_link(self, link: str) -> Optional[str]:
-        """Исправляет ссылку, если нужно, и фильтрует ненужные"""
+    def _filter_link(self, link: dict) -> Optional[str]:
+        """Отбрасывает ненужные ссылки (без текста, cookie-баннеры)"""
         if len(link["text"]) > 0 and "cookie" not in link["href"]:
-            if self._base_domain not in link["href"]:
-                link["href"] = self.base_url + link["href"]
             return link["href"]
         return None
 
+    def _pages_path(self, state_path: Optional[str]) -> Optional[str]:
+        # Страницы незавершённого обхода дописываются рядом с состоянием очереди
+        return f"{state_path}.pages.jsonl" if state_path else None
+
+    def _load_pages(self, pages_path: Optional[str]) -> dict[str, dict]:
+        data: dict[str, dict] = {}
+        if pages_path and os.path.exists(pages_path):
+            with open(pages_path, "r", encoding="utf-8") as fp:
+                for line in fp:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # строка, оборванная при остановке обхода
+                    if "page" in record:
+                        data[record["url"]] = record["page"]
+                    if record.get("meta"):
+                        self.fetched[record["url"]] = record["meta"]
+                    if record.get("status") == "unchanged":
+                        self.unchanged.add(record["url"])
+                    elif record.get("status") == "failed":
+                        self.failed.add(record["url"])
+        return data
+
+    @staticmethod
+    def _merge_legacy_urls(store: CorpusStore) -> int:
+        """Страницы, сохранённые под ненормализованным URL (слэш в конце, фрагмент,
+        utm-параметры), переносятся под нормализованный ключ, а если он уже
+        есть - удаляются. Иначе страница хранилась и индексировалась дважды."""
+        stored = store.hashes()
+        stale, renamed = [], {}
+        for url in stored:
+            normalized = normalize_url(url)
+            if normalized is None or normalized == url:
+                continue
+            stale.append(url)
+            if normalized not in stored and normalized not in renamed:
+                renamed[normalized] = url
+        if renamed:
+            old_to_new = {old: new for new, old in renamed.items()}
+            store.upsert(
+                {
+                    old_to_new[url]: {"title": title, "content": content}
+                    for url, title, content in store.iter_pages(urls=set(old_to_new))
+                }
+            )
+        store.delete(stale)
+        if stale:
+            print(f"[INFO] Ненормализованных URL в корпусе: {len(stale)}, перенесено {len(renamed)}")
+        return len(stale)
+
+    async def _skip_unchanged(self, fetch_state: FetchState, client: httpx.AsyncClient, url: str) -> bool:
+        """Страница не менялась: загружалась недавно или сервер ответил 304 на условный запрос."""
+        if fetch_state.get(url) is None:
+            return False
+        if fetch_state.is_recent(url, settings.CRAWL_RECRAWL_MIN_AGE):
+            return True
+        return await is_not_modified(client, url, fetch_state.conditional_headers(url))
+
     async def _crawl_all_pages(
-        self, start_url: str, max_depth: int = 3, max_concurrent: int = 5
+        self,
+        start_url: str,
+        max_depth: int = 3,
+        max_concurrent: int = 5,
+        state_path: Optional[str] = None,
+        fetch_state: Optional[FetchState] = None,
+        store: Optional[CorpusStore] = None,
     ) -> dict[str, dict]:
-        """Асинхронный BFS-обход всех ссылок до указанной глубины"""
-        visited: set[str] = set()
-        found: set[str] = set()
-        data: dict[str, dict] = dict()
-        queue: list[tuple[str, int]] = [(start_url, 0)]
+        """Асинхронный обход ссылок до указанной глубины пулом из max_concurrent воркеров.
+
+        Воркеры берут URL из общей очереди, поэтому медленная страница занимает
+        только один воркер, а страницы следующего уровня начинают загружаться
+        сразу. Состояние очереди периодически сохраняется в state_path,
+        прерванный обход продолжается с того же места. С fetch_state
+        неизменившиеся страницы не загружаются, а их ссылки берутся из состояния.
+        Со store каждая страница сразу записывается в хранилище корпуса и в
+        возвращаемый словарь не попадает.
+        """
+        self.fetched, self.unchanged, self.failed = {}, set(), set()
+        frontier = Frontier(
+            start_url,
+            max_depth=max_depth,
+            per_host=settings.CRAWL_PER_HOST or max_concurrent,
+            host_delay=settings.CRAWL_HOST_DELAY,
+            state_path=state_path,
+        )
+        pages_path = self._pages_path(state_path)
+        data: dict[str, dict] = {}
+        if frontier.load():
+            data = self._load_pages(pages_path)
+            print(f"[INFO] Продолжаем обход: {len(frontier.done)} страниц обработано, {frontier.depth} в очереди")
+        else:
+            if pages_path and os.path.exists(pages_path):
+                os.remove(pages_path)
+            frontier.add(start_url, 0)
 
-        semaphore = asyncio.Semaphore(max_concurrent)
+        progress = CrawlProgress(frontier)
+        pages_file = open(pages_path, "a", encoding="utf-8") if pages_path else None
         browser_conf = BrowserConfig(verbose=False)
-
-        async with AsyncWebCrawler(config=browser_conf) as crawler:
-            while queue:
-                # Берём все ссылки текущего уровня
-                current_batch = [item for item in queue if item[1] <= max_depth]
-                queue = []  # очистим очередь для следующего уровня
-
-                tasks = [
-                    self._fetch_page_data(crawler, url, semaphore)
-                    for url, _ in current_batch
-                    if url not in visited
-                ]
-
-                results = await asyncio.gather(*tasks, return_exceptions=True)
-
-                for (url, depth), res in zip(current_batch, results):
-                    if isinstance(res, Exception) or res is None:
-                        print(f"Error fetching {url}: {res}")
-                        continue
-
-                    visited.add(url)
-                    data[url] = {
-                        "title": res["title"],
-                        "content": res["content"],
-                    }
-
-                    all_links = res.get("internal_links", []) + res.get(
-                        "external_links", []
-                    )
-                    for link in all_links:
-                        corrected = self._normalize_link(link)
-                        if (
-                            corrected
-                            and corrected not in visited
-                            and corrected not in found
-                        ):
-                            found.add(corrected)
-
-                            if depth + 1 <= max_depth:
-                                queue.append((corrected, depth + 1))
-
+        client = httpx.AsyncClient(follow_redirects=True, timeout=30) if fetch_state is not None else None
+
+        def record_outcome(url: str, status: str):
+            # Исход без загрузки страницы тоже нужен при продолжении, иначе страница попадёт в removed
+            if pages_file:
+                pages_file.write(json.dumps({"url": url, "status": status}) + "\n")
+                pages_file.flush()
+
+        async def worker():
+            while True:
+                url, depth = await frontier.get()
+                progress.in_flight += 1
+                # Прерванная загрузка (отмена, Ctrl+C) остаётся в очереди для продолжения
+                completed = False
+                try:
+                    async with frontier.slot(url):
+                        skip = fetch_state is not None and await self._skip_unchanged(fetch_state, client, url)
+                        res = None if skip else await self._fetch_page_data(crawler, url)
+                    if skip:
+                        self.unchanged.add(url)
+                        progress.skipped += 1
+                        record_outcome(url, "unchanged")
+                        for href in fetch_state.get(url).get("links", []):
+                            frontier.add(href, depth + 1)
+                    elif res is None:
+                        self.failed.add(url)
+                        progress.errors += 1
+                        print(f"Error fetching {url}")
+                        record_outcome(url, "failed")
+                    elif res["status_code"] in (404, 410):
+                        # Страница удалена с сайта - попадёт в removed набора изменений
+                        print(f"[INFO] Страница удалена ({res['status_code']}): {url}")
+                    else:
+                        page = {"title": res["title"], "content": res["content"]}
+                        all_links = res.get("internal_links", []) + res.get("external_links", [])
+                        links = []
+                        for link in all_links:
+                            href = self._filter_link(link)
+                            href = normalize_url(href, url) if href else None
+                            if href:
+                                links.append(href)
+                                frontier.add(href, depth + 1)
+                        meta = FetchState.meta(page, res["response_headers"], links)
+                        if store is not None:
+                            await asyncio.to_thread(store.upsert, {url: page})
+                        else:
+                            data[url] = page
+                        self.fetched[url] = meta
+                        progress.pages += 1
+                        if pages_file:
+                            record = {"url": url, "meta": meta}
+                            if store is None:
+                                record["page"] = page
+                            pages_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                            pages_file.flush()
+                        progress.observe()
+                    completed = True
+                except Exception as e:
+                    self.failed.add(url)
+                    progress.errors += 1
+                    completed = True
+                    print(f"Error processing {url}: {e}")
+                    record_outcome(url, "failed")
+                finally:
+                    progress.in_flight -= 1
+                    frontier.task_done(url, completed)
+                    if completed and len(frontier.done) % max(1, settings.CRAWL_CHECKPOINT_EVERY) == 0:
+                        frontier.save()
+
+        try:
+            async with AsyncWebCrawler(config=browser_conf) as crawler:
+                workers = [asyncio.create_task(worker()) for _ in range(max_concurrent)]
+                reporter = asyncio.create_task(progress.run(settings.CRAWL_REPORT_INTERVAL))
+                try:
+                    await frontier.queue.join()
+                finally:
+                    for task in [*workers, reporter]:
+                        task.cancel()
+                    await asyncio.gather(*workers, reporter, return_exceptions=True)
+        except BaseException:
+            # Прерванный обход (ошибка, Ctrl+C) можно продолжить повторным запуском
+            frontier.save()
+            raise
+        finally:
+            if pages_file:
+                pages_file.close()
+            if client is not None:
+                await client.aclose()
+
+        progress.report("Обход завершён")
+        frontier.clear()
+        if pages_path and os.path.exists(pages_path):
+            os.remove(pages_path)
         return data
 
     def run_crawler(self, output_path: str, max_depth: int = 1, max_concurrent: int = 5):
-        """Синхронная обёртка над асинхронным BFS-обходом"""
+        """Синхронная обёртка над асинхронным обходом.
+
+        Страницы записываются в хранилище корпуса output_path по мере загрузки.
+        В инкрементальном режиме (CRAWL_INCREMENTAL) неизменившиеся страницы
+        не загружаются, страницы, которых больше нет на сайте, удаляются из
+        хранилища, а набор изменений (added / modified / removed) пишется в
+        CRAWL_CHANGES_PATH.
+        """
         print("[INFO] Начало парсинга переданного ресурса")
-        new_data = asyncio.run(self._crawl_all_pages(self.url, max_depth, max_concurrent))        
-
-        if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
-            with open(output_path, "r", encoding="utf-8") as fp:
-                old_data = json.load(fp)
-        else:
-            old_data = {}
-
-        old_data.update(new_data)
-
-        with open(output_path, "w", encoding="utf-8") as fp:
-            json.dump(old_data, fp, ensure_ascii=False, indent=2)
-
-        print(f"{len(new_data)} страниц добавлено/обновлено в {output_path}")
+        store = open_corpus(output_path)
+        fetch_state = FetchState(settings.CRAWL_STATE_PATH) if settings.CRAWL_INCREMENTAL else None
+        asyncio.run(
+            self._crawl_all_pages(
+                self.url,
+                max_depth,
+                max_concurrent,
+                state_path=settings.CRAWL_FRONTIER_PATH,
+                fetch_state=fetch_state,
+                store=store,
+            )
+        )
+        print(f"{len(self.fetched)} страниц добавлено/обновлено в {output_path}")
+        self._merge_legacy_urls(store)
+
+        if fetch_state is not None:
+            changes = build_change_set(fetch_state.pages, self.fetched, set(self.unchanged), self.failed)
+            store.delete(changes["removed"])
+            # Для пропущенных и незагрузившихся страниц сохраняем прежние метаданные
+            kept = (self.unchanged | self.failed) & set(fetch_state.pages)
+            fetch_state.save({**{url: fetch_state.pages[url] for url in kept}, **self.fetched})
+            with open(settings.CRAWL_CHANGES_PATH, "w", encoding="utf-8") as fp:
+                json.dump(changes, fp, ensure_ascii=False, indent=2)
+            print(
+                f"[INFO] Изменения: добавлено {len(changes['added'])}, изменено {len(changes['modified'])}, "
+                f"удалено {len(changes['removed'])}, без изменений {changes['unchanged']} "
+                f"-> {settings.CRAWL_CHANGES_PATH}"
+            )
 
 
 if __name__ == "__main__":
     crawler = BaseCrawler(url=settings.DOCS_URL)
     crawler.run_crawler(
-        output_path=settings.DATA_PATH,
+        output_path=settings.CORPUS_PATH,
         max_depth=settings.MAX_DEPTH,
         max_concurrent=settings.MAX_CONCURRENT,
     )
@@ -1,24 +1,125 @@
+from pathlib import Path
+
 from .loader import DocumentLoader
 from .splitter import DocumentSplitter
 from .indexing import Index
+from .manifest import IngestManifest
 from .agent import RAGAgent
+from .bm25 import BM25Index
+from .retrieval import HybridRetriever
+from .reranker import RerankingRetriever, create_reranker
 from src.config import settings
 from src.utils.models.llm_factory import create_chat_model, create_embedding_model
+from src.utils.corpus import open_corpus
+
+
+def _index_params() -> dict:
+    """Параметры, при изменении которых индекс нужно строить заново."""
+    return {
+        "chunk_size": settings.CHUNK_SIZE,
+        "llm_mode": settings.LLM_MODE,
+        "embedding_model": settings.EMBEDDING_MODEL,
+        "retrieval_mode": settings.RETRIEVAL_MODE,
+    }
 
 
 def load_rag_agent() -> RAGAgent:
     llm = create_chat_model()
     embeddings = create_embedding_model()    
-    
-    loader = DocumentLoader(settings.DATA_PATH)
-    splitter = DocumentSplitter(chunk_size=settings.CHUNK_SIZE)
-    docs = splitter.split_docs(loader.load())
 
     index = Index(        
         path=settings.QDRANT_PATH,
         collection_name=settings.QDRANT_COLLECTION,
         embeddings=embeddings,
     )
-    vector_store = index.add_documents(docs)
-    agent = RAGAgent(vector_store, llm=llm, number_of_retrieved_documents=settings.FETCH_K)
+    params = _index_params()
+    manifest = IngestManifest(settings.MANIFEST_PATH)
+    hybrid = settings.RETRIEVAL_MODE == "hybrid"
+    # Без сохранённого BM25 индекса инкрементальное обновление невозможно
+    bm25_ready = not hybrid or Path(settings.BM25_INDEX_PATH).exists()
+    known_collection = (
+        manifest.collection_name
+        and bm25_ready
+        and index.collection_exists(manifest.collection_name)
+    )
+
+    bm25 = None
+    # Перенос data.json в хранилище корпуса при первом запуске
+    open_corpus(settings.CORPUS_PATH)
+    if known_collection and manifest.is_fresh(settings.CORPUS_PATH, params):
+        # Тёплый старт: корпус не менялся - ни чтения, ни разбиения
+        vector_store = index.connect(manifest.collection_name)
+        if hybrid:
+            bm25 = BM25Index.load(settings.BM25_INDEX_PATH)
+    else:
+        loader = DocumentLoader(settings.CORPUS_PATH)
+        # Хэши хранятся рядом со страницами - из хранилища читается содержимое только изменившихся
+        url_hashes = loader.url_hashes()
+
+        old_hashes = {}
+        if known_collection and manifest.matches_params(params):
+            old_hashes = manifest.url_hashes
+        changed_urls = {url for url, h in url_hashes.items() if old_hashes.get(url) != h}
+        print(f"[INFO] Изменившихся страниц: {len(changed_urls)} из {len(url_hashes)}")
+
+        # Страницы, пропавшие из корпуса: по манифесту или, без него, по самой коллекции
+        if old_hashes:
+            removed_urls = set(old_hashes) - set(url_hashes)
+        else:
+            removed_urls = index.get_indexed_urls() - set(url_hashes)
+
+        # Разбиение и векторизация пачками по INGEST_BATCH_SIZE страниц
+        splitter = DocumentSplitter(chunk_size=settings.CHUNK_SIZE)
+        vector_store, chunks = None, []
+        for batch in loader.iter_batches(settings.INGEST_BATCH_SIZE, urls=changed_urls):
+            batch_chunks = splitter.split_docs(batch)
+            # Удалённые страницы вычищаются вместе с первой пачкой
+            vector_store = index.add_documents(batch_chunks, removed_urls=() if vector_store is not None else removed_urls)
+            if hybrid:
+                # BM25 держит в памяти все чанки корпуса, так что чанки пачек копятся до его обновления
+                chunks.extend(batch_chunks)
+        if vector_store is None:
+            vector_store = index.add_documents([], removed_urls=removed_urls)
+
+        if hybrid:
+            # Лексический индекс строится из тех же чанков, что и векторный
+            bm25 = (BM25Index.load(settings.BM25_INDEX_PATH) if old_hashes else None) or BM25Index()
+            bm25.update(chunks, removed_urls=removed_urls)
+            bm25.save(settings.BM25_INDEX_PATH)
+        manifest.save(settings.CORPUS_PATH, params, index.collection_name, url_hashes)
+        # Чекпоинт охватывает все пачки и удаляется только после сохранения манифеста
+        index.clear_checkpoint()
+
+    # С реранкером первый этап отдаёт RERANK_CANDIDATES кандидатов, до LLM доходят FETCH_K
+    rerank = settings.RERANKER != "none"
+    k = settings.RERANK_CANDIDATES if rerank else settings.FETCH_K
+
+    retriever = None
+    if bm25 is not None:
+        retriever = HybridRetriever(
+            vector_store=vector_store,
+            bm25=bm25,
+            k=k,
+            candidates=max(k, settings.HYBRID_CANDIDATES),
+        )
+    elif rerank:
+        retriever = vector_store.as_retriever(search_kwargs={"k": k})
+
+    if rerank:
+        retriever = RerankingRetriever(
+            base_retriever=retriever,
+            reranker=create_reranker(settings.RERANKER, settings.RERANKER_MODEL),
+            top_n=settings.FETCH_K,
+            batch_size=settings.RERANK_BATCH_SIZE,
+            budget_ms=settings.RERANK_BUDGET_MS,
+            cache_size=settings.RERANK_CACHE_SIZE,
+        )
+
+    agent = RAGAgent(
+        vector_store,
+        llm=llm,
+        number_of_retrieved_documents=settings.FETCH_K,
+        context_token_budget=settings.RAG_CONTEXT_TOKENS,
+        retriever=retriever,
+    )
     return agent
@@ -1,4 +1,8 @@
+from typing import Optional
+
 from langchain.agents import create_agent
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
 from langchain_core.tools import create_retriever_tool
 from langchain_core.language_models.chat_models import BaseChatModel
 
@@ -6,11 +10,20 @@ from langchain_core.language_models.chat_models import BaseChatModel
 class RAGAgent:
     """Агент, использующий retriever для ответов на вопросы по внутренней документации."""
 
+    NO_CONTEXT = "В предоставленной документации нет информации"
+
     def __init__(
-        self, vector_store, llm: BaseChatModel, number_of_retrieved_documents: int = 5
+        self,
+        vector_store,
+        llm: BaseChatModel,
+        number_of_retrieved_documents: int = 5,
+        context_token_budget: int = 1500,
+        retriever: Optional[BaseRetriever] = None,
     ):
         self.vector_store = vector_store
-        self.retriever = vector_store.as_retriever(
+        self.context_token_budget = context_token_budget
+        # По умолчанию - плотный MMR поиск; можно передать гибридный retriever
+        self.retriever = retriever or vector_store.as_retriever(
             search_type="mmr",
             search_kwargs={
                 "k": number_of_retrieved_documents,
@@ -37,4 +50,44 @@ class RAGAgent:
         response = self.agent.invoke({"messages": [{"role": "user", "content": query}]})
         # print(f"\n\nreponse:\n{response}\n")
         # response["messages"][-1].pretty_print()
-        return response["messages"][-1].content
\ No newline at end of file
+        return response["messages"][-1].content
+
+    async def aask(self, query: str) -> str:
+        """Асинхронная версия ask, не блокирующая event loop."""
+        response = await self.agent.ainvoke(
+            {"messages": [{"role": "user", "content": query}]}
+        )
+        return response["messages"][-1].content
+
+    def _format_context(self, docs: list[Document]) -> str:
+        """Дедуплицирует чанки, подписывает источник и укладывает в бюджет токенов."""
+        seen, parts, used_tokens = set(), [], 0
+        for doc in docs:
+            meta = doc.metadata
+            key = (meta.get("url"), meta.get("chunk_id"))
+            text = doc.page_content.strip()
+            if key in seen or text in seen:
+                continue
+            seen.update((key, text))
+
+            header = (
+                f"[{len(parts) + 1}] {meta.get('title', 'Без заголовка')} "
+                f"({meta.get('url')}, chunk {meta.get('chunk_id')})"
+            )
+            # Грубая оценка: ~4 символа на токен
+            left = (self.context_token_budget - used_tokens) * 4 - len(header)
+            if left <= 0:
+                break
+            if len(text) > left:
+                text = text[:left].rstrip() + "..."
+            parts.append(f"{header}\n{text}")
+            used_tokens += (len(header) + len(text)) // 4
+
+        return "\n\n".join(parts) if parts else self.NO_CONTEXT
+
+    def retrieve(self, query: str) -> str:
+        """Прямой поиск без вложенного агента: компактные фрагменты с источниками."""
+        return self._format_context(self.retriever.invoke(query))
+
+    async def aretrieve(self, query: str) -> str:
+        return self._format_context(await self.retriever.ainvoke(query))
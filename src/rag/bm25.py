@@ -0,0 +1,142 @@
+import os
+import re
+import json
+from pathlib import Path
+from typing import Iterable, Optional
+from collections import Counter
+
+import numpy as np
+from langchain_core.documents import Document
+
+
+_TOKEN_RE = re.compile(r"[\w][\w.\-:/]*[\w]|\w", re.UNICODE)
+_CYRILLIC_RE = re.compile(r"[а-яё]")
+
+
+def tokenize(text: str) -> list[str]:
+    """Токены для BM25: идентификаторы (порты, коды ошибок, имена компонентов)
+    сохраняются целиком и дополнительно разбиваются на части; русские слова
+    обрезаются до 6 символов - грубый, но быстрый стемминг."""
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        parts = re.split(r"[.\-:/]", token)
+        if len(parts) > 1:
+            tokens.append(token)
+        for part in parts:
+            if not part:
+                continue
+            if _CYRILLIC_RE.match(part) and len(part) > 6:
+                part = part[:6]
+            tokens.append(part)
+    return tokens
+
+
+class BM25Index:
+    """In-process BM25 по чанкам документации с компактным инвертированным индексом.
+
+    Постинги хранятся в плоских numpy-массивах (CSR): offsets[term] указывает
+    на отрезок doc_ids/tfs. На диск индекс пишется одним .npz вместе с
+    текстами и метаданными чанков.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.docs: list[Document] = []
+        self.vocab: dict[str, int] = {}
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.doc_ids = np.zeros(0, dtype=np.int32)
+        self.tfs = np.zeros(0, dtype=np.float32)
+        self.doc_lengths = np.zeros(0, dtype=np.float32)
+        self.idf = np.zeros(0, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def build(self, docs: list[Document]) -> "BM25Index":
+        self.docs = list(docs)
+        postings: dict[str, list[tuple[int, int]]] = {}
+        lengths = []
+        for doc_id, doc in enumerate(self.docs):
+            counts = Counter(tokenize(doc.page_content))
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((doc_id, tf))
+
+        terms = sorted(postings)
+        self.vocab = {term: i for i, term in enumerate(terms)}
+        sizes = np.array([len(postings[t]) for t in terms], dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+        flat = [pair for term in terms for pair in postings[term]]
+        self.doc_ids = np.array([d for d, _ in flat], dtype=np.int32)
+        self.tfs = np.array([tf for _, tf in flat], dtype=np.float32)
+        self.doc_lengths = np.array(lengths, dtype=np.float32)
+        n = len(self.docs)
+        self.idf = np.log(1 + (n - sizes + 0.5) / (sizes + 0.5)).astype(np.float32)
+        return self
+
+    def update(self, changed: list[Document], removed_urls: Iterable[str] = ()) -> "BM25Index":
+        """Заменяет чанки изменившихся страниц и удаляет пропавшие страницы."""
+        drop = set(removed_urls) | {doc.metadata["url"] for doc in changed}
+        kept = [doc for doc in self.docs if doc.metadata.get("url") not in drop]
+        return self.build(kept + list(changed))
+
+    def search(self, query: str, k: int = 10) -> list[tuple[Document, float]]:
+        if not self.docs:
+            return []
+        scores = np.zeros(len(self.docs), dtype=np.float32)
+        avg_length = float(self.doc_lengths.mean()) or 1.0
+        for term in set(tokenize(query)):
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            ids, tfs = self.doc_ids[start:end], self.tfs[start:end]
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[ids] / avg_length)
+            scores[ids] += self.idf[term_id] * tfs * (self.k1 + 1) / (tfs + norm)
+
+        k = min(k, len(self.docs))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.docs[i], float(scores[i])) for i in top if scores[i] > 0]
+
+    def save(self, path: str):
+        """Атомарно сохраняет индекс в .npz (без pickle)."""
+        payload = json.dumps(
+            [{"text": d.page_content, "metadata": d.metadata} for d in self.docs],
+            ensure_ascii=False,
+        ).encode("utf-8")
+        vocab = json.dumps(sorted(self.vocab, key=self.vocab.get), ensure_ascii=False).encode("utf-8")
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp.npz")
+        np.savez_compressed(
+            tmp_path,
+            docs=np.frombuffer(payload, dtype=np.uint8),
+            vocab=np.frombuffer(vocab, dtype=np.uint8),
+            offsets=self.offsets,
+            doc_ids=self.doc_ids,
+            tfs=self.tfs,
+            doc_lengths=self.doc_lengths,
+            idf=self.idf,
+            params=np.array([self.k1, self.b], dtype=np.float32),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["BM25Index"]:
+        if not Path(path).exists():
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            k1, b = data["params"].tolist()
+            index = cls(k1=k1, b=b)
+            docs = json.loads(data["docs"].tobytes().decode("utf-8"))
+            index.docs = [Document(page_content=d["text"], metadata=d["metadata"]) for d in docs]
+            terms = json.loads(data["vocab"].tobytes().decode("utf-8"))
+            index.vocab = {term: i for i, term in enumerate(terms)}
+            index.offsets = data["offsets"]
+            index.doc_ids = data["doc_ids"]
+            index.tfs = data["tfs"]
+            index.doc_lengths = data["doc_lengths"]
+            index.idf = data["idf"]
+        return index
@@ -0,0 +1,205 @@
+import os
+import json
+import time
+import random
+import threading
+from pathlib import Path
+from typing import Iterable, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from qdrant_client import QdrantClient, models
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from src.utils.models.resilience import RETRYABLE_STATUS_CODES, CircuitOpenError, get_status_code, without_retries
+
+
+class AdaptiveLimiter:
+    """Ограничитель параллелизма с AIMD: при 429/5xx лимит уменьшается вдвое,
+    после серии успешных запросов - растёт на 1 до max_limit."""
+
+    def __init__(self, max_limit: int, increase_after: int = 5):
+        self.max_limit = max_limit
+        self.limit = max_limit
+        self.increase_after = increase_after
+        self._in_flight = 0
+        self._successes = 0
+        self._pause_until = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self._in_flight >= self.limit:
+                self._cond.wait()
+            self._in_flight += 1
+            pause = self._pause_until - time.monotonic()
+        if pause > 0:
+            time.sleep(pause)
+
+    def release(self, throttled: bool = False, delay: float = 0.0):
+        with self._cond:
+            self._in_flight -= 1
+            if throttled:
+                self.limit = max(1, self.limit // 2)
+                self._successes = 0
+                self._pause_until = max(self._pause_until, time.monotonic() + delay)
+            else:
+                self._successes += 1
+                if self._successes >= self.increase_after and self.limit < self.max_limit:
+                    self.limit += 1
+                    self._successes = 0
+            self._cond.notify_all()
+
+
+class EmbeddingPipeline:
+    """Пакетная параллельная векторизация чанков с записью в Qdrant.
+
+    Чанки делятся на пакеты по batch_size, пакеты векторизуются в нескольких
+    потоках и сразу записываются в коллекцию. При 429/5xx пакет повторяется
+    с экспоненциальной задержкой, а параллелизм уменьшается. Перед началом
+    URL обрабатываемых страниц добавляются в checkpoint_path: если процесс
+    упадёт, при следующем запуске эти страницы будут досинхронизированы.
+    Чекпоинт накапливается за все вызовы run одной индексации и удаляется
+    вызывающим кодом (clear_checkpoint) после её завершения.
+    """
+
+    def __init__(
+        self,
+        client: QdrantClient,
+        embeddings: Embeddings,
+        batch_size: int = 64,
+        max_concurrency: int = 4,
+        max_retries: int = 6,
+        base_delay: float = 1.0,
+        checkpoint_path: Optional[str] = None,
+    ):
+        self.client = client
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.checkpoint_path = Path(checkpoint_path) if checkpoint_path else None
+        # Векторизация идёт параллельно, а запись - последовательно:
+        # локальный режим Qdrant (path=...) не потокобезопасен
+        self._write_lock = threading.Lock()
+
+    # Чекпоинт
+
+    def pending_urls(self, collection_name: str) -> set[str]:
+        """URL страниц, запись которых в коллекцию была прервана."""
+        if not self.checkpoint_path or not self.checkpoint_path.exists():
+            return set()
+        with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+            checkpoint = json.load(f)
+        if checkpoint.get("collection_name") != collection_name:
+            return set()
+        return set(checkpoint.get("pending_urls", []))
+
+    def _save_checkpoint(self, collection_name: str, urls: Iterable[str]):
+        if not self.checkpoint_path:
+            return
+        # Дописываем, а не заменяем: недописанные страницы прошлых пачек остаются в чекпоинте
+        urls = self.pending_urls(collection_name) | set(urls)
+        self.checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.checkpoint_path.with_suffix(self.checkpoint_path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"collection_name": collection_name, "pending_urls": sorted(urls)},
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def clear_checkpoint(self):
+        if self.checkpoint_path and self.checkpoint_path.exists():
+            self.checkpoint_path.unlink()
+
+    # Векторизация
+
+    def _embed_with_retry(self, texts: list[str], limiter: AdaptiveLimiter) -> list[list[float]]:
+        for attempt in range(self.max_retries + 1):
+            limiter.acquire()
+            try:
+                # Повторяет пайплайн: повторы лимитера провайдера скрыли бы 429 от AIMD
+                with without_retries():
+                    vectors = self.embeddings.embed_documents(texts)
+            except Exception as e:
+                code = get_status_code(e)
+                # Открытый circuit breaker не повторяем: пакет досинхронизируется по чекпоинту
+                retryable = code in RETRYABLE_STATUS_CODES and not isinstance(e, CircuitOpenError)
+                if not retryable or attempt == self.max_retries:
+                    limiter.release()
+                    raise
+                delay = self.base_delay * 2**attempt * random.uniform(0.5, 1.5)
+                limiter.release(throttled=True, delay=delay)
+                print(
+                    f"[WARNING] Эмбеддинги: HTTP {code}, повтор {attempt + 1}/{self.max_retries} "
+                    f"через {delay:.1f} c (параллелизм {limiter.limit})"
+                )
+                time.sleep(delay)
+            else:
+                limiter.release()
+                return vectors
+
+    def _process_batch(
+        self,
+        collection_name: str,
+        batch: list[tuple[str, Document]],
+        limiter: AdaptiveLimiter,
+    ) -> int:
+        ids = [point_id for point_id, _ in batch]
+        docs = [doc for _, doc in batch]
+        vectors = self._embed_with_retry([doc.page_content for doc in docs], limiter)
+        points = [
+            models.PointStruct(
+                id=point_id,
+                vector=vector,
+                # Формат payload совпадает с langchain_qdrant.QdrantVectorStore
+                payload={"page_content": doc.page_content, "metadata": doc.metadata},
+            )
+            for point_id, doc, vector in zip(ids, docs, vectors)
+        ]
+        with self._write_lock:
+            self.client.upsert(collection_name=collection_name, points=points)
+        return len(batch)
+
+    def run(self, collection_name: str, ids: list[str], docs: list[Document]) -> dict:
+        """Векторизует и записывает чанки, возвращает статистику (в т.ч. chunks/sec)."""
+        if not docs:
+            return {"chunks": 0, "seconds": 0.0, "chunks_per_sec": 0.0}
+
+        pairs = list(zip(ids, docs))
+        batches = [
+            pairs[i : i + self.batch_size] for i in range(0, len(pairs), self.batch_size)
+        ]
+        self._save_checkpoint(collection_name, {doc.metadata["url"] for doc in docs})
+
+        limiter = AdaptiveLimiter(self.max_concurrency)
+        report_every = max(1, len(batches) // 10)
+        done = 0
+        start = time.perf_counter()
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+        try:
+            futures = [
+                executor.submit(self._process_batch, collection_name, batch, limiter)
+                for batch in batches
+            ]
+            for n, future in enumerate(as_completed(futures), start=1):
+                done += future.result()
+                if n % report_every == 0 or n == len(batches):
+                    elapsed = time.perf_counter() - start
+                    print(
+                        f"[INFO] Векторизовано {done}/{len(docs)} чанков "
+                        f"({done / elapsed:.1f} чанков/с)"
+                    )
+        finally:
+            # При ошибке не запускаем оставшиеся пакеты; чекпоинт остаётся для досинхронизации
+            executor.shutdown(wait=True, cancel_futures=True)
+
+        elapsed = time.perf_counter() - start
+        return {
+            "chunks": done,
+            "seconds": round(elapsed, 3),
+            "chunks_per_sec": round(done / elapsed, 2) if elapsed else 0.0,
+        }
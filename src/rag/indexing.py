@@ -1,26 +1,43 @@
+import uuid
+from typing import Iterable
+
 from qdrant_client import QdrantClient, models
 from langchain_qdrant import QdrantVectorStore
 from langchain_core.documents import Document
 from langchain_core.embeddings import Embeddings
 
 from src.config import settings
+from src.utils.models.llm_factory import get_embedding_dimension
+from src.rag.embedding_pipeline import EmbeddingPipeline
 
 
 class Index:
     """Управляет созданием Qdrant коллекции и хранением векторов."""
 
+    INDEXED_FIELDS = ("metadata.url", "metadata.source_hash")
+
     def __init__(self, path: str, collection_name: str, embeddings: Embeddings):
         self.path = path
         self.collection_name = collection_name
-        self.client = QdrantClient(url=settings.QDRANT_URL)
-        # self.client = QdrantClient(path=settings.QDRANT_PATH)
+        # Без QDRANT_URL - локальный режим Qdrant в каталоге path (без сервера)
+        self.client = QdrantClient(url=settings.QDRANT_URL) if settings.QDRANT_URL else QdrantClient(path=path)
         self.embeddings = embeddings
+        self.pipeline = EmbeddingPipeline(
+            client=self.client,
+            embeddings=embeddings,
+            batch_size=settings.EMBED_BATCH_SIZE,
+            max_concurrency=settings.EMBED_CONCURRENCY,
+            max_retries=settings.EMBED_MAX_RETRIES,
+            checkpoint_path=settings.EMBED_CHECKPOINT_PATH,
+        )
+        self._initialized = False
 
     def initialize(self):
         """Создаёт коллекцию, если она не существует."""
-        vector_size = len(self.embeddings.embed_query("test"))
+        if self._initialized:
+            return
+        vector_size = get_embedding_dimension(self.embeddings)
         self.collection_name = f"{settings.QDRANT_COLLECTION}_{settings.LLM_MODE}_{vector_size}"
-        # vector_size = 1024
         if not self.client.collection_exists(self.collection_name):
             self.client.create_collection(
                 collection_name=self.collection_name,
@@ -28,64 +45,211 @@ class Index:
                     size=vector_size, distance=models.Distance.COSINE, on_disk=True
                 ),
             )
+        self._ensure_payload_indexes()
+        self._initialized = True
 
-    def _get_existing_hashes(self) -> set[str]:
-        """Загружает все существующие source_hash из коллекции Qdrant"""
-        try:
-            existing_hashes = set()
-            scroll_offset = None
+    def _ensure_payload_indexes(self):
+        """Создаёт keyword-индексы по url и source_hash для быстрых фильтров."""
+        payload_schema = self.client.get_collection(self.collection_name).payload_schema
+        for field in self.INDEXED_FIELDS:
+            if field not in payload_schema:
+                self.client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name=field,
+                    field_schema=models.PayloadSchemaType.KEYWORD,
+                )
+
+    def collection_exists(self, collection_name: str) -> bool:
+        return self.client.collection_exists(collection_name)
+
+    def connect(self, collection_name: str) -> QdrantVectorStore:
+        """Подключается к существующей коллекции без загрузки документов."""
+        self.collection_name = collection_name
+        print(f"[INFO] Корпус не изменился, подключаюсь к коллекции '{collection_name}'.")
+        return self._vector_store()
+
+    def _vector_store(self) -> QdrantVectorStore:
+        return QdrantVectorStore(
+            client=self.client,
+            collection_name=self.collection_name,
+            embedding=self.embeddings,
+        )
 
+    def _get_existing_hashes(self, candidates: Iterable[str], batch_size: int = 256) -> set[str]:
+        """Возвращает те source_hash из candidates, которые уже есть в коллекции.
+
+        Проверяются только кандидаты (фильтр по индексу source_hash), из payload
+        читается одно поле. Ошибки Qdrant пробрасываются, а не превращаются в
+        пустое множество (иначе весь корпус был бы проиндексирован заново).
+        """
+        candidates = sorted(set(candidates))
+        existing_hashes = set()
+        for i in range(0, len(candidates), batch_size):
+            batch = candidates[i : i + batch_size]
+            scroll_offset = None
             while True:
                 points, scroll_offset = self.client.scroll(
                     collection_name=self.collection_name,
-                    with_payload=True,
+                    scroll_filter=self._match_any("metadata.source_hash", batch),
+                    with_payload=["metadata.source_hash"],
+                    with_vectors=False,
                     limit=1000,
                     offset=scroll_offset,
                 )
                 for p in points:
-                    payload = p.payload or {}
-                    if "source_hash" in payload["metadata"]:
-                        existing_hashes.add(payload["metadata"]["source_hash"])
+                    source_hash = (p.payload or {}).get("metadata", {}).get("source_hash")
+                    if source_hash:
+                        existing_hashes.add(source_hash)
+                if scroll_offset is None:
+                    break
+
+        return existing_hashes
+
+    @staticmethod
+    def point_id(doc: Document) -> str:
+        """Детерминированный id точки по (url, chunk_id, хэш чанка)."""
+        meta = doc.metadata
+        key = f"{meta['url']}|{meta['chunk_id']}|{meta['chunk_hash']}"
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, key))
+
+    @staticmethod
+    def _match_any(key: str, values: list[str]) -> models.Filter:
+        return models.Filter(
+            must=[models.FieldCondition(key=key, match=models.MatchAny(any=values))]
+        )
+
+    def _get_point_ids(self, urls: list[str], batch_size: int = 256) -> set[str]:
+        """Возвращает id всех точек, относящихся к переданным URL (без payload)."""
+        point_ids = set()
+        for i in range(0, len(urls), batch_size):
+            scroll_offset = None
+            while True:
+                points, scroll_offset = self.client.scroll(
+                    collection_name=self.collection_name,
+                    scroll_filter=self._match_any("metadata.url", urls[i : i + batch_size]),
+                    with_payload=False,
+                    with_vectors=False,
+                    limit=1000,
+                    offset=scroll_offset,
+                )
+                point_ids.update(str(p.id) for p in points)
                 if scroll_offset is None:
                     break
+        return point_ids
+
+    def _get_existing_ids(self, point_ids: list[str], batch_size: int = 256) -> set[str]:
+        """Возвращает те id из point_ids, точки которых уже есть в коллекции."""
+        existing = set()
+        for i in range(0, len(point_ids), batch_size):
+            points = self.client.retrieve(
+                collection_name=self.collection_name,
+                ids=point_ids[i : i + batch_size],
+                with_payload=False,
+                with_vectors=False,
+            )
+            existing.update(str(p.id) for p in points)
+        return existing
+
+    def get_indexed_urls(self) -> set[str]:
+        """Загружает все URL, присутствующие в коллекции (только поле url)."""
+        self.initialize()
+        urls = set()
+        scroll_offset = None
+        while True:
+            points, scroll_offset = self.client.scroll(
+                collection_name=self.collection_name,
+                with_payload=["metadata.url"],
+                limit=1000,
+                offset=scroll_offset,
+            )
+            for p in points:
+                url = (p.payload or {}).get("metadata", {}).get("url")
+                if url:
+                    urls.add(url)
+            if scroll_offset is None:
+                break
+        return urls
+
+    def delete_urls(self, urls: Iterable[str], batch_size: int = 256):
+        """Удаляет все чанки страниц, которых больше нет в корпусе."""
+        urls = list(urls)
+        for i in range(0, len(urls), batch_size):
+            self.client.delete(
+                collection_name=self.collection_name,
+                points_selector=models.FilterSelector(
+                    filter=self._match_any("metadata.url", urls[i : i + batch_size])
+                ),
+            )
 
-            return existing_hashes
+    def clear_checkpoint(self):
+        """Удаляет чекпоинт векторизации - вызывается, когда индексация завершена целиком."""
+        self.pipeline.clear_checkpoint()
 
-        except Exception:
-            return set()
+    def add_documents(
+        self, docs: list[Document], removed_urls: Iterable[str] = ()
+    ) -> QdrantVectorStore:
+        """Инкрементально синхронизирует чанки с Qdrant.
 
-    def add_documents(self, docs: list[Document]):
-        """Добавляет документы в Qdrant."""
+        Для страниц из docs новые чанки добавляются (upsert по детерминированному id),
+        устаревшие чанки этих страниц удаляются. Страницы из removed_urls удаляются целиком.
+        Страница пропускается, только если в коллекции есть каждый её чанк.
+        """
         self.initialize()
+        vector_store = self._vector_store()
+
+        removed_urls = list(removed_urls)
+        if removed_urls:
+            print(f"[INFO] Удаляю чанки {len(removed_urls)} удалённых страниц из '{self.collection_name}'.")
+            self.delete_urls(removed_urls)
 
-        existing_hashes = self._get_existing_hashes()
-        new_docs = [
+        existing_hashes = self._get_existing_hashes(
+            doc.metadata.get("source_hash") for doc in docs
+        )
+        # Страница с известным хэшем готова, только если записан каждый её чанк:
+        # прерванная запись оставляет часть чанков с новым source_hash
+        known = [(self.point_id(doc), doc) for doc in docs if doc.metadata.get("source_hash") in existing_hashes]
+        written_ids = self._get_existing_ids([point_id for point_id, _ in known])
+        incomplete_urls = {doc.metadata["url"] for point_id, doc in known if point_id not in written_ids}
+        # Страницы, запись которых была прервана, досинхронизируются независимо от хэша
+        pending_urls = self.pipeline.pending_urls(self.collection_name) | incomplete_urls
+        changed_docs = [
             doc
             for doc in docs
             if doc.metadata.get("source_hash") not in existing_hashes
+            or doc.metadata["url"] in pending_urls
         ]
 
-        if not new_docs:
+        if not changed_docs:
             print(
                 f"[INFO] Все документы уже добавлены в коллекцию '{self.collection_name}'. Пропуск."
             )
-            return QdrantVectorStore(
-                client=self.client,
+            return vector_store
+
+        ids = [self.point_id(doc) for doc in changed_docs]
+        changed_urls = sorted({doc.metadata["url"] for doc in changed_docs})
+        existing_ids = self._get_point_ids(changed_urls)
+
+        stale_ids = existing_ids - set(ids)
+        if stale_ids:
+            print(f"[INFO] Удаляю {len(stale_ids)} устаревших чанков из '{self.collection_name}'.")
+            self.client.delete(
                 collection_name=self.collection_name,
-                embedding=self.embeddings,
+                points_selector=models.PointIdsList(points=list(stale_ids)),
             )
 
+        new_pairs = [(i, doc) for i, doc in zip(ids, changed_docs) if i not in existing_ids]
         print(
-            f"[INFO] В коллекции  '{self.collection_name}' существует {len(existing_hashes)} документов."
+            f"[INFO] В коллекции  '{self.collection_name}' уже есть {len(existing_hashes)} из переданных документов."
         )
         print(
-            f"[INFO] Добавляю {len(new_docs)} новых документов в коллекцию '{self.collection_name}'..."
+            f"[INFO] Добавляю {len(new_pairs)} новых чанков в коллекцию '{self.collection_name}'..."
         )
-        vector_store = QdrantVectorStore(
-            client=self.client,
-            collection_name=self.collection_name,
-            embedding=self.embeddings,
-        )
-        vector_store.add_documents(new_docs)
+        if new_pairs:
+            new_ids, new_docs = zip(*new_pairs)
+            stats = self.pipeline.run(self.collection_name, list(new_ids), list(new_docs))
+            print(
+                f"[INFO] Векторизация завершена: {stats['chunks']} чанков за {stats['seconds']} c "
+                f"({stats['chunks_per_sec']} чанков/с)"
+            )
 
         return vector_store
@@ -1,38 +1,84 @@
 import json
 from pathlib import Path
+from typing import Iterator, Optional
 from langchain_core.documents import Document
 
-from src.config import settings
+from src.utils.corpus import CorpusStore, open_corpus
+from src.utils.utils import hash_content
 
 
 class DocumentLoader:
-    """Чтение и представление документов"""
+    """Чтение и представление документов.
+
+    path - хранилище корпуса (SQLite, см. src/utils/corpus.py) или, для
+    совместимости, data.json. Документы читаются потоково, пачками.
+    """
     def __init__(self, path: str):
         self.path = path
+        self._store: Optional[CorpusStore] = None
+
+    @property
+    def is_json(self) -> bool:
+        return self.path.endswith(".json")
 
     def _ensure_data_exists(self):
-        data_path = Path(settings.DATA_PATH).resolve()
+        data_path = Path(self.path).resolve()
         if not data_path.exists():
             raise FileNotFoundError(
                 f"Файл {data_path} не найден."
                 "\nЗапустите `python -m src.crawler` сначала."
             )
-            
-    
-    def load(self) -> list[Document]:
-        """Загружает данные из JSON и возвращает список Document."""
+
+    @property
+    def store(self) -> CorpusStore:
+        if self._store is None:
+            # Пустое хранилище заполняется из data.json, если он есть
+            store = open_corpus(self.path)
+            if store.count() == 0:
+                raise FileNotFoundError(
+                    f"Корпус {Path(self.path).resolve()} пуст."
+                    "\nЗапустите `python -m src.crawler` сначала."
+                )
+            self._store = store
+        return self._store
+
+    def _read_json(self) -> dict:
         self._ensure_data_exists()
-        with open(settings.DATA_PATH, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    @staticmethod
+    def _document(url: str, title: Optional[str], content: Optional[str]) -> Document:
+        metadata = {"url": url, "title": title or "Без заголовка"}
+        return Document(page_content=content or "", metadata=metadata)
 
-        documents = []
-        for url, doc_data in data.items():
-            metadata = {"url": url, "title": doc_data.get("title", "Без заголовка")}
-            content = doc_data.get("content", "")
-            documents.append(Document(page_content=content, metadata=metadata))
-        return documents
-        
+    def iter_documents(self, batch_size: int = 256, urls: Optional[set[str]] = None) -> Iterator[Document]:
+        """Лениво отдаёт Document по одному; urls ограничивает выборку."""
+        if self.is_json:
+            for url, doc_data in self._read_json().items():
+                if urls is None or url in urls:
+                    yield self._document(url, doc_data.get("title"), doc_data.get("content"))
+            return
+        for url, title, content in self.store.iter_pages(batch_size=batch_size, urls=urls):
+            yield self._document(url, title, content)
 
-        
+    def iter_batches(self, batch_size: int = 256, urls: Optional[set[str]] = None) -> Iterator[list[Document]]:
+        """Пачки не больше batch_size документов - для разбиения и индексации по частям."""
+        batch = []
+        for doc in self.iter_documents(batch_size=batch_size, urls=urls):
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
 
+    def url_hashes(self) -> dict[str, str]:
+        """url -> хэш содержимого; для хранилища - без чтения самих страниц."""
+        if self.is_json:
+            return {url: hash_content(d.get("content") or "") for url, d in self._read_json().items()}
+        return self.store.hashes()
 
+    def load(self) -> list[Document]:
+        """Загружает все документы списком (для небольших корпусов и бенчмарков)."""
+        return list(self.iter_documents())
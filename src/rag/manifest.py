@@ -0,0 +1,78 @@
+import os
+import json
+from pathlib import Path
+from typing import Optional
+
+
+class IngestManifest:
+    """Манифест индексации: состояние корпуса на момент последней загрузки в Qdrant.
+
+    Хранит mtime/size файла с данными, параметры индексации, имя коллекции
+    и хэши содержимого по каждому URL. Если файл и параметры не изменились,
+    повторная загрузка и разбиение корпуса не нужны.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.data = self._read()
+
+    def _read(self) -> dict:
+        if not self.path.exists():
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"[WARNING] Манифест {self.path} повреждён, будет пересоздан: {e}")
+            return {}
+        if data.get("version") != self.VERSION:
+            return {}
+        return data
+
+    @staticmethod
+    def _file_stat(data_path: str) -> dict:
+        stat = os.stat(data_path)
+        return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+    @property
+    def collection_name(self) -> Optional[str]:
+        return self.data.get("collection_name")
+
+    @property
+    def url_hashes(self) -> dict[str, str]:
+        return self.data.get("url_hashes", {})
+
+    def is_fresh(self, data_path: str, params: dict) -> bool:
+        """True, если корпус и параметры индексации не менялись с прошлой загрузки."""
+        if not self.data:
+            return False
+        return (
+            self.data.get("file") == self._file_stat(data_path)
+            and self.data.get("params") == params
+        )
+
+    def matches_params(self, params: dict) -> bool:
+        return bool(self.data) and self.data.get("params") == params
+
+    def save(
+        self,
+        data_path: str,
+        params: dict,
+        collection_name: str,
+        url_hashes: dict[str, str],
+    ):
+        """Атомарно сохраняет манифест (через временный файл)."""
+        self.data = {
+            "version": self.VERSION,
+            "file": self._file_stat(data_path),
+            "params": params,
+            "collection_name": collection_name,
+            "url_hashes": url_hashes,
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,144 @@
+import math
+import time
+import hashlib
+import threading
+from typing import Any, Optional
+from collections import Counter, OrderedDict
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables.config import run_in_executor
+from pydantic import ConfigDict, PrivateAttr
+
+from src.rag.bm25 import tokenize
+from src.utils.utils import hash_content
+
+
+class LexicalReranker:
+    """Офлайн-реранкер без моделей: взвешенное покрытие терминов запроса плюс
+    бонус за совпадающие биграммы. Оценка чанка не зависит от соседей по
+    пакету, поэтому пакетная обработка не меняет порядок."""
+
+    @staticmethod
+    def _weight(term: str) -> float:
+        # Идентификаторы (с цифрами, длинные) важнее служебных слов
+        return 1.0 + 0.5 * any(ch.isdigit() for ch in term) + min(len(term), 10) / 10
+
+    def score(self, query: str, texts: list[str]) -> list[float]:
+        query_tokens = tokenize(query)
+        if not query_tokens:
+            return [0.0] * len(texts)
+        query_terms = set(query_tokens)
+        query_bigrams = set(zip(query_tokens, query_tokens[1:]))
+
+        scores = []
+        for text in texts:
+            tokens = tokenize(text)
+            counts = Counter(tokens)
+            score = sum(
+                self._weight(term) * (1 + math.log(counts[term]))
+                for term in query_terms
+                if counts[term]
+            )
+            score += 0.5 * len(query_bigrams & set(zip(tokens, tokens[1:])))
+            # Нормировка по длине, чтобы длинные чанки не выигрывали только за счёт объёма
+            scores.append(score / math.sqrt(1 + len(tokens) / 100))
+        return scores
+
+
+class CrossEncoderReranker:
+    """Локальный ONNX cross-encoder (fastembed) на CPU.
+
+    fastembed - необязательная зависимость: `pip install fastembed`.
+    """
+
+    def __init__(self, model_name: str, threads: Optional[int] = None):
+        from fastembed.rerank.cross_encoder import TextCrossEncoder
+
+        self.model = TextCrossEncoder(model_name=model_name, threads=threads)
+
+    def score(self, query: str, texts: list[str]) -> list[float]:
+        return [float(score) for score in self.model.rerank(query, texts, batch_size=len(texts))]
+
+
+def create_reranker(kind: str, model_name: str):
+    """Создаёт реранкер; если cross-encoder недоступен, возвращает лексический."""
+    if kind == "cross-encoder":
+        try:
+            return CrossEncoderReranker(model_name)
+        except Exception as e:
+            print(f"[WARNING] Cross-encoder {model_name} недоступен ({e}), используется лексический реранкер.")
+    return LexicalReranker()
+
+
+class RerankingRetriever(BaseRetriever):
+    """Двухэтапный поиск: дешёвый retriever отдаёт широкий набор кандидатов,
+    локальный реранкер переупорядочивает их, до LLM доходят top_n чанков.
+
+    Кандидаты оцениваются пакетами по batch_size; если бюджет budget_ms
+    исчерпан, неоценённые кандидаты остаются в исходном порядке после
+    оценённых. Оценки кэшируются по (хэш запроса, хэш чанка).
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    base_retriever: BaseRetriever
+    reranker: Any
+    top_n: int = 3
+    batch_size: int = 16
+    budget_ms: float = 300.0
+    cache_size: int = 10000
+
+    _cache: OrderedDict = PrivateAttr(default_factory=OrderedDict)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @staticmethod
+    def _chunk_key(doc: Document) -> str:
+        return doc.metadata.get("chunk_hash") or hash_content(doc.page_content)
+
+    def _rerank(self, query: str, candidates: list[Document]) -> list[Document]:
+        query_hash = hashlib.sha1(query.encode("utf-8")).hexdigest()
+        keys = [(query_hash, self._chunk_key(doc)) for doc in candidates]
+        scores: dict[int, float] = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    scores[i] = self._cache[key]
+
+        pending = [i for i in range(len(candidates)) if i not in scores]
+        deadline = time.perf_counter() + self.budget_ms / 1000
+        for start in range(0, len(pending), self.batch_size):
+            if time.perf_counter() > deadline:
+                break
+            batch = pending[start : start + self.batch_size]
+            batch_scores = self.reranker.score(query, [candidates[i].page_content for i in batch])
+            scores.update(zip(batch, batch_scores))
+
+        with self._lock:
+            for i in pending:
+                if i in scores:
+                    self._cache[keys[i]] = scores[i]
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        scored = sorted(scores, key=scores.get, reverse=True)
+        unscored = [i for i in range(len(candidates)) if i not in scores]
+        return [candidates[i] for i in (scored + unscored)[: self.top_n]]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        candidates = self.base_retriever.invoke(query)
+        return self._rerank(query, candidates)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        candidates = await self.base_retriever.ainvoke(query)
+        # Реранкер работает на CPU: не блокируем event loop
+        return await run_in_executor(None, self._rerank, query, candidates)
@@ -0,0 +1,52 @@
+from typing import Any
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from src.rag.bm25 import BM25Index
+
+
+class HybridRetriever(BaseRetriever):
+    """Гибридный поиск: плотный (Qdrant) + лексический (BM25), объединённые
+    через reciprocal rank fusion. Каждый поиск отдаёт candidates кандидатов,
+    наружу возвращаются k лучших после слияния."""
+
+    vector_store: Any
+    bm25: BM25Index
+    k: int = 3
+    candidates: int = 20
+    rrf_k: int = 60
+
+    @staticmethod
+    def _key(doc: Document) -> tuple:
+        return doc.metadata.get("url"), doc.metadata.get("chunk_id")
+
+    def _fuse(self, dense: list[Document], sparse: list[Document]) -> list[Document]:
+        scores: dict[tuple, float] = {}
+        docs: dict[tuple, Document] = {}
+        # Порядок списков важен: при совпадении берётся документ из Qdrant (с _id)
+        for ranking in (dense, sparse):
+            for rank, doc in enumerate(ranking):
+                key = self._key(doc)
+                scores[key] = scores.get(key, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+                docs.setdefault(key, doc)
+        best = sorted(scores, key=scores.get, reverse=True)[: self.k]
+        return [docs[key] for key in best]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        dense = self.vector_store.similarity_search(query, k=self.candidates)
+        sparse = [doc for doc, _ in self.bm25.search(query, k=self.candidates)]
+        return self._fuse(dense, sparse)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        dense = await self.vector_store.asimilarity_search(query, k=self.candidates)
+        sparse = [doc for doc, _ in self.bm25.search(query, k=self.candidates)]
+        return self._fuse(dense, sparse)
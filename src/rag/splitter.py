@@ -30,6 +30,7 @@ class DocumentSplitter:
                     {
                         "chunk_id": i,
                         "source_hash": content_hash,  # хэш исходного документа
+                        "chunk_hash": hash_content(chunk_text),
                     }
                 )
                 processed_docs.append(
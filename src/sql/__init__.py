@@ -1,11 +1,26 @@
 from src.config import settings
-from src.utils.models.llm_factory import create_chat_model
+from src.utils.models.llm_factory import create_chat_model, create_embedding_model
 from .agent import SQLAgent
+from .templates import EntityIndex, TemplateCache
 
 
 def load_sql_agent():
     llm = create_chat_model()
-    agent = SQLAgent(db_path=settings.DB_PATH, llm=llm)
+    templates = None
+    if settings.SQL_TEMPLATE_CACHE_SIZE > 0:
+        templates = TemplateCache(
+            entity_index=EntityIndex(settings.DB_PATH),
+            embeddings=create_embedding_model(),
+            similarity_threshold=settings.SQL_TEMPLATE_THRESHOLD,
+            max_size=settings.SQL_TEMPLATE_CACHE_SIZE,
+        )
+    agent = SQLAgent(
+        db_path=settings.DB_PATH,
+        llm=llm,
+        sample_rows=settings.SQL_SAMPLE_ROWS,
+        cache_size=settings.SQL_CACHE_SIZE,
+        templates=templates,
+    )
     return agent
 
 # query = "Какая роль у сотрудника Jane Doe?"
@@ -1,22 +1,62 @@
+import re
+import time
+import asyncio
+from typing import Optional
 from pathlib import Path
 
 from langchain_community.utilities import SQLDatabase
-from langchain_community.agent_toolkits import SQLDatabaseToolkit
 from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.tools import StructuredTool
 from langchain.agents import create_agent
+from langchain.agents.middleware import dynamic_prompt
+
+from .cache import QueryCache, SchemaCache, is_read_only
+from .templates import TemplateCache, TemplateMatch
+
+_SQL_BLOCK = re.compile(r"```(?:sql)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
 
 
 class SQLAgent:
-    """Агент, использующий SQL-запросы для ответов на вопросы по базе данных."""
+    """Агент, использующий SQL-запросы для ответов на вопросы по базе данных.
 
-    def __init__(self, db_path: str, llm: BaseChatModel):
+    Схема БД (таблицы, колонки, примеры строк) описывается один раз и
+    подставляется в промпт, поэтому LLM сразу пишет запрос, без вызовов
+    list_tables / schema / query_checker. Описание обновляется при изменении
+    файла БД. Результаты read-only запросов кэшируются (LRU) по
+    нормализованному SQL и версии БД. С templates повторяющиеся по форме
+    вопросы выполняются по сохранённому параметризованному SQL без LLM.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        llm: BaseChatModel,
+        sample_rows: int = 3,
+        cache_size: int = 1000,
+        templates: Optional[TemplateCache] = None,
+    ):
         self.db_path = db_path
         self.llm = llm
-        self.db = self._load_database()
+        self.templates = templates
+        self.sample_rows = sample_rows
+        self.db = None
+        self.schema = SchemaCache(str(Path(db_path).resolve()), self._describe_schema)
+        self.schema.get()
+        self.query_cache = QueryCache(max_size=cache_size)
+        self.stats = {"direct": 0, "fallbacks": 0}
 
-        # Создаём toolkit и инструменты
-        toolkit = SQLDatabaseToolkit(db=self.db, llm=self.llm)
-        self.tools = toolkit.get_tools()
+        self.tools = [
+            StructuredTool.from_function(
+                func=self._query_tool,
+                coroutine=self._aquery_tool,
+                name="sql_db_query",
+                description=(
+                    "Выполняет read-only SQL-запрос (SELECT) к базе данных и возвращает результат. "
+                    "Если запрос неверный, вернётся ошибка - исправь запрос и повтори."
+                ),
+            )
+        ]
 
         self.prompt = """Ты - технический ассистент, специализирующийся на SQL.
                     Твоя задача - анализировать вопрос пользователя и формировать корректные SQL-запросы.
@@ -29,7 +69,12 @@ class SQLAgent:
                     - Если результат неоднозначен, уточни у пользователя.
                     """
 
-        self.agent = create_agent(self.llm, self.tools, system_prompt=self.prompt)
+        self.query_prompt = """Ты - генератор SQL-запросов для SQLite.
+                    По вопросу пользователя напиши один SELECT-запрос к базе данных со схемой ниже.
+                    Ответь только SQL-запросом, без пояснений.
+                    """
+
+        self.agent = create_agent(self.llm, self.tools, middleware=[self._schema_prompt()])
 
     def _load_database(self) -> SQLDatabase:
         """Инициализирует LangChain SQLDatabase, используя локальную SQLite БД."""
@@ -39,10 +84,139 @@ class SQLAgent:
                 f"SQL база данных {db_file} не найдена. "
                 "Проверь путь или загрузите .db файл."
             )
-        return SQLDatabase.from_uri(f"sqlite:///{db_file}")
+        return SQLDatabase.from_uri(f"sqlite:///{db_file}", sample_rows_in_table_info=self.sample_rows)
+
+    def _describe_schema(self) -> str:
+        # SQLDatabase читает метаданные при создании - при изменении БД создаём заново
+        self.db = self._load_database()
+        return self.db.get_table_info()
+
+    def _schema_prompt(self):
+        @dynamic_prompt
+        def schema_prompt(request) -> str:
+            return f"{self.prompt}\n\nСхема базы данных:\n{self.schema.get()}"
+
+        return schema_prompt
+
+    def run_query(self, sql: str, parameters: Optional[dict] = None) -> str:
+        """Выполняет read-only SQL-запрос с кэшированием результата."""
+        if not is_read_only(sql):
+            raise ValueError("Разрешены только запросы на чтение (SELECT)")
+        self.schema.get()
+        version = self.schema.version
+        result = self.query_cache.get(sql, version, parameters)
+        if result is None:
+            result = self.db.run(sql, include_columns=True, parameters=parameters)
+            self.query_cache.put(sql, version, result, parameters)
+        return result
+
+    def _run_template(self, match: TemplateMatch) -> Optional[str]:
+        """Выполняет SQL найденного шаблона; ошибка или пустой результат - промах."""
+        try:
+            result = self.run_query(match.template.sql, match.parameters)
+        except Exception as e:
+            print(f"[WARNING] Шаблон SQL не выполнен ({e}), используем LLM")
+            result = None
+        if not result:
+            self.templates.discard(match)
+        return result or None
+
+    def _query_tool(self, query: str) -> str:
+        try:
+            return self.run_query(query) or "Пустой результат"
+        except Exception as e:
+            return f"Ошибка: {e}"
+
+    async def _aquery_tool(self, query: str) -> str:
+        return await asyncio.to_thread(self._query_tool, query)
+
+    def _query_messages(self, question: str) -> list:
+        return [
+            SystemMessage(content=f"{self.query_prompt}\n\nСхема базы данных:\n{self.schema.get()}"),
+            HumanMessage(content=question),
+        ]
+
+    @staticmethod
+    def _extract_sql(text: str) -> str:
+        match = _SQL_BLOCK.search(text)
+        return (match.group(1) if match else text).strip()
+
+    @staticmethod
+    def _format_result(sql: str, result: str, parameters: Optional[dict] = None) -> str:
+        if parameters:
+            sql = f"{sql} {parameters}"
+        return f"SQL-запрос: {sql}\nРезультат: {result or 'пустой результат, в базе данных нет информации'}"
+
+    def _on_llm_result(self, match: Optional[TemplateMatch], sql: str, result: str, started: float):
+        self.stats["direct"] += 1
+        if match is not None:
+            self.templates.observe_llm(time.perf_counter() - started)
+            if result:
+                self.templates.record(match, sql)
+
+    def retrieve(self, query: str) -> str:
+        """Один вызов LLM: вопрос -> SQL по схеме из промпта -> результат запроса.
+        Сначала ищется подходящий шаблон SQL (без LLM). Если запрос не
+        получился, вопрос передаётся полному SQL агенту."""
+        started = time.perf_counter()
+        match = None
+        if self.templates is not None:
+            match = self.templates.lookup(query)
+            if match.template is not None:
+                result = self._run_template(match)
+                if result:
+                    self.templates.observe_hit(match, time.perf_counter() - started)
+                    return self._format_result(match.template.sql, result, match.parameters)
+
+        sql = self._extract_sql(self.llm.invoke(self._query_messages(query)).text)
+        try:
+            result = self.run_query(sql)
+        except Exception as e:
+            print(f"[WARNING] SQL-запрос не выполнен ({e}), используем SQL агента")
+            self.stats["fallbacks"] += 1
+            return self.ask(query)
+        self._on_llm_result(match, sql, result, started)
+        return self._format_result(sql, result)
+
+    async def aretrieve(self, query: str) -> str:
+        started = time.perf_counter()
+        match = None
+        if self.templates is not None:
+            match = await self.templates.alookup(query)
+            if match.template is not None:
+                result = await asyncio.to_thread(self._run_template, match)
+                if result:
+                    self.templates.observe_hit(match, time.perf_counter() - started)
+                    return self._format_result(match.template.sql, result, match.parameters)
+
+        response = await self.llm.ainvoke(self._query_messages(query))
+        sql = self._extract_sql(response.text)
+        try:
+            result = await asyncio.to_thread(self.run_query, sql)
+        except Exception as e:
+            print(f"[WARNING] SQL-запрос не выполнен ({e}), используем SQL агента")
+            self.stats["fallbacks"] += 1
+            return await self.aask(query)
+        self._on_llm_result(match, sql, result, started)
+        return self._format_result(sql, result)
 
     def ask(self, query: str) -> str:
         """Обрабатывает запрос пользователя и возвращает ответ от SQL агента."""
         response = self.agent.invoke({"messages": [{"role": "user", "content": query}]})
 
-        return response["messages"][-1].content
\ No newline at end of file
+        return response["messages"][-1].content
+
+    async def aask(self, query: str) -> str:
+        """Асинхронная версия ask, не блокирующая event loop."""
+        response = await self.agent.ainvoke(
+            {"messages": [{"role": "user", "content": query}]}
+        )
+        return response["messages"][-1].content
+
+    def metrics(self) -> dict:
+        return {
+            **self.stats,
+            "schema_refreshes": self.schema.refreshes,
+            "query_cache": self.query_cache.metrics(),
+            "templates": self.templates.metrics() if self.templates else None,
+        }
@@ -0,0 +1,121 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+# Строковые литералы и идентификаторы в кавычках не нормализуются
+_QUOTED = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")")
+_COMMENTS = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+_READ_ONLY = re.compile(r"^\s*(select|with)\b", re.IGNORECASE)
+_WRITE = re.compile(
+    r"\b(insert|update|delete|drop|create|alter|attach|detach|pragma|vacuum|reindex)\b",
+    re.IGNORECASE,
+)
+
+
+def normalize_sql(sql: str) -> str:
+    """Нормализует SQL для ключа кэша: без комментариев, лишних пробелов,
+    завершающей ';', ключевые слова и имена - в нижнем регистре."""
+    parts = _QUOTED.split(sql.strip())
+    for i in range(0, len(parts), 2):
+        text = _COMMENTS.sub(" ", parts[i])
+        parts[i] = re.sub(r"\s+", " ", text).lower()
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+def is_read_only(sql: str) -> bool:
+    """True для одиночного SELECT / WITH без изменяющих данные операторов."""
+    normalized = normalize_sql(sql)
+    # Проверяем только текст вне кавычек: "delete" в строковом литерале допустим
+    code = " ".join(_QUOTED.split(normalized)[::2])
+    return bool(_READ_ONLY.match(code)) and ";" not in code and not _WRITE.search(code)
+
+
+def file_version(path: str) -> tuple:
+    """Версия файла БД: меняется при любой записи в файл."""
+    try:
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+    except OSError:
+        return None, None
+
+
+class SchemaCache:
+    """Описание схемы БД (таблицы, колонки, примеры строк) для промпта.
+
+    Строится один раз и пересобирается, только если изменился файл БД.
+    """
+
+    def __init__(self, db_path: str, build: Callable[[], str]):
+        self.db_path = db_path
+        self._build = build
+        self._lock = threading.Lock()
+        self._version: Optional[tuple] = None
+        self._text = ""
+        self.refreshes = 0
+
+    @property
+    def version(self) -> Optional[tuple]:
+        """Версия БД, для которой построено текущее описание схемы."""
+        return self._version
+
+    def get(self) -> str:
+        version = file_version(self.db_path)
+        if version == self._version:
+            return self._text
+        with self._lock:
+            if version != self._version:
+                self._text = self._build()
+                self._version = version
+                self.refreshes += 1
+                if self.refreshes > 1:
+                    print(f"[INFO] Схема {self.db_path} изменилась, описание для промпта обновлено")
+        return self._text
+
+
+class QueryCache:
+    """LRU-кэш результатов read-only SQL по (нормализованный SQL, параметры, версия БД)."""
+
+    def __init__(self, max_size: int = 1000):
+        self.max_size = max_size
+        self._entries: OrderedDict[tuple, str] = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    @staticmethod
+    def _key(sql: str, version: tuple, parameters: Optional[dict]) -> tuple:
+        return normalize_sql(sql), tuple(sorted((parameters or {}).items())), version
+
+    def get(self, sql: str, version: tuple, parameters: Optional[dict] = None) -> Optional[str]:
+        key = self._key(sql, version, parameters)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return self._entries[key]
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, sql: str, version: tuple, result: str, parameters: Optional[dict] = None):
+        if self.max_size <= 0:
+            return
+        key = self._key(sql, version, parameters)
+        with self._lock:
+            # Результаты для прошлой версии БД больше не понадобятся
+            stale = [old for old in self._entries if old[2] != version]
+            for old in stale:
+                del self._entries[old]
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "size": len(self._entries),
+                "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+            }
@@ -0,0 +1,265 @@
+import re
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from typing import Optional
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src.utils.utils import unit_vector
+from .cache import file_version, is_read_only
+
+_LITERAL = re.compile(r"'((?:[^']|'')*)'")
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)?")
+
+
+class EntityIndex:
+    """Словарь значений текстовых колонок БД (имена, email, роли...) для
+    поиска сущностей в вопросе. Пересобирается при изменении файла БД."""
+
+    def __init__(self, db_path: str, max_values: int = 10000, max_length: int = 64):
+        self.db_path = db_path
+        self.max_values = max_values
+        self.max_length = max_length
+        self._lock = threading.Lock()
+        self._version: Optional[tuple] = None
+        # casefold значения -> (слот "таблица.колонка", значение как в БД)
+        self._values: dict[str, tuple[str, str]] = {}
+        self._pattern: Optional[re.Pattern] = None
+
+    def _build(self):
+        values: dict[str, tuple[str, str]] = {}
+        connection = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+        try:
+            tables = [
+                row[0]
+                for row in connection.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+                )
+            ]
+            for table in tables:
+                for _, column, column_type, *_ in connection.execute(f'PRAGMA table_info("{table}")'):
+                    if not any(t in column_type.upper() for t in ("CHAR", "TEXT", "CLOB")):
+                        continue
+                    rows = connection.execute(
+                        f'SELECT DISTINCT "{column}" FROM "{table}" '
+                        f'WHERE length("{column}") BETWEEN 2 AND ? LIMIT ?',
+                        (self.max_length, self.max_values),
+                    )
+                    for (value,) in rows:
+                        values.setdefault(value.casefold(), (f"{table}.{column}", value))
+        finally:
+            connection.close()
+        self._values = values
+        # Длинные значения первыми: "Jane Doe" раньше, чем "Jane"
+        ordered = sorted(values, key=len, reverse=True)
+        self._pattern = (
+            re.compile(r"(?<!\w)(" + "|".join(map(re.escape, ordered)) + r")(?!\w)", re.IGNORECASE)
+            if ordered
+            else None
+        )
+
+    def _refresh(self):
+        version = file_version(self.db_path)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._build()
+                    self._version = version
+
+    def extract(self, question: str) -> tuple[str, list[tuple[str, str]]]:
+        """Заменяет найденные значения на {слот}: возвращает (шаблон вопроса, [(слот, значение)])."""
+        self._refresh()
+        entities: list[tuple[str, str]] = []
+        if self._pattern is None:
+            return question, entities
+
+        def mask(match: re.Match) -> str:
+            slot, value = self._values[match.group(0).casefold()]
+            entities.append((slot, value))
+            return "{" + slot + "}"
+
+        return self._pattern.sub(mask, question), entities
+
+
+@dataclass
+class SQLTemplate:
+    pattern: str
+    slots: tuple[str, ...]
+    sql: str
+    # Имя параметра SQL -> номер сущности в вопросе
+    params: dict[str, int]
+    vector: Optional[np.ndarray] = None
+    hits: int = 0
+
+
+@dataclass
+class TemplateMatch:
+    """Результат разбора вопроса: шаблон вопроса, сущности и, при попадании, SQL с параметрами."""
+
+    pattern: str
+    entities: list[tuple[str, str]]
+    vector: Optional[np.ndarray] = None
+    template: Optional[SQLTemplate] = None
+    parameters: dict = field(default_factory=dict)
+
+
+class TemplateCache:
+    """Кэш шаблонов Text-to-SQL: (шаблон вопроса -> параметризованный SQL).
+
+    Из вопроса извлекаются сущности (значения из БД) и заменяются слотами.
+    Новый вопрос с теми же слотами и числами, шаблон которого совпадает или
+    близок по эмбеддингу (порог similarity_threshold), выполняется без LLM:
+    в сохранённый SQL подставляются новые значения как параметры запроса.
+    По близости ищутся только шаблоны хотя бы с одним слотом: вопрос без
+    сущностей («самый старший сотрудник») должен совпасть точно, иначе
+    близкий по вектору «самый младший» получил бы чужой SQL.
+    Шаблон записывается только после успешного запроса, литералы которого
+    однозначно сопоставлены сущностям вопроса.
+    """
+
+    def __init__(
+        self,
+        entity_index: EntityIndex,
+        embeddings: Optional[Embeddings] = None,
+        similarity_threshold: float = 0.95,
+        max_size: int = 500,
+    ):
+        self.entity_index = entity_index
+        self.embeddings = embeddings
+        self.similarity_threshold = similarity_threshold
+        self.max_size = max_size
+        self._templates: OrderedDict[str, SQLTemplate] = OrderedDict()
+        self._lock = threading.Lock()
+        # Экспоненциальное среднее времени ответа через LLM - для оценки сэкономленного времени
+        self._llm_seconds: Optional[float] = None
+        self.stats = {"hits": 0, "misses": 0, "validation_failures": 0, "recorded": 0, "saved_seconds": 0.0}
+
+    @staticmethod
+    def _key(pattern: str) -> str:
+        return re.sub(r"\s+", " ", pattern.strip().lower()).rstrip("?!. ")
+
+    def _candidates(self, pattern: str, slots: tuple[str, ...]) -> list[SQLTemplate]:
+        # Числа не параметризуются, поэтому должны совпадать ("старше 5 лет" != "старше 10 лет")
+        numbers = _NUMBER.findall(pattern)
+        with self._lock:
+            return [
+                t
+                for t in self._templates.values()
+                if slots and t.slots == slots and t.vector is not None and _NUMBER.findall(t.pattern) == numbers
+            ]
+
+    def _exact(self, match: TemplateMatch) -> bool:
+        with self._lock:
+            template = self._templates.get(self._key(match.pattern))
+        if template is None or template.slots != tuple(slot for slot, _ in match.entities):
+            return False
+        match.template = template
+        return True
+
+    def _semantic(self, match: TemplateMatch):
+        candidates = self._candidates(match.pattern, tuple(slot for slot, _ in match.entities))
+        if candidates and match.vector is not None:
+            scores = np.stack([t.vector for t in candidates]) @ match.vector
+            best = int(np.argmax(scores))
+            if scores[best] >= self.similarity_threshold:
+                match.template = candidates[best]
+
+    def _finish(self, match: TemplateMatch) -> TemplateMatch:
+        if match.template is None:
+            self.stats["misses"] += 1
+            return match
+        match.parameters = {name: match.entities[i][1] for name, i in match.template.params.items()}
+        return match
+
+    def lookup(self, question: str) -> TemplateMatch:
+        pattern, entities = self.entity_index.extract(question)
+        match = TemplateMatch(pattern=pattern, entities=entities)
+        if not self._exact(match) and entities and self.embeddings is not None:
+            match.vector = unit_vector(self.embeddings.embed_query(self._key(pattern)))
+            self._semantic(match)
+        return self._finish(match)
+
+    async def alookup(self, question: str) -> TemplateMatch:
+        pattern, entities = self.entity_index.extract(question)
+        match = TemplateMatch(pattern=pattern, entities=entities)
+        if not self._exact(match) and entities and self.embeddings is not None:
+            match.vector = unit_vector(await self.embeddings.aembed_query(self._key(pattern)))
+            self._semantic(match)
+        return self._finish(match)
+
+    def parameterize(self, match: TemplateMatch, sql: str) -> Optional[tuple[str, dict[str, int]]]:
+        """Заменяет литералы-сущности в SQL на параметры. None, если SQL нельзя
+        обобщить: литерал лишь содержит сущность (LIKE '%Alice%', 'Alice Doe')
+        или сущность вопроса не встречается в запросе."""
+        params: dict[str, int] = {}
+        values = [value.casefold() for _, value in match.entities]
+        failed = False
+
+        def replace(literal: re.Match) -> str:
+            nonlocal failed
+            text = literal.group(1).replace("''", "'").casefold()
+            if text in values:
+                index = values.index(text)
+                params[f"p{index}"] = index
+                return f":p{index}"
+            if any(value in text for value in values):
+                failed = True
+            return literal.group(0)
+
+        template_sql = _LITERAL.sub(replace, sql)
+        if failed or {values[i] for i in params.values()} != set(values):
+            return None
+        return template_sql, params
+
+    def record(self, match: TemplateMatch, sql: str) -> bool:
+        """Сохраняет шаблон после успешного запроса, построенного LLM."""
+        if self.max_size <= 0 or not is_read_only(sql) or (self.embeddings is not None and match.entities and match.vector is None):
+            return False
+        parameterized = self.parameterize(match, sql)
+        if parameterized is None:
+            return False
+        template_sql, params = parameterized
+        key = self._key(match.pattern)
+        with self._lock:
+            self._templates[key] = SQLTemplate(
+                pattern=match.pattern,
+                slots=tuple(slot for slot, _ in match.entities),
+                sql=template_sql,
+                params=params,
+                vector=match.vector,
+            )
+            self._templates.move_to_end(key)
+            while len(self._templates) > self.max_size:
+                self._templates.popitem(last=False)
+            self.stats["recorded"] += 1
+        return True
+
+    def discard(self, match: TemplateMatch):
+        """Шаблон не прошёл проверку (ошибка или пустой результат) - удаляем его."""
+        self.stats["validation_failures"] += 1
+        with self._lock:
+            self._templates.pop(self._key(match.template.pattern), None)
+
+    def observe_llm(self, seconds: float, alpha: float = 0.3):
+        self._llm_seconds = seconds if self._llm_seconds is None else alpha * seconds + (1 - alpha) * self._llm_seconds
+
+    def observe_hit(self, match: TemplateMatch, seconds: float):
+        match.template.hits += 1
+        self.stats["hits"] += 1
+        if self._llm_seconds is not None:
+            self.stats["saved_seconds"] += max(0.0, self._llm_seconds - seconds)
+
+    def metrics(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"] + self.stats["validation_failures"]
+        hits = self.stats["hits"]
+        return {
+            **{k: v for k, v in self.stats.items() if k != "saved_seconds"},
+            "templates": len(self._templates),
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "saved_ms_total": round(self.stats["saved_seconds"] * 1000, 1),
+            "saved_ms_per_hit": round(self.stats["saved_seconds"] * 1000 / hits, 1) if hits else 0.0,
+            "llm_path_ms": round(self._llm_seconds * 1000, 1) if self._llm_seconds is not None else None,
+        }
@@ -0,0 +1,135 @@
+"""Хранилище корпуса документации: SQLite-таблица страниц с ключом URL.
+
+Crawler добавляет и обновляет страницы по одной (каждая запись - отдельная
+транзакция), поэтому сбой посреди обхода не портит уже сохранённые данные.
+Чтение - потоковое, пачками, без загрузки всего корпуса в память.
+
+Перенос старого data.json: python -m src.utils.corpus migrate [--source data/data.json] [--target data/corpus.db]
+"""
+import os
+import json
+import time
+import sqlite3
+import argparse
+from contextlib import closing
+from typing import Iterable, Iterator, Optional
+
+from src.config import settings
+from src.utils.utils import hash_content
+
+# Лимит параметров запроса в старых сборках SQLite - 999
+_URLS_PER_QUERY = 500
+
+
+class CorpusStore:
+    """Страницы документации: url -> (заголовок, содержимое, хэш содержимого)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS pages (
+                    url TEXT PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def upsert(self, pages: dict[str, dict]) -> int:
+        """Добавляет или обновляет страницы одной транзакцией. Возвращает число изменённых."""
+        rows = [
+            (url, page.get("title", "Без заголовка"), page.get("content", ""), hash_content(page.get("content", "")))
+            for url, page in pages.items()
+        ]
+        now = time.time()
+        with closing(self._connect()) as connection, connection:
+            before = connection.total_changes
+            # Неизменившаяся страница не перезаписывается - mtime файла и манифест индекса остаются прежними
+            connection.executemany(
+                """
+                INSERT INTO pages (url, title, content, content_hash, updated_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    title = excluded.title,
+                    content = excluded.content,
+                    content_hash = excluded.content_hash,
+                    updated_at = excluded.updated_at
+                WHERE pages.content_hash != excluded.content_hash OR pages.title != excluded.title
+                """,
+                [(*row, now) for row in rows],
+            )
+            return connection.total_changes - before
+
+    def delete(self, urls: Iterable[str]) -> int:
+        urls = list(urls)
+        if not urls:
+            return 0
+        with closing(self._connect()) as connection, connection:
+            before = connection.total_changes
+            connection.executemany("DELETE FROM pages WHERE url = ?", [(url,) for url in urls])
+            return connection.total_changes - before
+
+    def count(self) -> int:
+        with closing(self._connect()) as connection:
+            return connection.execute("SELECT count(*) FROM pages").fetchone()[0]
+
+    def hashes(self) -> dict[str, str]:
+        """url -> хэш содержимого (само содержимое не читается)."""
+        with closing(self._connect()) as connection:
+            return dict(connection.execute("SELECT url, content_hash FROM pages"))
+
+    def iter_pages(self, batch_size: int = 256, urls: Optional[set[str]] = None) -> Iterator[tuple[str, str, str]]:
+        """Потоково отдаёт (url, title, content); urls ограничивает выборку.
+
+        С urls читаются только нужные строки: запросы WHERE url IN (...) по
+        _URLS_PER_QUERY адресов, остальные страницы с диска не поднимаются.
+        """
+        with closing(self._connect()) as connection:
+            if urls is None:
+                cursor = connection.execute("SELECT url, title, content FROM pages ORDER BY url")
+                while rows := cursor.fetchmany(batch_size):
+                    yield from rows
+                return
+            selected = sorted(urls)
+            for start in range(0, len(selected), _URLS_PER_QUERY):
+                chunk = selected[start:start + _URLS_PER_QUERY]
+                cursor = connection.execute(
+                    f"SELECT url, title, content FROM pages WHERE url IN ({', '.join('?' * len(chunk))}) ORDER BY url",
+                    chunk,
+                )
+                while rows := cursor.fetchmany(batch_size):
+                    yield from rows
+
+    def migrate_json(self, json_path: str) -> int:
+        """Переносит страницы из data.json (формат {url: {title, content}})."""
+        with open(json_path, "r", encoding="utf-8") as fp:
+            data = json.load(fp)
+        changed = self.upsert(data)
+        print(f"[INFO] Перенесено {len(data)} страниц из {json_path} в {self.path} (изменено {changed})")
+        return changed
+
+
+def open_corpus(path: Optional[str] = None, legacy_path: Optional[str] = None) -> CorpusStore:
+    """Открывает хранилище корпуса; пустое хранилище заполняется из data.json, если он есть."""
+    store = CorpusStore(path or settings.CORPUS_PATH)
+    legacy_path = legacy_path or settings.DATA_PATH
+    if legacy_path and os.path.exists(legacy_path) and store.count() == 0:
+        store.migrate_json(legacy_path)
+    return store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Хранилище корпуса документации")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    migrate = subparsers.add_parser("migrate", help="Перенести data.json в хранилище")
+    migrate.add_argument("--source", default=settings.DATA_PATH)
+    migrate.add_argument("--target", default=settings.CORPUS_PATH)
+    args = parser.parse_args()
+    CorpusStore(args.target).migrate_json(args.source)
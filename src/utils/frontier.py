@@ -0,0 +1,200 @@
+import os
+import json
+import time
+import asyncio
+from typing import Optional
+from contextlib import asynccontextmanager
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+# Параметры запроса, не влияющие на содержимое страницы
+IGNORED_PARAMS = {"fbclid", "gclid", "yclid"}
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url: str, base: Optional[str] = None) -> Optional[str]:
+    """Приводит URL к каноническому виду для дедупликации: абсолютный адрес,
+    схема и хост в нижнем регистре, без порта по умолчанию, фрагмента,
+    завершающего слэша, utm- и прочих служебных параметров; параметры
+    отсортированы. None для не-http ссылок (mailto:, javascript: и т.п.)."""
+    url = urljoin(base, url.strip()) if base else url.strip()
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return None
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return None
+
+    netloc = parts.hostname.lower()
+    if port and port != DEFAULT_PORTS[scheme]:
+        netloc = f"{netloc}:{port}"
+    path = parts.path or "/"
+    while "//" in path:
+        path = path.replace("//", "/")
+    if len(path) > 1:
+        path = path.rstrip("/")
+    params = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in IGNORED_PARAMS
+    )
+    return urlunsplit((scheme, netloc, path, urlencode(params), ""))
+
+
+class Frontier:
+    """Очередь URL для обхода пулом воркеров.
+
+    URL нормализуются и дедуплицируются до постановки в очередь. Число
+    одновременных запросов к одному хосту ограничено per_host, между
+    запросами к хосту выдерживается host_delay. Состояние (обработанные и
+    ожидающие URL) сохраняется в state_path, чтобы прерванный обход можно
+    было продолжить.
+    """
+
+    def __init__(
+        self,
+        start_url: str,
+        max_depth: int,
+        allowed_hosts: Optional[set[str]] = None,
+        per_host: int = 5,
+        host_delay: float = 0.0,
+        state_path: Optional[str] = None,
+    ):
+        self.start_url = normalize_url(start_url)
+        self.max_depth = max_depth
+        self.allowed_hosts = allowed_hosts or {urlsplit(self.start_url).netloc}
+        self.per_host = max(1, per_host)
+        self.host_delay = host_delay
+        self.state_path = state_path
+        self.queue: asyncio.Queue = asyncio.Queue()
+        # Все URL, когда-либо поставленные в очередь: url -> глубина
+        self.seen: dict[str, int] = {}
+        self.done: set[str] = set()
+        self._host_slots: dict[str, asyncio.Semaphore] = {}
+        self._host_locks: dict[str, asyncio.Lock] = {}
+        self._last_request: dict[str, float] = {}
+
+    def add(self, url: str, depth: int, base: Optional[str] = None) -> bool:
+        """Ставит URL в очередь, если он новый, в пределах глубины и разрешённых хостов."""
+        url = normalize_url(url, base)
+        if url is None or depth > self.max_depth or url in self.seen:
+            return False
+        if urlsplit(url).netloc not in self.allowed_hosts:
+            return False
+        self.seen[url] = depth
+        self.queue.put_nowait((url, depth))
+        return True
+
+    async def get(self) -> tuple[str, int]:
+        return await self.queue.get()
+
+    def task_done(self, url: str, completed: bool = True):
+        """Отмечает URL обработанным; при completed=False он останется в сохранённой очереди."""
+        if completed:
+            self.done.add(url)
+        self.queue.task_done()
+
+    @property
+    def depth(self) -> int:
+        """Число URL, ожидающих обработки."""
+        return self.queue.qsize()
+
+    @asynccontextmanager
+    async def slot(self, url: str):
+        """Ограничение нагрузки на хост: не больше per_host запросов и пауза host_delay."""
+        host = urlsplit(url).netloc
+        semaphore = self._host_slots.setdefault(host, asyncio.Semaphore(self.per_host))
+        async with semaphore:
+            if self.host_delay > 0:
+                async with self._host_locks.setdefault(host, asyncio.Lock()):
+                    wait = self._last_request.get(host, 0.0) + self.host_delay - time.monotonic()
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                    self._last_request[host] = time.monotonic()
+            yield
+
+    def save(self):
+        """Атомарно сохраняет состояние обхода в state_path."""
+        if not self.state_path:
+            return
+        pending = [[url, depth] for url, depth in self.seen.items() if url not in self.done]
+        state = {
+            "start_url": self.start_url,
+            "max_depth": self.max_depth,
+            "done": sorted(self.done),
+            "pending": pending,
+        }
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fp:
+            json.dump(state, fp, ensure_ascii=False)
+        os.replace(tmp_path, self.state_path)
+
+    def load(self) -> bool:
+        """Восстанавливает незавершённый обход того же ресурса. False, если продолжать нечего."""
+        if not self.state_path or not os.path.exists(self.state_path):
+            return False
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as fp:
+                state = json.load(fp)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"[WARNING] Не удалось прочитать состояние обхода {self.state_path}: {e}")
+            return False
+        if state.get("start_url") != self.start_url or state.get("max_depth") != self.max_depth:
+            return False
+
+        self.done = set(state["done"])
+        self.seen = {url: 0 for url in self.done}
+        for url, depth in state["pending"]:
+            self.seen[url] = depth
+            self.queue.put_nowait((url, depth))
+        return bool(state["pending"])
+
+    def clear(self):
+        """Удаляет сохранённое состояние после завершённого обхода."""
+        if self.state_path and os.path.exists(self.state_path):
+            os.remove(self.state_path)
+
+
+class CrawlProgress:
+    """Скорость обхода (страниц/с) и глубина очереди для настройки параллельности."""
+
+    def __init__(self, frontier: Frontier):
+        self.frontier = frontier
+        self.started = time.perf_counter()
+        self.pages = 0
+        self.skipped = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.max_queue_depth = 0
+
+    def observe(self):
+        self.max_queue_depth = max(self.max_queue_depth, self.frontier.depth)
+
+    def snapshot(self) -> dict:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "pages": self.pages,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "pages_per_second": round(self.pages / elapsed, 2) if elapsed else 0.0,
+            "queue_depth": self.frontier.depth,
+            "max_queue_depth": self.max_queue_depth,
+            "in_flight": self.in_flight,
+            "seconds": round(elapsed, 1),
+        }
+
+    def report(self, prefix: str = "Обход"):
+        s = self.snapshot()
+        print(
+            f"[INFO] {prefix}: {s['pages']} страниц ({s['pages_per_second']} стр/с), без изменений {s['skipped']}, "
+            f"в очереди {s['queue_depth']} (макс. {s['max_queue_depth']}), "
+            f"в работе {s['in_flight']}, ошибок {s['errors']}, {s['seconds']} c"
+        )
+
+    async def run(self, interval: float):
+        """Периодический отчёт, пока задача не отменена."""
+        while True:
+            await asyncio.sleep(interval)
+            self.report()
@@ -1,11 +1,33 @@
 from abc import ABC, abstractmethod
+from typing import Optional
+
 from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_core.embeddings import Embeddings
 
+from src.config import settings
+
 
 class BaseLLMProvider(ABC):
     """Базовый интерфейс для всех LLM-провайдеров"""
 
+    # Известные размерности эмбеддинг-моделей провайдера: {модель: размерность}
+    embedding_dimensions: dict[str, int] = {}
+    # False - провайдер сам оборачивает модели лимитером (например, маршрутизатор бэкендов)
+    guarded: bool = True
+
+    def __init__(
+        self,
+        chat_model: Optional[str] = None,
+        embedding_model: Optional[str] = None,
+        base_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+    ):
+        # По умолчанию - модели и ключ из настроек
+        self.chat_model = chat_model or settings.LLM_MODEL
+        self.embedding_model = embedding_model or settings.EMBEDDING_MODEL
+        self.base_url = base_url
+        self.api_key = api_key or settings.API_KEY
+
     @abstractmethod
     def create_chat(self) -> BaseChatModel:
         """Создает чат-модель"""
@@ -0,0 +1,147 @@
+import re
+import json
+import hashlib
+import threading
+from pathlib import Path
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class EmbeddingStore:
+    """Дисковое хранилище векторов одной эмбеддинг-модели.
+
+    vectors.f32 - подряд записанные float32-векторы фиксированной размерности,
+    keys.txt - хэши текстов, номер строки = номер вектора, meta.json - размерность.
+    Оба файла только дописываются; после падения лишний хвост отбрасывается.
+    Рассчитано на одного пишущего процесса (потоки внутри процесса - безопасно).
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.vectors_path = directory / "vectors.f32"
+        self.keys_path = directory / "keys.txt"
+        self.meta_path = directory / "meta.json"
+        self.dim = None
+        self._rows: dict[str, int] = {}
+        self._mmap = None
+        self._new: dict[int, np.ndarray] = {}  # векторы, дописанные после открытия
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not self.meta_path.exists():
+            return
+        with open(self.meta_path, "r", encoding="utf-8") as f:
+            self.dim = json.load(f)["dim"]
+        keys = []
+        if self.keys_path.exists():
+            with open(self.keys_path, "r", encoding="utf-8") as f:
+                keys = f.read().split()
+        stored = self.vectors_path.stat().st_size // (4 * self.dim) if self.vectors_path.exists() else 0
+        count = min(len(keys), stored)
+        self._rows = {key: row for row, key in enumerate(keys[:count])}
+        if count:
+            self._mmap = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(count, self.dim))
+        # Отрезаем недописанный хвост, чтобы номера строк совпадали с векторами
+        if len(keys) != count:
+            with open(self.keys_path, "w", encoding="utf-8") as f:
+                f.writelines(f"{key}\n" for key in keys[:count])
+        if stored != count:
+            with open(self.vectors_path, "r+b") as f:
+                f.truncate(count * 4 * self.dim)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get(self, key: str):
+        row = self._rows.get(key)
+        if row is None:
+            return None
+        if row in self._new:
+            return self._new[row]
+        return self._mmap[row]
+
+    def put_many(self, items: list[tuple[str, list[float]]]):
+        if not items:
+            return
+        with self._lock:
+            items = [(key, vector) for key, vector in items if key not in self._rows]
+            if not items:
+                return
+            if self.dim is None:
+                self.dim = len(items[0][1])
+                with open(self.meta_path, "w", encoding="utf-8") as f:
+                    json.dump({"dim": self.dim}, f)
+            array = np.asarray([vector for _, vector in items], dtype=np.float32)
+            # Сначала векторы, потом ключи: ключ без вектора при загрузке отбрасывается
+            with open(self.vectors_path, "ab") as f:
+                f.write(array.tobytes())
+            with open(self.keys_path, "a", encoding="utf-8") as f:
+                f.writelines(f"{key}\n" for key, _ in items)
+            start = len(self._rows)
+            for offset, (key, _) in enumerate(items):
+                # _new заполняется раньше _rows: читатели get() работают без блокировки
+                self._new[start + offset] = array[offset]
+                self._rows[key] = start + offset
+
+
+class CachedEmbeddings(Embeddings):
+    """Обёртка над эмбеддинг-моделью с постоянным кэшем по (модель, хэш текста).
+
+    Повторная векторизация того же текста той же моделью не обращается к API:
+    ни при переиндексации, ни при смене коллекции, ни для повторных запросов.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str, cache_dir: str):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.store = EmbeddingStore(Path(cache_dir) / safe_name)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(text: str, kind: str) -> str:
+        # Документы и запросы хранятся раздельно: часть моделей векторизует их по-разному
+        return hashlib.sha1(f"{kind}\0{text}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, texts: list[str], kind: str):
+        keys = [self._key(text, kind) for text in texts]
+        vectors = [self.store.get(key) for key in keys]
+        missing = {}
+        for key, text, vector in zip(keys, texts, vectors):
+            if vector is None:
+                missing.setdefault(key, text)
+        self.hits += len(texts) - sum(vector is None for vector in vectors)
+        self.misses += len(missing)
+        return keys, vectors, missing
+
+    def _merge(self, keys, vectors, missing, computed) -> list[list[float]]:
+        new = dict(zip(missing.keys(), computed))
+        self.store.put_many(list(new.items()))
+        return [
+            vector.tolist() if vector is not None else list(new[key])
+            for key, vector in zip(keys, vectors)
+        ]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys, vectors, missing = self._lookup(texts, "doc")
+        computed = self.embeddings.embed_documents(list(missing.values())) if missing else []
+        return self._merge(keys, vectors, missing, computed)
+
+    def embed_query(self, text: str) -> list[float]:
+        keys, vectors, missing = self._lookup([text], "query")
+        computed = [self.embeddings.embed_query(text)] if missing else []
+        return self._merge(keys, vectors, missing, computed)[0]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys, vectors, missing = self._lookup(texts, "doc")
+        computed = await self.embeddings.aembed_documents(list(missing.values())) if missing else []
+        return self._merge(keys, vectors, missing, computed)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        keys, vectors, missing = self._lookup([text], "query")
+        computed = [await self.embeddings.aembed_query(text)] if missing else []
+        return self._merge(keys, vectors, missing, computed)[0]
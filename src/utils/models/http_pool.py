@@ -0,0 +1,96 @@
+import threading
+import importlib.util
+
+import httpx
+
+
+class HTTPPool:
+    """Общий пул HTTP-соединений процесса для всех клиентов LLM-провайдеров.
+
+    Клиенты (свои base_url и заголовки у каждого провайдера) используют один
+    транспорт, поэтому keep-alive соединения и TLS-сессии переиспользуются
+    между чат- и эмбеддинг-моделями и между агентами. HTTP/2 включается, если
+    установлен пакет h2. Через trace-расширение httpcore считаются новые
+    соединения и TLS-рукопожатия - по ним видна доля переиспользования.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 60.0,
+        http2: bool = True,
+        timeout: float = 120.0,
+    ):
+        self.http2 = http2 and importlib.util.find_spec("h2") is not None
+        if http2 and not self.http2:
+            print("[WARNING] Пакет h2 не установлен, HTTP/2 отключён (pip install h2)")
+        self.timeout = timeout
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.transport = httpx.HTTPTransport(http2=self.http2, limits=limits)
+        self.async_transport = httpx.AsyncHTTPTransport(http2=self.http2, limits=limits)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "connections": 0, "tls_handshakes": 0, "http2_responses": 0}
+
+    def _count(self, event: str):
+        key = {
+            "connection.connect_tcp.complete": "connections",
+            "connection.start_tls.complete": "tls_handshakes",
+        }.get(event)
+        if key:
+            with self._lock:
+                self.stats[key] += 1
+
+    def _on_response(self, response: httpx.Response):
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["http2_responses"] += response.http_version == "HTTP/2"
+
+    def _trace(self, event: str, info: dict):
+        self._count(event)
+
+    async def _atrace(self, event: str, info: dict):
+        self._count(event)
+
+    def _request_hook(self, request: httpx.Request):
+        request.extensions["trace"] = self._trace
+
+    async def _arequest_hook(self, request: httpx.Request):
+        request.extensions["trace"] = self._atrace
+
+    async def _aresponse_hook(self, response: httpx.Response):
+        self._on_response(response)
+
+    def client_kwargs(self) -> dict:
+        """Параметры httpx.Client (для провайдеров, создающих клиент сами, например Ollama)."""
+        return {
+            "transport": self.transport,
+            "event_hooks": {"request": [self._request_hook], "response": [self._on_response]},
+        }
+
+    def async_client_kwargs(self) -> dict:
+        return {
+            "transport": self.async_transport,
+            "event_hooks": {"request": [self._arequest_hook], "response": [self._aresponse_hook]},
+        }
+
+    def client(self, **kwargs) -> httpx.Client:
+        kwargs.setdefault("timeout", self.timeout)
+        return httpx.Client(**self.client_kwargs(), **kwargs)
+
+    def async_client(self, **kwargs) -> httpx.AsyncClient:
+        kwargs.setdefault("timeout", self.timeout)
+        return httpx.AsyncClient(**self.async_client_kwargs(), **kwargs)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        requests = stats["requests"]
+        stats["http2"] = self.http2
+        # Доля запросов, отправленных по уже открытому соединению
+        stats["connection_reuse"] = round(1 - stats["connections"] / requests, 3) if requests else 0.0
+        return stats
@@ -1,13 +1,45 @@
+import os
+import json
+import threading
+from pathlib import Path
+from typing import Optional
+
 from langchain_mistralai import ChatMistralAI, MistralAIEmbeddings
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain_ollama import ChatOllama, OllamaEmbeddings
 from src.config import settings
 from .base import BaseLLMProvider
+from .embedding_cache import CachedEmbeddings
+from .http_pool import HTTPPool
+from .resilience import CircuitBreaker, GuardedChatModel, GuardedEmbeddings, ProviderGuard
+from .routing import Backend, Balancer, RoutingChatModel, RoutingEmbeddings
 
 from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_core.embeddings import Embeddings
 
 _PROVIDERS: dict[str, BaseLLMProvider] = {}
+# Один ProviderGuard на провайдера: лимиты общие для всех его чат- и эмбеддинг-моделей
+_GUARDS: dict[str, ProviderGuard] = {}
+# Общие экземпляры моделей: (тип, провайдер, модель) -> модель
+_MODELS: dict[tuple, object] = {}
+_MODELS_LOCK = threading.Lock()
+_HTTP_POOL: Optional[HTTPPool] = None
+# Балансировщики провайдера "router": "chat" / "embedding" -> Balancer
+_BALANCERS: dict[str, Balancer] = {}
+
+
+def get_http_pool() -> HTTPPool:
+    """Общий для процесса пул HTTP-соединений к провайдерам"""
+    global _HTTP_POOL
+    if _HTTP_POOL is None:
+        _HTTP_POOL = HTTPPool(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+            http2=settings.HTTP2,
+            timeout=settings.HTTP_TIMEOUT,
+        )
+    return _HTTP_POOL
 
 
 def register_provider(name: str):
@@ -22,37 +54,83 @@ def register_provider(name: str):
 
 @register_provider("mistral")
 class MistralProvider(BaseLLMProvider):
+    embedding_dimensions = {"mistral-embed": 1024}
+
+    def _clients(self) -> dict:
+        # Те же base_url и заголовки, что ставит langchain_mistralai, но на общем пуле соединений
+        pool = get_http_pool()
+        options = {
+            "base_url": self.base_url or os.environ.get("MISTRAL_BASE_URL") or "https://api.mistral.ai/v1",
+            "headers": {
+                "Content-Type": "application/json",
+                "Accept": "application/json",
+                "Authorization": f"Bearer {self.api_key}",
+            },
+        }
+        return {"client": pool.client(**options), "async_client": pool.async_client(**options)}
+
     def create_chat(self) -> BaseChatModel:
-        return ChatMistralAI(model=settings.LLM_MODEL, api_key=settings.API_KEY)
+        return ChatMistralAI(model=self.chat_model, api_key=self.api_key, **self._clients())
 
     def create_embedding(self) -> Embeddings:
         return MistralAIEmbeddings(
-            model=settings.EMBEDDING_MODEL, api_key=settings.API_KEY
+            model=self.embedding_model, api_key=self.api_key, **self._clients()
         )
 
 
+def _openai_clients() -> dict:
+    pool = get_http_pool()
+    return {"http_client": pool.client(), "http_async_client": pool.async_client()}
+
+
 @register_provider("openai")
 class OpenAIProvider(BaseLLMProvider):
+    embedding_dimensions = {
+        "text-embedding-3-small": 1536,
+        "text-embedding-3-large": 3072,
+        "text-embedding-ada-002": 1536,
+    }
+
     def create_chat(self) -> BaseChatModel:
-        return ChatOpenAI(model=settings.LLM_MODEL, api_key=settings.API_KEY)
+        return ChatOpenAI(
+            model=self.chat_model, api_key=self.api_key, base_url=self.base_url, **_openai_clients()
+        )
 
     def create_embedding(self) -> Embeddings:
         return OpenAIEmbeddings(
-            model=settings.EMBEDDING_MODEL, api_key=settings.API_KEY
+            model=self.embedding_model, api_key=self.api_key, base_url=self.base_url, **_openai_clients()
         )
 
 
 @register_provider("ollama")
 class OllamaProvider(BaseLLMProvider):
+    embedding_dimensions = {
+        "nomic-embed-text": 768,
+        "mxbai-embed-large": 1024,
+        "bge-m3": 1024,
+        "all-minilm": 384,
+    }
+
+    @staticmethod
+    def _clients() -> dict:
+        # Клиент ollama создаётся внутри модели: передаём ему общий транспорт
+        pool = get_http_pool()
+        return {
+            "sync_client_kwargs": pool.client_kwargs(),
+            "async_client_kwargs": pool.async_client_kwargs(),
+        }
+
     def create_chat(self) -> BaseChatModel:
         return ChatOllama(
-            model=settings.LLM_MODEL,
+            model=self.chat_model,
+            base_url=self.base_url,
             validate_model_on_init=True,
             temperature=0.8,
+            **self._clients(),
         )
 
     def create_embedding(self) -> Embeddings:
-        return OllamaEmbeddings(model=settings.EMBEDDING_MODEL)
+        return OllamaEmbeddings(model=self.embedding_model, base_url=self.base_url, **self._clients())
 
 
 @register_provider("vllm")
@@ -60,10 +138,79 @@ class VLLMProvider(BaseLLMProvider):
     """vLLM использует OpenAI-совместимый API"""
 
     def create_chat(self) -> BaseChatModel:
-        return ChatOpenAI(model=settings.LLM_MODEL)
+        return ChatOpenAI(model=self.chat_model, base_url=self.base_url, **_openai_clients())
 
     def create_embedding(self) -> Embeddings:
-        return OpenAIEmbeddings(model=settings.EMBEDDING_MODEL)
+        return OpenAIEmbeddings(model=self.embedding_model, base_url=self.base_url, **_openai_clients())
+
+
+@register_provider("router")
+class RoutingProvider(BaseLLMProvider):
+    """Балансировка и переключение между несколькими бэкендами из LLM_BACKENDS.
+
+    LLM_BACKENDS - JSON-список, например:
+    [{"mode": "vllm", "model": "qwen2.5-7b", "base_url": "http://gpu:8000/v1", "embedding_model": "bge-m3"},
+     {"mode": "mistral", "model": "mistral-small-latest", "rps": 1}]
+    Чат распределяется по всем бэкендам. Эмбеддинги закреплены за одной моделью
+    (EMBEDDING_MODEL): участвуют только бэкенды с "embedding_model", равной ей,
+    а если таких нет - первый бэкенд. У каждого бэкенда свой лимитер без
+    повторов: при ошибке запрос сразу уходит на следующий бэкенд.
+    """
+
+    guarded = False
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.specs = json.loads(settings.LLM_BACKENDS or "[]")
+        if not self.specs:
+            raise ValueError("LLM_MODE=router: задайте бэкенды в LLM_BACKENDS")
+        for spec in self.specs:
+            if spec.get("mode", "").lower() not in _PROVIDERS or spec["mode"].lower() == "router":
+                raise ValueError(f"LLM_BACKENDS: неизвестный mode в {spec}")
+
+    @property
+    def embedding_dimensions(self) -> dict[str, int]:
+        dimensions = {}
+        for spec in self.specs:
+            dimensions.update(_PROVIDERS[spec["mode"].lower()].embedding_dimensions)
+        return dimensions
+
+    @staticmethod
+    def _name(spec: dict) -> str:
+        return spec.get("name") or f"{spec['mode']}:{spec.get('model') or settings.LLM_MODEL}"
+
+    def _backend(self, spec: dict, create) -> Backend:
+        name = self._name(spec)
+        provider = _PROVIDERS[spec["mode"].lower()](
+            chat_model=spec.get("model"),
+            embedding_model=spec.get("embedding_model"),
+            base_url=spec.get("base_url"),
+            api_key=spec.get("api_key"),
+        )
+        guard = get_guard(
+            f"backend:{name}",
+            requests_per_second=spec.get("rps", settings.LLM_RPS),
+            tokens_per_minute=spec.get("tpm", settings.LLM_TPM),
+            max_retries=0,
+        )
+        return Backend(name, create(provider, guard), guard, cooldown=settings.LLM_BACKEND_COOLDOWN)
+
+    def create_chat(self) -> BaseChatModel:
+        backends = [
+            self._backend(spec, lambda p, g: GuardedChatModel(model=p.create_chat(), guard=g))
+            for spec in self.specs
+        ]
+        _BALANCERS["chat"] = Balancer("router-chat", backends)
+        return RoutingChatModel(balancer=_BALANCERS["chat"])
+
+    def create_embedding(self) -> Embeddings:
+        pinned = [spec for spec in self.specs if spec.get("embedding_model") == settings.EMBEDDING_MODEL]
+        backends = [
+            self._backend(spec, lambda p, g: GuardedEmbeddings(p.create_embedding(), g))
+            for spec in (pinned or self.specs[:1])
+        ]
+        _BALANCERS["embedding"] = Balancer("router-embedding", backends)
+        return RoutingEmbeddings(_BALANCERS["embedding"])
 
 
 def get_provider() -> BaseLLMProvider:
@@ -77,11 +224,128 @@ def get_provider() -> BaseLLMProvider:
     return provider_cls()
 
 
+def get_guard(name: str, **overrides) -> ProviderGuard:
+    """Возвращает общий для провайдера лимитер/автомат (создаётся при первом обращении).
+
+    overrides - параметры ProviderGuard вместо значений из настроек.
+    """
+    name = name.lower()
+    if name not in _GUARDS:
+        options = {
+            "requests_per_second": settings.LLM_RPS,
+            "tokens_per_minute": settings.LLM_TPM,
+            "max_retries": settings.LLM_MAX_RETRIES,
+            **overrides,
+        }
+        _GUARDS[name] = ProviderGuard(
+            name=name,
+            requests_per_second=options["requests_per_second"],
+            tokens_per_minute=options["tokens_per_minute"],
+            max_retries=options["max_retries"],
+            base_delay=settings.LLM_BACKOFF_BASE,
+            max_delay=settings.LLM_BACKOFF_MAX,
+            breaker=CircuitBreaker(
+                failure_threshold=settings.LLM_BREAKER_FAILURES,
+                reset_timeout=settings.LLM_BREAKER_RESET,
+            ),
+        )
+    return _GUARDS[name]
+
+
+def get_provider_metrics() -> dict:
+    """Очередь, ожидание, повторы и состояние автомата по каждому провайдеру"""
+    return {name: guard.metrics() for name, guard in _GUARDS.items()}
+
+
+def get_routing_metrics() -> dict:
+    """Нагрузка, задержка и состояние бэкендов провайдера "router" """
+    return {kind: balancer.metrics() for kind, balancer in _BALANCERS.items()}
+
+
+def get_http_metrics() -> dict:
+    """Переиспользование соединений общего пула и число общих экземпляров моделей"""
+    pool = get_http_pool().metrics() if _HTTP_POOL else None
+    return {"pool": pool, "shared_models": len(_MODELS)}
+
+
+def _shared(key: tuple, factory):
+    with _MODELS_LOCK:
+        if key not in _MODELS:
+            _MODELS[key] = factory()
+        return _MODELS[key]
+
+
+def clear_model_cache():
+    """Сбрасывает общие экземпляры моделей (например, после смены настроек)"""
+    with _MODELS_LOCK:
+        _MODELS.clear()
+
+
 def create_chat_model() -> BaseChatModel:
-    """Создает LLM в зависимости от выбранного провайдера"""
-    return get_provider().create_chat()
+    """Возвращает LLM выбранного провайдера.
+
+    Экземпляр общий для всех агентов процесса (ключ - провайдер и модель) и
+    обёрнут лимитером запросов/токенов, повторами и circuit breaker.
+    """
+    mode = settings.LLM_MODE.lower()
+
+    def factory() -> BaseChatModel:
+        provider = get_provider()
+        model = provider.create_chat()
+        return GuardedChatModel(model=model, guard=get_guard(mode)) if provider.guarded else model
+
+    return _shared(("chat", mode, settings.LLM_MODEL), factory)
 
 
 def create_embedding_model() -> Embeddings:
-    """Создает эмбеддинг модель в зависимости от выбранного провайдера"""
-    return get_provider().create_embedding()
+    """Возвращает эмбеддинг модель выбранного провайдера (общий экземпляр).
+
+    Модель оборачивается лимитером провайдера; если задан EMBEDDING_CACHE_DIR -
+    ещё и постоянным кэшем векторов (попадания в кэш лимит не расходуют).
+    """
+    mode = settings.LLM_MODE.lower()
+
+    def factory() -> Embeddings:
+        provider = get_provider()
+        embeddings = provider.create_embedding()
+        if provider.guarded:
+            embeddings = GuardedEmbeddings(embeddings, get_guard(mode))
+        if settings.EMBEDDING_CACHE_DIR:
+            model_name = f"{settings.LLM_MODE}_{settings.EMBEDDING_MODEL}"
+            embeddings = CachedEmbeddings(embeddings, model_name, settings.EMBEDDING_CACHE_DIR)
+        return embeddings
+
+    return _shared(("embedding", mode, settings.EMBEDDING_MODEL, settings.EMBEDDING_CACHE_DIR), factory)
+
+
+def get_embedding_dimension(embeddings: Embeddings) -> int:
+    """Возвращает размерность эмбеддингов без обращения к API, если это возможно.
+
+    Порядок: EMBEDDING_DIM из окружения -> таблица провайдера -> ранее
+    сохранённый замер (EMBEDDING_DIMS_PATH) -> один замер через embed_query,
+    результат которого сохраняется на диск.
+    """
+    if settings.EMBEDDING_DIM:
+        return settings.EMBEDDING_DIM
+
+    model = settings.EMBEDDING_MODEL
+    declared = get_provider().embedding_dimensions.get(model)
+    if declared:
+        return declared
+
+    key = f"{settings.LLM_MODE.lower()}:{model}"
+    dims_path = Path(settings.EMBEDDING_DIMS_PATH)
+    probed = {}
+    if dims_path.exists():
+        with open(dims_path, "r", encoding="utf-8") as f:
+            probed = json.load(f)
+    if key in probed:
+        return probed[key]
+
+    dimension = len(embeddings.embed_query("test"))
+    probed[key] = dimension
+    dims_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(dims_path, "w", encoding="utf-8") as f:
+        json.dump(probed, f, ensure_ascii=False, indent=2)
+    print(f"[INFO] Размерность эмбеддингов {key}: {dimension} (сохранено в {dims_path})")
+    return dimension
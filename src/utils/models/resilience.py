@@ -0,0 +1,410 @@
+import time
+import random
+import asyncio
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator, AsyncIterator, Optional
+
+from pydantic import ConfigDict
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableBinding
+
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+# Повторы ProviderGuard отключены: вызывающий код повторяет сам (EmbeddingPipeline)
+_RETRIES_DISABLED: ContextVar[bool] = ContextVar("retries_disabled", default=False)
+
+
+@contextmanager
+def without_retries():
+    """Ошибки провайдера пробрасываются сразу; лимиты и circuit breaker действуют как обычно."""
+    token = _RETRIES_DISABLED.set(True)
+    try:
+        yield
+    finally:
+        _RETRIES_DISABLED.reset(token)
+
+
+def get_status_code(error: Exception) -> Optional[int]:
+    """Достаёт HTTP-код из исключения провайдера (httpx, openai, mistralai...)."""
+    code = getattr(error, "status_code", None)
+    if code is None:
+        code = getattr(getattr(error, "response", None), "status_code", None)
+    return code
+
+
+def is_retryable(error: Exception) -> bool:
+    """429/5xx и сетевые ошибки (таймаут, обрыв соединения) стоит повторить."""
+    code = get_status_code(error)
+    if code is not None:
+        return code in RETRYABLE_STATUS_CODES
+    return isinstance(error, (TimeoutError, ConnectionError)) or type(error).__name__ in {
+        "ConnectError",
+        "ReadTimeout",
+        "ConnectTimeout",
+        "RemoteProtocolError",
+        "APIConnectionError",
+        "APITimeoutError",
+    }
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitOpenError(RuntimeError):
+    """Провайдер временно отключён автоматом после серии ошибок."""
+
+    status_code = 503
+
+
+class TokenBucket:
+    """Token bucket с резервированием: reserve() списывает сразу и возвращает,
+    сколько ждать до момента, когда списанное покрыто. Работает одинаково
+    для потоков и корутин. rate <= 0 - без ограничения."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            self._refill()
+            self.tokens -= amount
+            return max(0.0, -self.tokens / self.rate)
+
+    def adjust(self, delta: float):
+        """Корректирует списание после ответа (delta > 0 - досписать, < 0 - вернуть)."""
+        if self.rate <= 0 or not delta:
+            return
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - delta)
+
+
+class CircuitBreaker:
+    """closed -> open после failure_threshold ошибок подряд; через reset_timeout
+    пропускает один пробный запрос (half_open), остальные отклоняются до его
+    результата: успех закрывает, ошибка снова открывает. Если проба не
+    завершилась за reset_timeout (например, отменена), пропускается следующая."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        # Время начала пробного запроса в half_open; None - проба свободна
+        self._probe_started: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _probe_free(self, now: float) -> bool:
+        return self._probe_started is None or now - self._probe_started >= self.reset_timeout
+
+    def allow(self) -> bool:
+        """Разрешает запрос; в half_open занимает единственную пробу."""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == "open" and now - self._opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._probe_started = None
+            if self.state == "half_open":
+                if not self._probe_free(now):
+                    return False
+                self._probe_started = now
+                return True
+            return self.state == "closed"
+
+    def available(self) -> bool:
+        """Пропустит ли автомат запрос сейчас - без занятия пробы (для выбора бэкенда)."""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == "open":
+                return now - self._opened_at >= self.reset_timeout
+            if self.state == "half_open":
+                return self._probe_free(now)
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self._failures = 0
+            self._probe_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_started = None
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    print(f"[WARNING] Circuit breaker открыт после {self._failures} ошибок подряд")
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+class ProviderGuard:
+    """Общая для всех моделей провайдера защита: лимит запросов/с и токенов/мин,
+    повтор 429/5xx с экспоненциальной задержкой и джиттером, circuit breaker."""
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_second: float = 0.0,
+        tokens_per_minute: float = 0.0,
+        max_retries: int = 4,
+        base_delay: float = 0.5,
+        max_delay: float = 20.0,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.name = name
+        self.requests = TokenBucket(requests_per_second, max(1.0, requests_per_second))
+        self.tokens = TokenBucket(tokens_per_minute / 60, tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker()
+        self._lock = threading.Lock()
+        self.stats = {
+            "requests": 0,
+            "retries": 0,
+            "failures": 0,
+            "rejected": 0,
+            "queue_depth": 0,
+            "max_queue_depth": 0,
+            "waits": 0,
+            "wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+        }
+
+    def _admit(self, tokens: int) -> float:
+        """Проверяет автомат и резервирует лимит; возвращает время ожидания."""
+        if not self.breaker.allow():
+            with self._lock:
+                self.stats["rejected"] += 1
+            raise CircuitOpenError(f"Провайдер {self.name} временно недоступен (circuit breaker)")
+        delay = max(self.requests.reserve(1), self.tokens.reserve(tokens))
+        with self._lock:
+            self.stats["requests"] += 1
+            if delay > 0:
+                self.stats["waits"] += 1
+                self.stats["wait_seconds"] += delay
+                self.stats["max_wait_seconds"] = max(self.stats["max_wait_seconds"], delay)
+        return delay
+
+    def _enter_queue(self):
+        with self._lock:
+            self.stats["queue_depth"] += 1
+            self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], self.stats["queue_depth"])
+
+    def _leave_queue(self):
+        with self._lock:
+            self.stats["queue_depth"] -= 1
+
+    def _on_error(self, error: Exception, attempt: int) -> Optional[float]:
+        """Возвращает задержку перед повтором или None, если ошибку надо пробросить."""
+        if not is_retryable(error):
+            # Провайдер ответил (400, 422...) - он доступен, проба завершена
+            self.breaker.record_success()
+            return None
+        self.breaker.record_failure()
+        with self._lock:
+            self.stats["failures"] += 1
+        if attempt >= self.max_retries or _RETRIES_DISABLED.get() or not self.breaker.available():
+            return None
+        with self._lock:
+            self.stats["retries"] += 1
+        delay = min(self.max_delay, self.base_delay * 2**attempt) * random.uniform(0.5, 1.5)
+        return max(delay, get_retry_after(error) or 0.0)
+
+    def record_usage(self, estimated: int, actual: Optional[int]):
+        if actual:
+            self.tokens.adjust(actual - estimated)
+
+    def acquire(self, tokens: int):
+        delay = self._admit(tokens)
+        if delay > 0:
+            self._enter_queue()
+            try:
+                time.sleep(delay)
+            finally:
+                self._leave_queue()
+
+    async def aacquire(self, tokens: int):
+        delay = self._admit(tokens)
+        if delay > 0:
+            self._enter_queue()
+            try:
+                await asyncio.sleep(delay)
+            finally:
+                self._leave_queue()
+
+    def call(self, fn: Callable[[], Any], tokens: int = 0) -> Any:
+        attempt = 0
+        while True:
+            self.acquire(tokens)
+            try:
+                result = fn()
+            except Exception as e:
+                delay = self._on_error(e, attempt)
+                if delay is None:
+                    raise
+                print(f"[WARNING] {self.name}: {e}; повтор через {delay:.1f} c")
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            return result
+
+    async def acall(self, fn: Callable[[], Any], tokens: int = 0) -> Any:
+        attempt = 0
+        while True:
+            await self.aacquire(tokens)
+            try:
+                result = await fn()
+            except Exception as e:
+                delay = self._on_error(e, attempt)
+                if delay is None:
+                    raise
+                print(f"[WARNING] {self.name}: {e}; повтор через {delay:.1f} c")
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            return result
+
+    def metrics(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        stats["avg_wait_seconds"] = round(stats["wait_seconds"] / stats["waits"], 3) if stats["waits"] else 0.0
+        stats["wait_seconds"] = round(stats["wait_seconds"], 3)
+        stats["max_wait_seconds"] = round(stats["max_wait_seconds"], 3)
+        stats["breaker"] = self.breaker.state
+        return stats
+
+
+def _usage_tokens(result: ChatResult) -> Optional[int]:
+    usage = getattr(result.generations[0].message, "usage_metadata", None) if result.generations else None
+    return usage.get("total_tokens") if usage else None
+
+
+class GuardedChatModel(BaseChatModel):
+    """Чат-модель любого провайдера за ProviderGuard.
+
+    bind_tools делегируется исходной модели: её формат инструментов
+    переносится на обёртку, поэтому create_agent работает как раньше.
+    Потоковый ответ повторяется только до первого полученного фрагмента.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    model: BaseChatModel
+    guard: ProviderGuard
+
+    @property
+    def _llm_type(self) -> str:
+        return self.model._llm_type
+
+    @property
+    def _identifying_params(self) -> dict:
+        return self.model._identifying_params
+
+    def bind_tools(self, tools, **kwargs):
+        bound = self.model.bind_tools(tools, **kwargs)
+        if isinstance(bound, RunnableBinding) and bound.bound is self.model:
+            return self.bind(**bound.kwargs)
+        if bound is self.model:
+            return self
+        print(f"[WARNING] {self._llm_type}: bind_tools вернул {type(bound).__name__}, модель без лимитера")
+        return bound
+
+    def _should_stream(self, *, async_api: bool, **kwargs: Any) -> bool:
+        return self.model._should_stream(async_api=async_api, **kwargs)
+
+    def _generate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        estimated = count_tokens_approximately(messages)
+        result = self.guard.call(
+            lambda: self.model._generate(messages, stop=stop, run_manager=run_manager, **kwargs),
+            tokens=estimated,
+        )
+        self.guard.record_usage(estimated, _usage_tokens(result))
+        return result
+
+    async def _agenerate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        estimated = count_tokens_approximately(messages)
+        result = await self.guard.acall(
+            lambda: self.model._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs),
+            tokens=estimated,
+        )
+        self.guard.record_usage(estimated, _usage_tokens(result))
+        return result
+
+    def _stream(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        estimated = count_tokens_approximately(messages)
+
+        def first():
+            stream = self.model._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+            return stream, next(stream, None)
+
+        stream, chunk = self.guard.call(first, tokens=estimated)
+        while chunk is not None:
+            yield chunk
+            chunk = next(stream, None)
+
+    async def _astream(
+        self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        estimated = count_tokens_approximately(messages)
+
+        async def first():
+            stream = self.model._astream(messages, stop=stop, run_manager=run_manager, **kwargs)
+            return stream, await anext(stream, None)
+
+        stream, chunk = await self.guard.acall(first, tokens=estimated)
+        while chunk is not None:
+            yield chunk
+            chunk = await anext(stream, None)
+
+
+class GuardedEmbeddings(Embeddings):
+    """Эмбеддинг-модель любого провайдера за ProviderGuard."""
+
+    def __init__(self, embeddings: Embeddings, guard: ProviderGuard):
+        self.embeddings = embeddings
+        self.guard = guard
+
+    @staticmethod
+    def _tokens(texts: list[str]) -> int:
+        # Грубая оценка: ~4 символа на токен
+        return sum(len(text) for text in texts) // 4 + 1
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.guard.call(lambda: self.embeddings.embed_documents(texts), tokens=self._tokens(texts))
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.guard.call(lambda: self.embeddings.embed_query(text), tokens=self._tokens([text]))
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return await self.guard.acall(lambda: self.embeddings.aembed_documents(texts), tokens=self._tokens(texts))
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return await self.guard.acall(lambda: self.embeddings.aembed_query(text), tokens=self._tokens([text]))
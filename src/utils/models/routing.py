@@ -0,0 +1,242 @@
+import time
+import threading
+from typing import Any, AsyncIterator, Callable, Iterator, Optional
+
+from pydantic import ConfigDict
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableBinding
+
+from .resilience import CircuitOpenError, ProviderGuard, get_retry_after, get_status_code, is_retryable
+
+
+class Backend:
+    """Один бэкенд маршрутизатора: модель, её лимитер и пассивная проверка здоровья."""
+
+    def __init__(self, name: str, target: Any, guard: ProviderGuard, cooldown: float = 30.0):
+        self.name = name
+        self.target = target
+        self.guard = guard
+        self.cooldown = cooldown
+        self.in_flight = 0
+        # Экспоненциальное среднее задержки; None - бэкенд ещё не вызывался
+        self.latency: Optional[float] = None
+        self.down_until = 0.0
+        self.stats = {"requests": 0, "failures": 0}
+
+    def available(self) -> bool:
+        return time.monotonic() >= self.down_until and self.guard.breaker.available()
+
+    def state(self) -> str:
+        if self.guard.breaker.state == "open":
+            return "open"
+        return "cooldown" if time.monotonic() < self.down_until else "up"
+
+
+class Balancer:
+    """Выбор бэкенда по наименьшему числу запросов в работе с учётом задержки:
+    оценка (in_flight + 1) * EWMA задержки, ещё не вызванные бэкенды - первыми.
+
+    Бэкенд, ответивший 429/5xx или сетевой ошибкой, уходит на паузу
+    (Retry-After или cooldown) и запрос повторяется на следующем; после
+    паузы он снова получает запросы - это и есть проверка здоровья.
+    """
+
+    def __init__(self, name: str, backends: list[Backend], alpha: float = 0.3):
+        if not backends:
+            raise ValueError(f"{name}: не задан ни один бэкенд")
+        self.name = name
+        self.backends = backends
+        self.alpha = alpha
+        self.failovers = 0
+        self._lock = threading.Lock()
+
+    def _order(self) -> list[Backend]:
+        with self._lock:
+            healthy = [b for b in self.backends if b.available()]
+            # Все недоступны - пробуем всех, иначе запрос гарантированно упадёт
+            candidates = healthy or list(self.backends)
+            known = [b.latency for b in candidates if b.latency is not None]
+            default = min(known) if known else 1.0
+
+            def score(b: Backend) -> tuple:
+                return (b.latency is not None, (b.in_flight + 1) * (b.latency or default))
+
+            return sorted(candidates, key=score)
+
+    def _start(self, backend: Backend) -> float:
+        with self._lock:
+            backend.in_flight += 1
+            backend.stats["requests"] += 1
+        return time.perf_counter()
+
+    def _finish(self, backend: Backend, started: float, error: Optional[Exception] = None):
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            backend.in_flight -= 1
+            if error is None:
+                backend.latency = (
+                    elapsed if backend.latency is None else self.alpha * elapsed + (1 - self.alpha) * backend.latency
+                )
+                return
+            backend.stats["failures"] += 1
+            # Ошибка запроса (400/422: длина контекста, формат) не говорит о нездоровье бэкенда
+            if is_retryable(error) and not isinstance(error, CircuitOpenError):
+                pause = get_retry_after(error) or backend.cooldown
+                backend.down_until = time.monotonic() + pause
+                reason = get_status_code(error) or error
+                print(f"[WARNING] {self.name}: бэкенд {backend.name} недоступен ({reason}), пауза {pause:.0f} c")
+
+    @staticmethod
+    def _should_failover(error: Exception) -> bool:
+        return isinstance(error, CircuitOpenError) or is_retryable(error)
+
+    def _failover(self, backend: Backend, error: Exception, last: bool):
+        if not self._should_failover(error) or last:
+            raise error
+        with self._lock:
+            self.failovers += 1
+
+    def call(self, fn: Callable[[Backend], Any]) -> Any:
+        order = self._order()
+        for i, backend in enumerate(order):
+            started = self._start(backend)
+            try:
+                result = fn(backend)
+            except Exception as e:
+                self._finish(backend, started, e)
+                self._failover(backend, e, last=i == len(order) - 1)
+                continue
+            self._finish(backend, started)
+            return result
+
+    async def acall(self, fn: Callable[[Backend], Any]) -> Any:
+        order = self._order()
+        for i, backend in enumerate(order):
+            started = self._start(backend)
+            try:
+                result = await fn(backend)
+            except Exception as e:
+                self._finish(backend, started, e)
+                self._failover(backend, e, last=i == len(order) - 1)
+                continue
+            self._finish(backend, started)
+            return result
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "failovers": self.failovers,
+                "backends": {
+                    b.name: {
+                        **b.stats,
+                        "in_flight": b.in_flight,
+                        "latency_ms": round(b.latency * 1000, 1) if b.latency is not None else None,
+                        "state": b.state(),
+                    }
+                    for b in self.backends
+                },
+            }
+
+
+class RoutingChatModel(BaseChatModel):
+    """Чат-модель поверх нескольких бэкендов с балансировкой и переключением.
+
+    bind_tools привязывает инструменты к каждому бэкенду в его собственном
+    формате; при вызове выбранный бэкенд получает свои параметры.
+    Потоковый ответ переключается на другой бэкенд только до первого фрагмента.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    balancer: Balancer
+
+    @property
+    def _llm_type(self) -> str:
+        return "routing-chat"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {"backends": [b.name for b in self.balancer.backends]}
+
+    def bind_tools(self, tools, **kwargs):
+        backend_kwargs = {}
+        for backend in self.balancer.backends:
+            bound = backend.target.bind_tools(tools, **kwargs)
+            if bound is backend.target:
+                backend_kwargs[backend.name] = {}
+            elif isinstance(bound, RunnableBinding) and bound.bound is backend.target:
+                backend_kwargs[backend.name] = bound.kwargs
+            else:
+                raise TypeError(f"{backend.name}: bind_tools вернул {type(bound).__name__}")
+        return self.bind(backend_kwargs=backend_kwargs)
+
+    @staticmethod
+    def _kwargs(backend: Backend, backend_kwargs: Optional[dict], kwargs: dict) -> dict:
+        return {**kwargs, **(backend_kwargs or {}).get(backend.name, {})}
+
+    def _generate(
+        self, messages: list[BaseMessage], stop=None, run_manager=None, backend_kwargs=None, **kwargs: Any
+    ) -> ChatResult:
+        return self.balancer.call(
+            lambda b: b.target._generate(
+                messages, stop=stop, run_manager=run_manager, **self._kwargs(b, backend_kwargs, kwargs)
+            )
+        )
+
+    async def _agenerate(
+        self, messages: list[BaseMessage], stop=None, run_manager=None, backend_kwargs=None, **kwargs: Any
+    ) -> ChatResult:
+        return await self.balancer.acall(
+            lambda b: b.target._agenerate(
+                messages, stop=stop, run_manager=run_manager, **self._kwargs(b, backend_kwargs, kwargs)
+            )
+        )
+
+    def _stream(
+        self, messages: list[BaseMessage], stop=None, run_manager=None, backend_kwargs=None, **kwargs: Any
+    ) -> Iterator[ChatGenerationChunk]:
+        def first(b: Backend):
+            options = self._kwargs(b, backend_kwargs, kwargs)
+            stream = b.target._stream(messages, stop=stop, run_manager=run_manager, **options)
+            return stream, next(stream, None)
+
+        stream, chunk = self.balancer.call(first)
+        while chunk is not None:
+            yield chunk
+            chunk = next(stream, None)
+
+    async def _astream(
+        self, messages: list[BaseMessage], stop=None, run_manager=None, backend_kwargs=None, **kwargs: Any
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        async def first(b: Backend):
+            options = self._kwargs(b, backend_kwargs, kwargs)
+            stream = b.target._astream(messages, stop=stop, run_manager=run_manager, **options)
+            return stream, await anext(stream, None)
+
+        stream, chunk = await self.balancer.acall(first)
+        while chunk is not None:
+            yield chunk
+            chunk = await anext(stream, None)
+
+
+class RoutingEmbeddings(Embeddings):
+    """Эмбеддинги через несколько бэкендов одной и той же модели:
+    векторы остаются совместимыми с коллекцией при любом выбранном бэкенде."""
+
+    def __init__(self, balancer: Balancer):
+        self.balancer = balancer
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.balancer.call(lambda b: b.target.embed_documents(texts))
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.balancer.call(lambda b: b.target.embed_query(text))
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return await self.balancer.acall(lambda b: b.target.aembed_documents(texts))
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return await self.balancer.acall(lambda b: b.target.aembed_query(text))
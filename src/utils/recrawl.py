@@ -0,0 +1,112 @@
+import os
+import json
+import time
+from typing import Optional
+
+import httpx
+
+from src.utils.utils import hash_content
+
+
+class FetchState:
+    """Метаданные загрузки по каждому URL для инкрементального обхода:
+    ETag / Last-Modified, хэш содержимого, время последней загрузки и
+    ссылки страницы (чтобы продолжать обход, не загружая её заново).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.pages: dict[str, dict] = self._read()
+
+    def _read(self) -> dict:
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as fp:
+                return json.load(fp)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"[WARNING] Состояние обхода {self.path} повреждено, будет полный обход: {e}")
+            return {}
+
+    def get(self, url: str) -> Optional[dict]:
+        return self.pages.get(url)
+
+    def is_recent(self, url: str, min_age: float) -> bool:
+        """True, если страница загружалась меньше min_age секунд назад."""
+        meta = self.pages.get(url)
+        return bool(min_age > 0 and meta and time.time() - meta.get("fetched_at", 0) < min_age)
+
+    def conditional_headers(self, url: str) -> dict:
+        meta = self.pages.get(url) or {}
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    @staticmethod
+    def meta(page: dict, headers: Optional[dict], links: list[str]) -> dict:
+        """Запись о загруженной странице."""
+        headers = {key.lower(): value for key, value in (headers or {}).items()}
+        return {
+            "etag": headers.get("etag"),
+            "last_modified": headers.get("last-modified"),
+            "content_hash": hash_content(page["content"]),
+            "fetched_at": time.time(),
+            "links": links,
+        }
+
+    def save(self, pages: dict[str, dict]):
+        """Атомарно заменяет состояние (URL, удалённые с сайта, в него не попадают)."""
+        self.pages = pages
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fp:
+            json.dump(pages, fp, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+async def is_not_modified(client: httpx.AsyncClient, url: str, headers: dict) -> bool:
+    """Условный запрос: True, если сервер ответил 304 Not Modified.
+    Тело ответа 200 не читается - страницу всё равно отрисует браузер."""
+    if not headers:
+        return False
+    try:
+        async with client.stream("GET", url, headers=headers) as response:
+            return response.status_code == 304
+    except httpx.HTTPError as e:
+        print(f"[WARNING] Условный запрос {url} не выполнен: {e}")
+        return False
+
+
+def build_change_set(
+    previous: dict[str, dict],
+    fetched: dict[str, dict],
+    unchanged: set[str],
+    failed: set[str],
+) -> dict:
+    """Сравнивает результат обхода с прошлым состоянием.
+
+    fetched - загруженные страницы (url -> запись FetchState.meta),
+    unchanged - пропущенные без загрузки (304 или недавно загружены),
+    failed - страницы, которые не удалось загрузить: они не считаются удалёнными.
+    """
+    added, modified = [], []
+    for url, meta in fetched.items():
+        old = previous.get(url)
+        if old is None:
+            added.append(url)
+        elif old.get("content_hash") != meta["content_hash"]:
+            modified.append(url)
+        else:
+            unchanged.add(url)
+    reached = set(fetched) | unchanged | failed
+    removed = sorted(set(previous) - reached)
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "added": sorted(added),
+        "modified": sorted(modified),
+        "removed": removed,
+        "unchanged": len(unchanged),
+    }
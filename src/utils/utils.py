@@ -1,6 +1,15 @@
 import hashlib
 
+import numpy as np
+
 
 def hash_content(text: str) -> str:
     """Возвращает MD5-хэш строки, закодированной в utf-8."""
     return hashlib.md5(text.encode("utf-8")).hexdigest()
+
+
+def unit_vector(vector) -> np.ndarray:
+    """Нормирует вектор (float32) для косинусной близости через скалярное произведение."""
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
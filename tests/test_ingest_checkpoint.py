@@ -0,0 +1,122 @@
+"""Индексация, прерванная посреди страницы, досинхронизируется при следующем запуске.
+
+Qdrant - локальный режим во временном каталоге, эмбеддинги - провайдер "stub"
+из офлайн-бенчмарка. Индексация идёт пачками по одной странице.
+"""
+import gc
+import os
+import json
+
+import pytest
+
+from src.config import settings
+import src.benchmarks.e2e  # noqa: F401 - регистрирует провайдер "stub"
+from src.benchmarks.stubs import StubEmbeddings
+from src.utils.corpus import CorpusStore
+
+CHUNK_SIZE = 100
+PAGE_CHUNKS = 3
+
+
+def _page(name: str) -> dict:
+    paragraphs = [f"{name} раздел {i}. " + "текст " * 12 for i in range(PAGE_CHUNKS)]
+    return {"title": name, "content": "\n\n".join(paragraphs)}
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    data_path = tmp_path / "data.json"
+    data_path.write_text(
+        json.dumps({"https://docs.test/a": _page("a"), "https://docs.test/b": _page("b")}, ensure_ascii=False),
+        encoding="utf-8",
+    )
+    overrides = {
+        "LLM_MODE": "stub",
+        "LLM_MODEL": "stub-chat",
+        "EMBEDDING_MODEL": "stub-embed",
+        "EMBEDDING_DIM": 0,
+        "EMBEDDING_CACHE_DIR": "",
+        "LLM_RPS": 0,
+        "RETRIEVAL_MODE": "dense",
+        "RERANKER": "none",
+        "CHUNK_SIZE": CHUNK_SIZE,
+        "INGEST_BATCH_SIZE": 1,
+        "EMBED_BATCH_SIZE": 1,
+        "EMBED_CONCURRENCY": 1,
+        "EMBED_MAX_RETRIES": 0,
+        "QDRANT_URL": "",
+        "QDRANT_PATH": str(tmp_path / "qdrant"),
+        "DATA_PATH": str(data_path),
+        "CORPUS_PATH": str(tmp_path / "corpus.db"),
+        "MANIFEST_PATH": str(tmp_path / "ingest_manifest.json"),
+        "BM25_INDEX_PATH": str(tmp_path / "bm25_index.npz"),
+        "EMBED_CHECKPOINT_PATH": str(tmp_path / "embedding_checkpoint.json"),
+        "EMBEDDING_DIMS_PATH": str(tmp_path / "embedding_dims.json"),
+    }
+    for name, value in overrides.items():
+        monkeypatch.setattr(settings, name, value)
+    return tmp_path
+
+
+def _chunk_counts(rag_agent) -> dict[str, int]:
+    store = rag_agent.vector_store
+    points, _ = store.client.scroll(store.collection_name, with_payload=["metadata.url"], limit=1000)
+    counts: dict[str, int] = {}
+    for point in points:
+        url = point.payload["metadata"]["url"]
+        counts[url] = counts.get(url, 0) + 1
+    return counts
+
+
+def _pending_urls() -> set[str]:
+    with open(settings.EMBED_CHECKPOINT_PATH, "r", encoding="utf-8") as fp:
+        return set(json.load(fp)["pending_urls"])
+
+
+def _crash_on(chunk_prefix: str):
+    """Запускает индексацию, которая падает на чанке, начинающемся с chunk_prefix."""
+    from src.rag import load_rag_agent
+
+    embed_documents = StubEmbeddings.embed_documents
+
+    def failing(self, texts):
+        if any(text.startswith(chunk_prefix) for text in texts):
+            raise RuntimeError("процесс упал")
+        return embed_documents(self, texts)
+
+    StubEmbeddings.embed_documents = failing
+    try:
+        with pytest.raises(RuntimeError):
+            load_rag_agent()
+    finally:
+        StubEmbeddings.embed_documents = embed_documents
+    # Упавший процесс освобождает каталог локального Qdrant - здесь это делает сборщик мусора
+    gc.collect()
+
+
+def test_page_interrupted_mid_write_is_completed_after_restart(workdir):
+    from src.rag import load_rag_agent
+
+    # Страница a записывается целиком, b обрывается после первого чанка
+    _crash_on("b раздел 1")
+    assert "https://docs.test/b" in _pending_urls()
+
+    # Новая страница векторизуется в пачке раньше недописанной
+    CorpusStore(settings.CORPUS_PATH).upsert({"https://docs.test/0": _page("0")})
+
+    rag_agent = load_rag_agent()
+    try:
+        counts = _chunk_counts(rag_agent)
+    finally:
+        rag_agent.vector_store.client.close()
+    assert counts == {url: PAGE_CHUNKS for url in ("https://docs.test/0", "https://docs.test/a", "https://docs.test/b")}
+    assert not os.path.exists(settings.EMBED_CHECKPOINT_PATH)
+
+
+def test_checkpoint_keeps_pages_of_earlier_batches(workdir):
+    _crash_on("b раздел 1")
+    CorpusStore(settings.CORPUS_PATH).upsert({"https://docs.test/0": _page("0")})
+
+    # Повторный запуск падает уже на новой странице, до досинхронизации b
+    _crash_on("0 раздел 1")
+    assert {"https://docs.test/0", "https://docs.test/b"} <= _pending_urls()